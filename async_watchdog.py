@@ -1,34 +1,140 @@
 import asyncio
+import os
+import threading
+import time
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+from logger_config import get_logger
+from metrics import Metrics
+
+# Инициализация логгера
+logger = get_logger()
+
+WATCH_STATS_INTERVAL = 60  # Интервал вывода статистики событий (в секундах)
+
+
+def normalize_path(path):
+    """
+    Приводит путь к единому виду для сравнения (абсолютный путь, регистр по правилам ОС).
+    """
+    return os.path.normcase(os.path.abspath(path))
+
 
 class AsyncEventHandler(FileSystemEventHandler):
-    def __init__(self, callback, loop):
+    def __init__(self, callback, loop, target_paths=None):
+        """
+        Обработчик событий watchdog, объединяющий события по файлам.
+        Для каждого файла в цикле событий работает одна задача чтения: пока она занята,
+        новые события лишь помечают файл "грязным", и после завершения чтения выполняется
+        ровно одно дополнительное чтение.
+        :param callback: Корутина, вызываемая с путем к измененному файлу.
+        :param loop: Цикл событий для выполнения асинхронных задач.
+        :param target_paths: Отслеживаемые файлы; события остальных файлов отбрасываются в потоке watchdog.
+        """
         self.callback = callback
         self.loop = loop  # Сохраняем ссылку на цикл событий
+        self.target_paths = None
+        if target_paths is not None:
+            self.target_paths = {normalize_path(path): path for path in target_paths}
+
+        self._lock = threading.Lock()
+        self._signaled = set()  # Файлы, о которых уже отправлен сигнал в цикл событий
+        self._dirty = {}  # {путь: asyncio.Event} - флаг "есть непрочитанные изменения"
+        self._readers = {}  # {путь: задача чтения}
+        self._pending_since = {}  # {путь: время первого необработанного события (time.monotonic)}
+
+        # Статистика
+        self.events_received = 0
+        self.events_ignored = 0
+        self.reads_performed = 0
+        self.read_lag = Metrics().histogram(
+            "moe_watch_read_lag_seconds", "Задержка от события файловой системы до чтения файла"
+        )
 
     def on_modified(self, event):
-        if not event.is_directory:
-            # Выполняем корутину в основном цикле событий
-            asyncio.run_coroutine_threadsafe(self.callback(event.src_path), self.loop)
+        if event.is_directory:
+            return
+        self.events_received += 1
+
+        path = event.src_path
+        if self.target_paths is not None:
+            path = self.target_paths.get(normalize_path(path))
+            if path is None:
+                self.events_ignored += 1
+                return
+
+        # Передаем сигнал в цикл событий, только если предыдущий еще не обработан
+        with self._lock:
+            if path in self._signaled:
+                return
+            self._signaled.add(path)
+        self.loop.call_soon_threadsafe(self._mark_dirty, path, time.monotonic())
+
+    def _mark_dirty(self, path, event_time):
+        """
+        Выполняется в цикле событий: помечает файл измененным и при необходимости запускает задачу чтения.
+        """
+        with self._lock:
+            self._signaled.discard(path)
+        self._pending_since.setdefault(path, event_time)
+
+        dirty = self._dirty.get(path)
+        if dirty is None:
+            dirty = self._dirty[path] = asyncio.Event()
+            self._readers[path] = self.loop.create_task(self._read_loop(path, dirty))
+        dirty.set()
+
+    async def _read_loop(self, path, dirty):
+        """
+        Единственная задача чтения файла: ждет флаг изменений и вызывает callback.
+        """
+        while True:
+            await dirty.wait()
+            dirty.clear()
+            self.reads_performed += 1
+            pending_since = self._pending_since.pop(path, None)
+            if pending_since is not None:
+                self.read_lag.observe(time.monotonic() - pending_since)
+            try:
+                await self.callback(path)
+            except Exception as e:
+                logger.error(f"Ошибка при обработке изменений файла {path}: {e}")
+
+    def stop(self):
+        for task in self._readers.values():
+            task.cancel()
+
+    def stats(self):
+        return {
+            "events_received": self.events_received,
+            "events_ignored": self.events_ignored,
+            "reads_performed": self.reads_performed,
+        }
+
 
-async def watch_directory(directory, callback, loop):
+async def watch_directory(directory, callback, loop, target_paths=None):
     """
     Асинхронно отслеживает изменения в указанной директории.
     :param directory: Директория для наблюдения.
     :param callback: Функция обратного вызова при изменении файла.
     :param loop: Цикл событий для выполнения асинхронных задач.
+    :param target_paths: Список отслеживаемых файлов (None - все файлы директории).
     """
     observer = Observer()
-    handler = AsyncEventHandler(callback, loop)  # Передаем цикл событий
+    handler = AsyncEventHandler(callback, loop, target_paths)  # Передаем цикл событий
     observer.schedule(handler, directory, recursive=False)
 
     # Запуск наблюдателя в отдельном потоке
     await loop.run_in_executor(None, observer.start)
 
     try:
+        elapsed = 0
         while True:
             await asyncio.sleep(1)  # Основной цикл для поддержания работы
+            elapsed += 1
+            if elapsed % WATCH_STATS_INTERVAL == 0:
+                logger.info(f"Статистика наблюдения за {directory}: {handler.stats()}")
     except asyncio.CancelledError:
+        handler.stop()
         observer.stop()
-        observer.join()
\ No newline at end of file
+        observer.join()
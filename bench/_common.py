@@ -0,0 +1,77 @@
+"""
+Общие утилиты бенчмарков: подготовка окружения, статистика и запись результатов в JSON.
+Бенчмарки запускаются из корня репозитория: python bench/<имя>.py
+"""
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, "bench", "results")
+
+
+def prepare_environment():
+    """
+    Делает модули сервера импортируемыми и переходит во временный рабочий каталог,
+    чтобы logs/, players_data.json и прочие файлы не попадали в репозиторий.
+    """
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+    workdir = tempfile.mkdtemp(prefix="moe_bench_")
+    os.chdir(workdir)
+    os.makedirs("logs", exist_ok=True)
+    return workdir
+
+
+def quiet_logger(level=logging.WARNING):
+    """
+    Понижает подробность логгера сервера, чтобы вывод не искажал замеры.
+    """
+    from logger_config import get_logger
+    get_logger().setLevel(level)
+
+
+def percentile(values, fraction):
+    """
+    Возвращает перцентиль (fraction от 0 до 1) по списку значений.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def timed(func, *args, repeat=1):
+    """
+    Выполняет функцию repeat раз и возвращает (последний результат, затраченное время в секундах).
+    """
+    result = None
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def write_results(name, results):
+    """
+    Сохраняет результаты бенчмарка в bench/results/<name>-<время>.json и печатает их.
+    """
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    payload = {
+        "benchmark": name,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    path = os.path.join(RESULTS_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=4, ensure_ascii=False)
+    print(json.dumps(payload, indent=4, ensure_ascii=False))
+    print(f"Результаты сохранены в {path}")
+    return path
@@ -0,0 +1,122 @@
+"""
+Бенчмарк списка заблокированных IP во время атаки: прежний словарь {ip: время ISO}
+с полной записью blocked_ips.json после каждой блокировки и проверкой всех меток
+fromisoformat каждые 10 секунд против Blocklist (целые IPv4, куча сроков, двоичный журнал).
+
+    python bench/bench_blocklist.py [--blocks 100000] [--legacy-blocks 2000] [--flush-every 1000]
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from _common import prepare_environment, quiet_logger, write_results
+
+prepare_environment()
+quiet_logger()
+
+from blocklist import Blocklist  # noqa: E402
+
+
+def make_addresses(count, seed=1):
+    """
+    Адреса атакующих: половина - соседние адреса нескольких подсетей, половина - случайные.
+    """
+    rng = random.Random(seed)
+    addresses = []
+    for i in range(count):
+        if i % 2:
+            value = rng.randrange(1 << 32)
+        else:
+            value = (10 << 24) + i // 2
+        addresses.append(f"{value >> 24 & 255}.{value >> 16 & 255}.{value >> 8 & 255}.{value & 255}")
+    return addresses
+
+
+def bench_legacy(addresses, total):
+    blocked_ips = {}
+    start = time.perf_counter()
+    for ip_address in addresses:
+        blocked_ips[ip_address] = datetime.now().isoformat()
+        with open("legacy_blocked_ips.json", "w", encoding="utf-8") as f:
+            json.dump(blocked_ips, f, indent=4)
+    block_seconds = time.perf_counter() - start
+
+    # Проверка сроков на полном списке (как unblock_old_ips при total блокировках)
+    full = {ip_address: datetime.now().isoformat() for ip_address in make_addresses(total)}
+    one_day_ago = datetime.now() - timedelta(days=1)
+    start = time.perf_counter()
+    for ip_address, blocked_time in list(full.items()):
+        if datetime.fromisoformat(blocked_time) < one_day_ago:
+            del full[ip_address]
+    expiry_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    with open("legacy_blocked_ips.json", "w", encoding="utf-8") as f:
+        json.dump(full, f, indent=4)
+    save_seconds = time.perf_counter() - start
+
+    return {
+        "blocks": len(addresses),
+        "seconds_per_block": block_seconds / len(addresses),
+        "expiry_check_seconds": expiry_seconds,
+        "full_save_seconds": save_seconds,
+        "file_bytes": os.path.getsize("legacy_blocked_ips.json"),
+    }
+
+
+def bench_blocklist(addresses, flush_every):
+    blocklist = Blocklist(86400, "bench_blocked_ips.bin", "missing_legacy.json")
+    written = 0
+    start = time.perf_counter()
+    for index, ip_address in enumerate(addresses, 1):
+        if ip_address not in blocklist:
+            blocklist.add(ip_address)
+        if index % flush_every == 0:
+            written += blocklist.write(blocklist.collect())
+    written += blocklist.write(blocklist.collect())
+    block_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    blocklist.expire()
+    expiry_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ranges = blocklist.cidr_ranges()
+    aggregate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reloaded = Blocklist(86400, "bench_blocked_ips.bin", "missing_legacy.json")
+    load_seconds = time.perf_counter() - start
+
+    return {
+        "blocks": len(addresses),
+        "seconds_per_block": block_seconds / len(addresses),
+        "expiry_check_seconds": expiry_seconds,
+        "bytes_written": written,
+        "file_bytes": os.path.getsize("bench_blocked_ips.bin"),
+        "load_seconds": load_seconds,
+        "loaded": len(reloaded),
+        "cidr_rules": len(ranges),
+        "cidr_aggregate_seconds": aggregate_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocks", type=int, default=100_000)
+    parser.add_argument("--legacy-blocks", type=int, default=2000, help="Блокировок для замера прежнего кода")
+    parser.add_argument("--flush-every", type=int, default=1000, help="Блокировок между записями журнала")
+    args = parser.parse_args()
+
+    addresses = make_addresses(args.blocks)
+    results = {
+        "legacy_json": bench_legacy(addresses[:args.legacy_blocks], args.blocks),
+        "blocklist": bench_blocklist(addresses, args.flush_every),
+    }
+    write_results("blocklist", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Проверка памяти выдачи challenge: поток запросов A2S_SERVERQUERY_GETCHALLENGE с --addresses
+различных подменных адресов. Для ChallengeNumbers прирост памяти (tracemalloc) должен оставаться
+постоянным; для сравнения приводится прежняя схема со словарем challenge_numbers[addr].
+Скрипт служит регрессионной проверкой: прогон выполняется для --addresses / 10 и --addresses адресов,
+код возврата 1, если прирост превышает --max-growth байт или растет вместе с числом адресов
+больше чем на --max-growth байт.
+
+    python bench/bench_challenge.py [--addresses 1000000] [--max-growth 65536]
+"""
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+from _common import prepare_environment, quiet_logger, write_results
+
+prepare_environment()
+quiet_logger()
+
+from handlers import ChallengeNumbers, handle_challenge_query  # noqa: E402
+
+CHALLENGE_REQUEST = b'\xFF\xFF\xFF\xFFW'
+
+
+def spoofed_addresses(count):
+    for i in range(count):
+        yield f"{1 + (i >> 24 & 127)}.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", 1024 + i % 60000
+
+
+def bench_stateless(count):
+    challenge_numbers = ChallengeNumbers()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    for addr in spoofed_addresses(count):
+        handle_challenge_query(CHALLENGE_REQUEST, addr, challenge_numbers)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "requests": count,
+        "requests_per_second": count / elapsed,
+        "memory_growth_bytes": current - baseline,
+    }
+
+
+def bench_legacy(count):
+    challenge_numbers = {}
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    for addr in spoofed_addresses(count):
+        challenge_numbers[addr] = random.randint(1, 2 ** 32 - 1)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "requests": count,
+        "memory_growth_bytes": current - baseline,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--addresses", type=int, default=1_000_000)
+    parser.add_argument("--max-growth", type=int, default=65536)
+    args = parser.parse_args()
+
+    small = bench_stateless(args.addresses // 10)
+    results = {
+        "stateless": bench_stateless(args.addresses),
+        "stateless_tenth": small,
+        "legacy_dict": bench_legacy(args.addresses),
+    }
+    growth = results["stateless"]["memory_growth_bytes"]
+    scaling = growth - small["memory_growth_bytes"]
+    results["growth_with_addresses_bytes"] = scaling
+    write_results("challenge_memory", results)
+
+    if growth > args.max_growth:
+        print(f"Прирост памяти {growth} байт превышает допустимые {args.max_growth}")
+        sys.exit(1)
+    if scaling > args.max_growth:
+        print(f"Память растет с числом адресов: +{scaling} байт при {args.addresses} адресах против {small['requests']}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
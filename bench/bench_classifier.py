@@ -0,0 +1,66 @@
+"""
+Микробенчмарк классификации запросов: прежняя маршрутизация регулярными выражениями
+(три re.compile и до трех match на пакет) против табличного classify_request.
+
+    python bench/bench_classifier.py [--iterations 1000000]
+"""
+import argparse
+import re
+import time
+
+from _common import prepare_environment, write_results
+
+prepare_environment()
+
+from handlers import classify_request  # noqa: E402
+
+PACKETS = {
+    "info": b'\xFF\xFF\xFF\xFFTSource Engine Query\x00',
+    "challenge": b'\xFF\xFF\xFF\xFFU\x00\x00\x00\x00',
+    "player": b'\xFF\xFF\xFF\xFFU\x01\x02\x03\x04',
+    "garbage": b'GET / HTTP/1.1\r\nHost: example\r\n\r\n',
+}
+
+
+def classify_regex(data):
+    """
+    Повторяет прежнюю логику QueryServer.route_request.
+    """
+    info_query_pattern = re.compile(rb'^\xFF\xFF\xFF\xFFTSource Engine Query\x00$')
+    if info_query_pattern.match(data):
+        return "info"
+    challenge_query_pattern = re.compile(rb'^\xFF\xFF\xFF\xFFU\x00\x00\x00\x00$')
+    if challenge_query_pattern.match(data):
+        return "challenge"
+    player_query_pattern = re.compile(rb'^\xFF\xFF\xFF\xFF[UV](.{4})$')
+    if player_query_pattern.match(data):
+        return "player"
+    return None
+
+
+def measure(classifier, data, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        classifier(data)
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    results = {}
+    for name, data in PACKETS.items():
+        regex_ns = measure(classify_regex, data, args.iterations)
+        table_ns = measure(classify_request, data, args.iterations)
+        results[name] = {
+            "regex_ns_per_packet": regex_ns,
+            "table_ns_per_packet": table_ns,
+            "speedup": regex_ns / table_ns,
+        }
+    write_results("request_classifier", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Бенчмарк DDOSProtection.process_ip: воспроизводит поток строк "accepted from"
+по множеству различных IP и измеряет пропускную способность и размер таблицы IP.
+Для сравнения прежний алгоритм (strptime + список меток с пересборкой) прогоняется
+на первых --legacy-events событиях.
+
+    python bench/bench_ddos.py [--events 10000000] [--ips 1000000] [--legacy-events 1000000]
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from _common import prepare_environment, quiet_logger, write_results
+
+prepare_environment()
+quiet_logger()
+
+import ddos_protection  # noqa: E402
+from constants import DDOS_THRESHOLD, DDOS_INTERVAL  # noqa: E402
+from loggen import format_timestamp  # noqa: E402
+
+BATCH = 100_000
+
+
+class LegacyRateLimiter:
+    """
+    Прежняя реализация окна: список datetime на IP, пересобираемый при каждом событии.
+    """
+
+    def __init__(self, threshold, interval):
+        self.threshold = threshold
+        self.interval = interval
+        self.ip_data = defaultdict(list)
+
+    def process_ip(self, ip_address, timestamp):
+        timestamp = datetime.strptime(timestamp, "%Y.%m.%d-%H.%M.%S:%f")
+        self.ip_data[ip_address].append(timestamp)
+        threshold_time = timestamp - timedelta(seconds=self.interval)
+        self.ip_data[ip_address] = [t for t in self.ip_data[ip_address] if t > threshold_time]
+        if len(self.ip_data[ip_address]) > self.threshold:
+            del self.ip_data[ip_address]
+
+
+def generate_events(total, ips, seed=1):
+    """
+    Генерирует пакеты событий (ip, метка времени); 20% событий приходится на 100 "атакующих" IP.
+    """
+    rng = random.Random(seed)
+    moment = datetime(2024, 5, 1, 12, 0, 0)
+    step = timedelta(microseconds=100)
+    produced = 0
+    while produced < total:
+        batch = []
+        for _ in range(min(BATCH, total - produced)):
+            moment += step
+            ip = rng.randrange(100) if rng.random() < 0.2 else rng.randrange(ips)
+            batch.append((f"10.{ip >> 16 & 255}.{ip >> 8 & 255}.{ip & 255}", format_timestamp(moment)))
+        produced += len(batch)
+        yield batch
+
+
+def replay(limiter, total, ips):
+    elapsed = 0.0
+    max_tracked = 0
+    for batch in generate_events(total, ips):
+        process_ip = limiter.process_ip
+        start = time.perf_counter()
+        for ip_address, timestamp in batch:
+            process_ip(ip_address, timestamp)
+        elapsed += time.perf_counter() - start
+        max_tracked = max(max_tracked, len(limiter.ip_data))
+    return {
+        "events": total,
+        "seconds": elapsed,
+        "events_per_second": total / elapsed,
+        "max_tracked_ips": max_tracked,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=10_000_000)
+    parser.add_argument("--ips", type=int, default=1_000_000)
+    parser.add_argument("--legacy-events", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    limiter = ddos_protection.DDOSProtection(DDOS_THRESHOLD, DDOS_INTERVAL)
+
+    results = {
+        "ring_window": replay(limiter, args.events, args.ips),
+        "legacy_list": replay(LegacyRateLimiter(DDOS_THRESHOLD, DDOS_INTERVAL), args.legacy_events, args.ips),
+    }
+    results["ring_window"]["blocked_ips"] = len(limiter.blocked_ips)
+    results["ring_window"]["evicted_ips"] = limiter.evicted_ips
+    try:
+        import resource
+        results["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:  # Windows
+        pass
+    write_results("ddos_process_ip", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Блокировка IP во время атаки: прежний вызов внешней команды на каждый IP прямо в цикле событий
+против FirewallQueue (пакеты, команда в пуле потоков). Вместо настоящего файрвола запускается
+пустой процесс Python - это стоимость запуска netsh/nft без изменения правил системы.
+Сообщает время до применения всех блокировок, число запущенных процессов и наибольшую
+задержку цикла событий. Код возврата 1, если набор заблокированных адресов различается.
+
+    python bench/bench_firewall.py [--blocks 300] [--burst 50] [--batch-size 500] [--batch-delay 0.05]
+"""
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+
+from _common import prepare_environment, quiet_logger, write_results
+
+prepare_environment()
+quiet_logger()
+
+from firewall import FirewallBackend, FirewallQueue  # noqa: E402
+
+TICK = 0.005  # Период задачи, измеряющей задержки цикла событий (в секундах)
+BURST_INTERVAL = 0.01  # Пауза между пачками новых блокировок (в секундах)
+
+
+class SpawnFirewall(FirewallBackend):
+    name = "spawn"
+
+    def __init__(self):
+        """
+        Файрвол, который на каждый вызов запускает один пустой процесс.
+        """
+        self.blocked = set()
+        self.processes = 0
+
+    def spawn(self):
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        self.processes += 1
+
+    def sync(self, addresses):
+        self.blocked = set(addresses)
+        self.spawn()
+
+    def block(self, addresses):
+        self.blocked.update(addresses)
+        self.spawn()
+
+    def unblock(self, addresses):
+        self.blocked.difference_update(addresses)
+        self.spawn()
+
+
+async def measure_stalls(stalls):
+    """
+    Записывает наибольшую задержку пробуждения задачи относительно TICK.
+    """
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        stalls[0] = max(stalls[0], time.perf_counter() - start - TICK)
+
+
+async def run_attack(block, addresses, burst):
+    """
+    Подает блокировки пачками по burst адресов, как их находит разбор логов.
+    """
+    for i in range(0, len(addresses), burst):
+        for address in addresses[i:i + burst]:
+            block(address)
+        await asyncio.sleep(BURST_INTERVAL)
+
+
+async def bench_inline(addresses, burst):
+    backend = SpawnFirewall()
+    stalls = [0.0]
+    ticker = asyncio.create_task(measure_stalls(stalls))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await run_attack(lambda address: backend.block([address]), addresses, burst)
+    elapsed = time.perf_counter() - start
+    await asyncio.sleep(TICK * 2)  # Даем задаче замера учесть последнюю задержку
+    ticker.cancel()
+    return backend, {"seconds": elapsed, "processes": backend.processes, "max_loop_stall_ms": stalls[0] * 1000}
+
+
+async def bench_queue(addresses, burst, batch_size, batch_delay):
+    backend = SpawnFirewall()
+    queue = FirewallQueue(backend, batch_size, batch_delay)
+    queue.start(asyncio.get_running_loop())
+    stalls = [0.0]
+    ticker = asyncio.create_task(measure_stalls(stalls))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await run_attack(queue.block, addresses, burst)
+    while queue.pending or len(backend.blocked) < len(addresses):
+        await asyncio.sleep(TICK)
+    elapsed = time.perf_counter() - start
+    await asyncio.sleep(TICK * 2)
+    ticker.cancel()
+    queue.task.cancel()
+    delays = queue.queue_delay
+    return backend, {
+        "seconds": elapsed,
+        "processes": backend.processes,
+        "max_loop_stall_ms": stalls[0] * 1000,
+        "mean_queue_delay_ms": delays.sum / delays.count * 1000 if delays.count else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocks", type=int, default=300)
+    parser.add_argument("--burst", type=int, default=50, help="Новых блокировок в одной пачке")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--batch-delay", type=float, default=0.05)
+    args = parser.parse_args()
+
+    addresses = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(args.blocks)]
+    inline_backend, inline = asyncio.run(bench_inline(addresses, args.burst))
+    queue_backend, queued = asyncio.run(bench_queue(addresses, args.burst, args.batch_size, args.batch_delay))
+
+    results = {
+        "blocks": args.blocks,
+        "inline_per_ip": inline,
+        "batched_queue": queued,
+        "blocked_match": inline_backend.blocked == queue_backend.blocked == set(addresses),
+    }
+    write_results("firewall", results)
+    if not results["blocked_match"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
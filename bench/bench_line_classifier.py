@@ -0,0 +1,68 @@
+"""
+Бенчмарк классификации строк лога: прежняя цепочка из четырех регулярных выражений
+против classify_line (предфильтр по подстрокам + одно объединенное выражение).
+
+    python bench/bench_line_classifier.py [--lines 2000000]
+"""
+import argparse
+import time
+
+from _common import prepare_environment, write_results
+
+prepare_environment()
+
+from constants import (  # noqa: E402
+    IP_TIMESTAMP_PATTERN, UNIFIED_LOGIN_PATTERN, LOGOUT_PATTERN_OLD, LOGOUT_PATTERN_NEW
+)
+from log_parser import classify_line  # noqa: E402
+from loggen import generate_lines  # noqa: E402
+
+
+def classify_legacy(line):
+    """
+    Повторяет прежнюю последовательность проверок parse_log/handle_player_events.
+    """
+    event = None
+    ip_timestamp_match = IP_TIMESTAMP_PATTERN.search(line)
+    if ip_timestamp_match:
+        event = ("connect", ip_timestamp_match.group(2))
+    login_match = UNIFIED_LOGIN_PATTERN.search(line)
+    if login_match:
+        return "login", login_match.group(1) or login_match.group(3)
+    logout_match_old = LOGOUT_PATTERN_OLD.search(line)
+    if logout_match_old:
+        return "logout", logout_match_old.group(1)
+    logout_match_new = LOGOUT_PATTERN_NEW.search(line)
+    if logout_match_new:
+        return "logout", logout_match_new.group(1)
+    return event
+
+
+def measure(classifier, lines):
+    events = 0
+    start = time.perf_counter()
+    for line in lines:
+        if classifier(line) is not None:
+            events += 1
+    elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "lines_per_second": len(lines) / elapsed, "events": events}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    lines = list(generate_lines(args.lines))
+    legacy = measure(classify_legacy, lines)
+    combined = measure(classify_line, lines)
+    write_results("line_classifier", {
+        "lines": args.lines,
+        "legacy": legacy,
+        "combined": combined,
+        "speedup": combined["lines_per_second"] / legacy["lines_per_second"],
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Разбор синтетического лога MOE через LogIngestService (тот же путь, что parse_log).
+Режим full: полный прогон уже записанного файла при старте (строк в секунду).
+Режим tail: после прогона сервис следит за файлом, а бенчмарк дописывает пакеты строк
+с заданной частотой и замеряет задержку от записи до разбора.
+
+    python bench/bench_log_ingest.py [--mode full tail] [--lines 1000000]
+                                     [--tail-rate 20000] [--tail-batch 500] [--tail-duration 5]
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+from _common import prepare_environment, quiet_logger, percentile, write_results
+
+prepare_environment()
+quiet_logger()
+
+from log_parser import LogIngestService  # noqa: E402
+from loggen import generate_lines, write_log  # noqa: E402
+
+LOG_FILE = os.path.abspath(os.path.join("logs", "SceneServer_bench.log"))
+POLL_INTERVAL = 0.001  # Шаг опроса позиции чтения (в секундах)
+
+
+async def wait_until(predicate, timeout):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Сервис разбора логов не успел обработать данные")
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+async def run(modes, lines, tail_rate, tail_batch, tail_duration):
+    results = {}
+    size = write_log(LOG_FILE, lines)
+    service = LogIngestService([LOG_FILE])
+
+    start = time.perf_counter()
+    task = asyncio.create_task(service.run())
+    await wait_until(lambda: LOG_FILE in service.tailers, timeout=3600)
+    elapsed = time.perf_counter() - start
+    if "full" in modes:
+        results["full"] = {
+            "lines": lines,
+            "bytes": size,
+            "seconds": elapsed,
+            "lines_per_second": lines / elapsed,
+            "megabytes_per_second": size / elapsed / 1e6,
+            "online_players": service.player_handler.snapshot.count,
+        }
+
+    if "tail" in modes:
+        await asyncio.sleep(0.5)  # Наблюдатель watchdog запускается после прогона
+        tailer = service.tailers[LOG_FILE]
+        lags = []
+        written = 0
+        moment = datetime(2024, 5, 2, 0, 0, 0)
+        tail_start = time.perf_counter()
+        with open(LOG_FILE, "a", encoding="utf-8", newline="\n") as f:
+            while time.perf_counter() - tail_start < tail_duration:
+                chunk = "".join(generate_lines(tail_batch, seed=written, start=moment))
+                moment += timedelta(seconds=2)
+                f.write(chunk)
+                f.flush()
+                size += len(chunk.encode("utf-8"))
+                written += tail_batch
+                write_time = time.perf_counter()
+                await wait_until(lambda: tailer.offset >= size, timeout=30)
+                lags.append(time.perf_counter() - write_time)
+                await asyncio.sleep(max(0.0, written / tail_rate - (time.perf_counter() - tail_start)))
+        results["tail"] = {
+            "lines": written,
+            "batch": tail_batch,
+            "target_lines_per_second": tail_rate,
+            "lines_per_second": written / (time.perf_counter() - tail_start),
+            "p50_lag_ms": percentile(lags, 0.50) * 1000,
+            "p99_lag_ms": percentile(lags, 0.99) * 1000,
+        }
+
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", nargs="+", choices=("full", "tail"), default=["full", "tail"])
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--tail-rate", type=float, default=20000, help="Строк в секунду в режиме tail")
+    parser.add_argument("--tail-batch", type=int, default=500, help="Строк в одной дозаписи")
+    parser.add_argument("--tail-duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.mode, args.lines, args.tail_rate, args.tail_batch, args.tail_duration))
+    write_results("log_ingest", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Пропускная способность обработки запросов (QueryServer.process_datagram без сокета)
+в зависимости от уровня логирования и режима записи: синхронные обработчики
+против очереди с фоновым потоком (LOG_QUEUE_ENABLED). Каждый вариант запускается
+в отдельном процессе, так как логгер настраивается один раз при импорте.
+
+    python bench/bench_logging.py [--requests 200000] [--sample-rate 100]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+from _common import prepare_environment, write_results
+
+VARIANTS = (
+    ("sync", "DEBUG"), ("sync", "INFO"), ("sync", "WARNING"),
+    ("queue", "DEBUG"), ("queue", "INFO"), ("queue", "WARNING"),
+)
+
+
+def run_variant(mode, level, requests, sample_rate, results):
+    prepare_environment()
+    sys.stderr = open(os.devnull, "w")  # Консольный обработчик не должен засорять вывод
+    import constants
+    constants.LOG_QUEUE_ENABLED = mode == "queue"
+    constants.LOG_LEVEL = level
+    constants.LOG_PACKET_SAMPLE_RATE = sample_rate
+
+    from query_guard import QueryRateLimiter
+    from logger_config import sample_packet
+    from query_server import QueryServer
+    server = QueryServer("127.0.0.1", 0, [])
+    server.rate_limiter = QueryRateLimiter(10 ** 9, 10 ** 9, 2)
+    addr = ("127.0.0.1", 40000)
+    challenge = server.process_datagram(b'\xFF\xFF\xFF\xFFU\xFF\xFF\xFF\xFF', addr)[5:9]
+    packets = (
+        b'\xFF\xFF\xFF\xFFTSource Engine Query\x00' + challenge,
+        b'\xFF\xFF\xFF\xFFU' + challenge,
+        b'\xFF\xFF\xFF\xFFU\xFF\xFF\xFF\xFF',
+    )
+
+    start = time.perf_counter()
+    for index in range(requests):
+        sample_packet()
+        server.process_datagram(packets[index % 3], addr)
+    elapsed = time.perf_counter() - start
+
+    import logging
+    logging.shutdown()  # Дожидаемся записи очереди, чтобы учесть размер лога
+    results[f"{mode}_{level}"] = {
+        "requests_per_second": requests / elapsed,
+        "log_bytes": os.path.getsize(os.path.join("logs", "server.log")),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--sample-rate", type=int, default=100, help="LOG_PACKET_SAMPLE_RATE (1 - без выборки)")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        results = manager.dict()
+        for mode, level in VARIANTS:
+            process = context.Process(target=run_variant, args=(mode, level, args.requests, args.sample_rate, results))
+            process.start()
+            process.join()
+        results = dict(results)
+
+    prepare_environment()
+    write_results("logging_throughput", results)
+
+
+if __name__ == "__main__":
+    main()
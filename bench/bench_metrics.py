@@ -0,0 +1,92 @@
+"""
+Стоимость инструментирования горячего пути: QueryServer.route_request с гистограммой задержки
+против той же маршрутизации без метрик. Накладные расходы проверяются на сервере с пустыми
+обработчиками (иначе их заглушает шум обработки), реальные обработчики замеряются для справки.
+Скрипт завершается с ошибкой, если накладные расходы превышают --max-overhead-ns на запрос.
+
+    python bench/bench_metrics.py [--iterations 200000] [--max-overhead-ns 1000]
+"""
+import argparse
+import struct
+import sys
+import time
+
+from _common import prepare_environment, quiet_logger, write_results
+
+prepare_environment()
+quiet_logger()
+
+from handlers import classify_request  # noqa: E402
+from metrics import Histogram, Metrics  # noqa: E402
+from query_server import QueryServer  # noqa: E402
+
+ADDR = ("127.0.0.1", 40000)
+
+
+def route_plain(server, data, addr):
+    """
+    Маршрутизация без метрик (как до инструментирования).
+    """
+    route = server.routes.get(classify_request(data))
+    if route is None:
+        server.dropped_requests += 1
+        return None
+    return route(data, addr)
+
+
+def measure(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def compare(server, packets, iterations):
+    results = {}
+    for name, data in packets.items():
+        # Чередуем замеры, чтобы шум машины влиял на оба варианта одинаково
+        plain_ns = instrumented_ns = float("inf")
+        for _ in range(5):
+            plain_ns = min(plain_ns, measure(lambda: route_plain(server, data, ADDR), iterations))
+            instrumented_ns = min(instrumented_ns, measure(lambda: server.route_request(data, ADDR), iterations))
+        results[name] = {
+            "plain_ns_per_request": plain_ns,
+            "instrumented_ns_per_request": instrumented_ns,
+            "overhead_ns": instrumented_ns - plain_ns,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--max-overhead-ns", type=float, default=1000.0)
+    args = parser.parse_args()
+
+    server = QueryServer("127.0.0.1", 0, [])
+    challenge = struct.pack('<I', server.challenge_numbers.issue(ADDR))
+    packets = {
+        "info": b'\xFF\xFF\xFF\xFFTSource Engine Query\x00' + challenge,
+        "player": b'\xFF\xFF\xFF\xFFU' + challenge,
+        "challenge": b'\xFF\xFF\xFF\xFFU\xFF\xFF\xFF\xFF',
+    }
+
+    results = {"handlers": compare(server, packets, args.iterations)}
+
+    stub = QueryServer("127.0.0.1", 1, [])
+    stub.routes = {request_type: (lambda data, addr: b"") for request_type in stub.routes}
+    results["stub_routes"] = compare(stub, packets, args.iterations)
+    worst = max(entry["overhead_ns"] for entry in results["stub_routes"].values())
+
+    histogram = Histogram()
+    results["histogram_observe_ns"] = measure(lambda: histogram.observe(0.0001), args.iterations)
+    results["render_bytes"] = len(Metrics().render())
+    write_results("metrics_overhead", results)
+
+    if worst > args.max_overhead_ns:
+        print(f"Накладные расходы метрик {worst:.0f} нс превышают допустимые {args.max_overhead_ns:.0f} нс")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Микробенчмарки горячих функций: обработчики запросов (handlers), DDOSProtection.process_ip,
+PlayerHandler.handle_event и проверка заблокированных IP в QueryServer.process_datagram.
+Результат - наносекунды на вызов.
+
+    python bench/bench_micro.py [--iterations 200000] [--players 100] [--blocked 100000]
+"""
+import argparse
+import struct
+import time
+from datetime import datetime, timedelta
+
+from _common import prepare_environment, quiet_logger, write_results
+
+prepare_environment()
+quiet_logger()
+
+import ddos_protection  # noqa: E402
+import handlers  # noqa: E402
+from blocklist import Blocklist  # noqa: E402
+from constants import DDOS_THRESHOLD, DDOS_INTERVAL  # noqa: E402
+from loggen import format_timestamp  # noqa: E402
+from player_handler import PlayerHandler  # noqa: E402
+from query_guard import QueryRateLimiter  # noqa: E402
+from query_server import QueryServer  # noqa: E402
+from response_cache import ResponseCache  # noqa: E402
+
+ADDR = ("127.0.0.1", 40000)
+
+
+def ns_per_call(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def bench_handlers(player_handler, iterations):
+    cache = ResponseCache()
+    challenge_numbers = handlers.ChallengeNumbers()
+    challenge = struct.pack('<I', challenge_numbers.issue(ADDR))
+    info = handlers.A2S_INFO_REQUEST + challenge
+    player = b'\xFF\xFF\xFF\xFFU' + challenge
+    rules = b'\xFF\xFF\xFF\xFFV' + challenge
+    get_challenge = b'\xFF\xFF\xFF\xFFU\xFF\xFF\xFF\xFF'
+    snapshot = player_handler.snapshot
+    return {
+        "classify_request": ns_per_call(lambda: handlers.classify_request(info), iterations),
+        "handle_info_query": ns_per_call(lambda: handlers.handle_info_query(
+            info, ADDR, player_handler, cache, challenge_numbers, True), iterations),
+        "handle_challenge_query": ns_per_call(lambda: handlers.handle_challenge_query(
+            get_challenge, ADDR, challenge_numbers), iterations),
+        "handle_player_query": ns_per_call(lambda: handlers.handle_player_query(
+            player, ADDR, challenge_numbers, player_handler, cache), iterations),
+        "handle_rules_query": ns_per_call(lambda: handlers.handle_rules_query(
+            rules, ADDR, challenge_numbers, cache), iterations),
+        "build_player_template": ns_per_call(lambda: handlers.build_player_template(snapshot.players), iterations // 10),
+        "build_player_response": ns_per_call(lambda: handlers.build_player_response(snapshot.players), iterations // 10),
+    }
+
+
+def bench_ddos(iterations):
+    limiter = ddos_protection.DDOSProtection(DDOS_THRESHOLD, DDOS_INTERVAL)
+    moment = datetime(2024, 5, 1, 12, 0, 0)
+    events = [
+        (f"10.0.{i >> 8 & 255}.{i & 255}", format_timestamp(moment + timedelta(milliseconds=i)))
+        for i in range(iterations)
+    ]
+    process_ip = limiter.process_ip
+    start = time.perf_counter()
+    for ip_address, timestamp in events:
+        process_ip(ip_address, timestamp)
+    return {"process_ip": (time.perf_counter() - start) / iterations * 1e9}
+
+
+def bench_player_events(player_handler, iterations, players):
+    steam_ids = [str(76561198100000000 + i) for i in range(players)]
+    handle_event = player_handler.handle_event
+    start = time.perf_counter()
+    for i in range(iterations):
+        steam_id = steam_ids[i % players]
+        handle_event(steam_id, f"Player{i % players}", "login", "bench.log")
+        handle_event(steam_id, None, "logout", "bench.log")
+    return {"handle_event_login_logout_pair": (time.perf_counter() - start) / iterations * 1e9}
+
+
+def bench_blocked_ips(iterations, blocked):
+    """
+    process_datagram без списка блокировок, с blocked заблокированными адресами
+    (источник не заблокирован) и для заблокированного источника.
+    """
+    server = QueryServer("127.0.0.1", 0, [])
+    server.rate_limiter = QueryRateLimiter(10 ** 9, 10 ** 9, 2)
+    challenge = server.process_datagram(b'\xFF\xFF\xFF\xFFU\xFF\xFF\xFF\xFF', ADDR)[5:9]
+    info = handlers.A2S_INFO_REQUEST + challenge
+    results = {"process_datagram_no_blocklist": ns_per_call(lambda: server.process_datagram(info, ADDR), iterations)}
+
+    blocklist = Blocklist(86400, "bench_blocked_ips.bin", "missing_legacy.json")
+    for i in range(blocked):
+        blocklist.add((10 << 24) + i)
+    server.blocked_ips = blocklist
+    results["process_datagram_allowed"] = ns_per_call(lambda: server.process_datagram(info, ADDR), iterations)
+    blocked_addr = ("10.0.0.1", 40000)
+    results["process_datagram_blocked"] = ns_per_call(lambda: server.process_datagram(info, blocked_addr), iterations)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--players", type=int, default=100, help="Онлайн-игроков во время замеров обработчиков")
+    parser.add_argument("--blocked", type=int, default=100_000, help="Заблокированных IP при замере process_datagram")
+    args = parser.parse_args()
+
+    player_handler = PlayerHandler()
+    for i in range(args.players):
+        player_handler.handle_event(str(76561198000000000 + i), f"Player{i}", "login", "online.log")
+
+    results = {
+        "handlers_ns": bench_handlers(player_handler, args.iterations),
+        "ddos_ns": bench_ddos(args.iterations),
+        "player_handler_ns": bench_player_events(player_handler, args.iterations // 10, args.players),
+        "query_guard_ns": bench_blocked_ips(args.iterations, args.blocked),
+    }
+    write_results("micro", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Прогон истории большого файла логов: прежнее чтение readlines() (весь файл в str),
+текущее потоковое чтение LogTailer (декодирование каждой строки) и MappedLogReader
+(mmap, байтовый поиск маркеров, декодирование только найденных строк).
+Для сравнения со скоростью диска замеряется простое чтение файла блоками.
+Каждый вариант запускается в отдельном процессе; сообщаются МБ/с и прирост пикового RSS.
+Код возврата 1, если количество найденных событий различается.
+
+    python bench/bench_mmap_replay.py [--size-gb 2] [--variants disk mmap tailer readlines]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+from _common import prepare_environment, write_results
+from loggen import write_log
+
+BASE_LINES = 500_000  # Строк в сгенерированном блоке, который повторяется до нужного размера файла
+
+
+def max_rss_kb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def replay_disk(log_file):
+    with open(log_file, "rb") as f:
+        while f.read(1 << 20):
+            pass
+    return None
+
+
+def replay_readlines(log_file):
+    from log_parser import classify_line
+    with open(log_file, "r", encoding="utf-8", errors="replace") as f:
+        lines = f.readlines()
+    return sum(1 for line in lines if classify_line(line) is not None)
+
+
+def replay_tailer(log_file):
+    from log_parser import classify_line
+    from log_tailer import LogCheckpoints, LogTailer
+    tailer = LogTailer(log_file, LogCheckpoints())
+    events = sum(1 for line in tailer.read_lines() if classify_line(line) is not None)
+    tailer.close()
+    return events
+
+
+def replay_mmap(log_file):
+    from log_parser import LINE_PREFILTER_BYTES, classify_line
+    from log_tailer import MappedLogReader
+    reader = MappedLogReader(log_file)
+    lines = reader.matching_lines(0, os.path.getsize(log_file), LINE_PREFILTER_BYTES)
+    return sum(1 for line in lines if classify_line(line) is not None)
+
+
+VARIANTS = {
+    "disk": replay_disk,
+    "mmap": replay_mmap,
+    "tailer": replay_tailer,
+    "readlines": replay_readlines,
+}
+
+
+def run_variant(name, log_file, results):
+    prepare_environment()
+    sys.stderr = open(os.devnull, "w")  # Консольный обработчик не должен засорять вывод
+    import constants
+    constants.LOG_LEVEL = "WARNING"
+    import log_parser  # noqa: F401 - импорт модулей сервера не входит в замер
+
+    rss_before = max_rss_kb()
+    start = time.perf_counter()
+    events = VARIANTS[name](log_file)
+    elapsed = time.perf_counter() - start
+    rss_after = max_rss_kb()
+    size = os.path.getsize(log_file)
+    results[name] = {
+        "seconds": elapsed,
+        "mb_per_second": size / elapsed / (1 << 20),
+        "events": events,
+        "peak_rss_growth_mb": None if rss_before is None else (rss_after - rss_before) / 1024,
+    }
+
+
+def build_log(path, size):
+    """
+    Генерирует блок синтетических строк и дописывает его копии, пока файл не достигнет size байт.
+    """
+    block_path = path + ".block"
+    write_log(block_path, BASE_LINES)
+    with open(block_path, "rb") as f:
+        block = f.read()
+    os.remove(block_path)
+    with open(path, "wb") as f:
+        written = 0
+        while written < size:
+            f.write(block)
+            written += len(block)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-gb", type=float, default=2.0)
+    parser.add_argument("--variants", nargs="+", choices=sorted(VARIANTS), default=list(VARIANTS))
+    args = parser.parse_args()
+
+    workdir = prepare_environment()
+    log_file = os.path.join(workdir, "SceneServer.log")
+    size = build_log(log_file, int(args.size_gb * (1 << 30)))
+
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        results = manager.dict()
+        for name in args.variants:
+            process = context.Process(target=run_variant, args=(name, log_file, results))
+            process.start()
+            process.join()
+        results = dict(results)
+    os.remove(log_file)
+
+    counts = {result["events"] for result in results.values() if result["events"] is not None}
+    results["file_bytes"] = size
+    results["events_match"] = len(counts) <= 1
+    write_results("mmap_replay", results)
+    if not results["events_match"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Бенчмарк хранения известных игроков: прежний монолитный players_data.json
+(json.load / json.dump с indent=4 целиком, все игроки в памяти) против PlayerStore
+(индекс SQLite с LRU-кэшем): время открытия, пиковая память Python, поиск ника и запись.
+
+    python bench/bench_player_store.py [--sizes 10000 100000 1000000] [--events 1000] [--lookups 100000]
+"""
+import argparse
+import json
+import os
+import random
+import time
+import tracemalloc
+
+from _common import prepare_environment, write_results
+
+prepare_environment()
+
+from player_store import PlayerStore  # noqa: E402
+
+
+def make_players(count):
+    return {str(76561198000000000 + i): f"Player{i}" for i in range(count)}
+
+
+def bench_legacy(players, events):
+    data = {steam_id: {"name": name, "score": 0, "duration": 0.0} for steam_id, name in players.items()}
+    path = "legacy_players_data.json"
+
+    start = time.perf_counter()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+    save_seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(path, "r", encoding="utf-8") as f:
+        loaded = json.load(f)
+    load_seconds = time.perf_counter() - start
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del loaded
+
+    return {
+        "file_bytes": os.path.getsize(path),
+        "load_seconds": load_seconds,
+        "peak_python_bytes": peak_bytes,
+        "save_seconds_per_login": save_seconds,  # Прежний код переписывал файл при каждом входе
+        "save_seconds_for_events": save_seconds * events,
+    }
+
+
+def bench_store(players, events, lookups):
+    store = PlayerStore("bench_players.sqlite3", snapshot_file="missing_snapshot.json",
+                        journal_file="missing_journal.jsonl", legacy_file="missing_legacy.json")
+    store.load()
+
+    start = time.perf_counter()
+    store.write(dict(players))
+    build_seconds = time.perf_counter() - start
+    store.close()
+
+    steam_ids = list(players)
+    tracemalloc.start()
+    start = time.perf_counter()
+    store = PlayerStore("bench_players.sqlite3", snapshot_file="missing_snapshot.json",
+                        journal_file="missing_journal.jsonl", legacy_file="missing_legacy.json")
+    store.load()
+    load_seconds = time.perf_counter() - start
+
+    # Пиковая память: открытие индекса и заполнение кэша поиском по всей истории
+    rng = random.Random(1)
+    for _ in range(lookups):
+        store.get_name(steam_ids[rng.randrange(len(steam_ids))])
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Холодный поиск: случайные игроки за всю историю (в основном промахи кэша)
+    start = time.perf_counter()
+    for _ in range(lookups):
+        store.get_name(steam_ids[rng.randrange(len(steam_ids))])
+    cold_seconds = time.perf_counter() - start
+
+    # Горячий поиск: недавно встречавшиеся игроки (попадания в кэш)
+    recent = steam_ids[:min(len(steam_ids), store.cache_size // 2)]
+    for steam_id in recent:
+        store.get_name(steam_id)
+    start = time.perf_counter()
+    for i in range(lookups):
+        store.get_name(recent[i % len(recent)])
+    hot_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(events):
+        store.record(steam_ids[i % len(steam_ids)], f"Renamed{i}")
+    store.write(store.collect())
+    write_seconds = time.perf_counter() - start
+    store.close()
+
+    return {
+        "index_bytes": os.path.getsize("bench_players.sqlite3"),
+        "build_seconds": build_seconds,
+        "load_seconds": load_seconds,
+        "peak_python_bytes": peak_bytes,
+        "cold_lookup_us": cold_seconds / lookups * 1e6,
+        "hot_lookup_us": hot_seconds / lookups * 1e6,
+        "save_seconds_for_events": write_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--events", type=int, default=1000, help="Количество смен ника для замера записи")
+    parser.add_argument("--lookups", type=int, default=100_000, help="Количество поисков ника")
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        players = make_players(size)
+        results[str(size)] = {
+            "legacy_json": bench_legacy(players, args.events),
+            "sqlite_index": bench_store(players, args.events, args.lookups),
+        }
+    write_results("player_store", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Нагрузочный тест QueryServer асинхронным клиентом с открытым циклом: запросы A2S_INFO,
+GETCHALLENGE и A2S_PLAYER отправляются с заданной частотой независимо от ответов.
+Сервер запускается в отдельном процессе на локальном порту; сеть не требуется.
+
+    python bench/bench_query_load.py [--info-rate 2000] [--challenge-rate 500] [--player-rate 1000]
+                                     [--duration 5] [--engine protocol] [--port 27125]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+
+from _common import prepare_environment, percentile, write_results
+
+prepare_environment()
+
+from loadgen import run_rate_load, serve_locally  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--info-rate", type=float, default=2000)
+    parser.add_argument("--challenge-rate", type=float, default=500)
+    parser.add_argument("--player-rate", type=float, default=1000)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--engine", choices=("protocol", "dgram"), default="protocol")
+    parser.add_argument("--port", type=int, default=27125)
+    args = parser.parse_args()
+
+    server = multiprocessing.Process(target=serve_locally, args=(args.engine, args.port), daemon=True)
+    server.start()
+    time.sleep(1.0)  # Даем серверу привязать сокет
+    rates = {"info": args.info_rate, "challenge": args.challenge_rate, "player": args.player_rate}
+    try:
+        stats = asyncio.run(run_rate_load(("127.0.0.1", args.port), rates, args.duration))
+    finally:
+        server.terminate()
+        server.join()
+
+    results = {"engine": args.engine, "duration": args.duration}
+    for request_type, entry in stats.items():
+        latencies = entry.pop("latencies")
+        entry["target_rate"] = rates[request_type]
+        entry["replies_per_second"] = entry["replies"] / args.duration
+        entry["p50_latency_us"] = (percentile(latencies, 0.50) or 0) * 1e6
+        entry["p99_latency_us"] = (percentile(latencies, 0.99) or 0) * 1e6
+        results[request_type] = entry
+    write_results("query_load", results)
+
+
+if __name__ == "__main__":
+    main()
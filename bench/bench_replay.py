@@ -0,0 +1,146 @@
+"""
+Прогон истории логов при запуске: последовательный разбор в цикле событий против
+разбора диапазонов файлов в пуле процессов (LogIngestService.replay_history).
+Сообщает время прогона и наибольшую задержку цикла событий (насколько query-порт
+не отвечал), сверяет онлайн-игроков (ники и время входа), ники в хранилище и заблокированные IP
+двух вариантов. Код возврата 1, если онлайн-игроки, ники или позиции чтения различаются.
+
+    python bench/bench_replay.py [--files 4] [--lines 500000] [--nicknames 3] [--range-mb 32] [--min-mb 16]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+
+from _common import prepare_environment, write_results
+from loggen import write_log
+
+TICK = 0.005  # Период задачи, измеряющей задержки цикла событий (в секундах)
+PLAYERS = 1000  # Различных Steam ID в файлах логов
+FIRST_STEAM_ID = 76561198000000000  # Steam ID первого игрока в loggen
+
+
+async def measure_stalls(stalls):
+    """
+    Записывает наибольшую задержку пробуждения задачи относительно TICK.
+    """
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        stalls[0] = max(stalls[0], time.perf_counter() - start - TICK)
+
+
+def run_variant(name, log_files, min_bytes, range_bytes, results):
+    prepare_environment()
+    sys.stderr = open(os.devnull, "w")  # Консольный обработчик не должен засорять вывод
+    import constants
+    constants.REPLAY_PARALLEL_MIN_BYTES = min_bytes
+    constants.REPLAY_RANGE_BYTES = range_bytes
+    constants.LOG_LEVEL = "WARNING"
+
+    from log_parser import LogIngestService
+    from log_tailer import LogTailer
+
+    async def replay():
+        service = LogIngestService(log_files)
+        tailers = {}
+        for log_file in log_files:
+            tailers[log_file] = LogTailer(log_file, service.checkpoints)
+            service.register_file_metrics(log_file, tailers[log_file])
+        stalls = [0.0]
+        ticker = asyncio.create_task(measure_stalls(stalls))
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        await service.replay_history(asyncio.get_running_loop(), tailers)
+        elapsed = time.perf_counter() - start
+        await asyncio.sleep(TICK * 2)  # Даем задаче замера учесть последнюю задержку
+        ticker.cancel()
+        return service, elapsed, stalls[0]
+
+    service, elapsed, max_stall = asyncio.run(replay())
+    player_handler = service.player_handler
+    results[name] = {
+        "seconds": elapsed,
+        "max_loop_stall_ms": max_stall * 1000,
+        # Время входа по системным часам, до миллисекунд (точность меток строк лога)
+        "online": sorted(
+            (steam_id, player_name, log_file, round(joined_at, 3))
+            for steam_id, (player_name, log_file, joined_at) in player_handler.export_online_state().items()
+        ),
+        "names": [player_handler.store.get_name(str(FIRST_STEAM_ID + i)) for i in range(PLAYERS)],
+        "blocked": sorted(service.ddos_protection.blocked_ips),
+        "offsets": {log_file: tailer.offset for log_file, tailer in service.tailers.items()},
+    }
+
+
+def online_match(first, second):
+    """
+    Сравнивает онлайн-игроков двух вариантов; время входа переводится на системные часы
+    в разных процессах, поэтому допускается расхождение до миллисекунды.
+    """
+    return len(first) == len(second) and all(
+        a[:3] == b[:3] and abs(a[3] - b[3]) <= 0.001 for a, b in zip(first, second)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--lines", type=int, default=500_000, help="Строк в каждом файле")
+    parser.add_argument("--ips", type=int, default=200, help="Различных IP в строках подключения")
+    parser.add_argument("--event-ratio", type=float, default=0.02, help="Доля строк с событиями")
+    parser.add_argument("--nicknames", type=int, default=3, help="Различных ников одного игрока")
+    parser.add_argument("--range-mb", type=float, default=32, help="REPLAY_RANGE_BYTES (в МБ)")
+    parser.add_argument("--min-mb", type=float, default=16, help="REPLAY_PARALLEL_MIN_BYTES (в МБ)")
+    args = parser.parse_args()
+
+    workdir = prepare_environment()
+    log_files = []
+    total_bytes = 0
+    for index in range(args.files):
+        path = os.path.join(workdir, f"SceneServer{index}.log")
+        total_bytes += write_log(
+            path, args.lines, seed=index + 1, ips=args.ips, event_ratio=args.event_ratio, players=PLAYERS,
+            nicknames=args.nicknames,
+        )
+        log_files.append(path)
+
+    variants = {
+        "sequential": (1 << 62, 1 << 62),
+        "pool": (int(args.min_mb * (1 << 20)), int(args.range_mb * (1 << 20))),
+    }
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        results = manager.dict()
+        for name, (min_bytes, range_bytes) in variants.items():
+            process = context.Process(target=run_variant, args=(name, log_files, min_bytes, range_bytes, results))
+            process.start()
+            process.join()
+        results = dict(results)
+
+    sequential, pool = results["sequential"], results["pool"]
+    report = {
+        "files": args.files,
+        "bytes": total_bytes,
+        "cpus": os.cpu_count(),
+        "online_players": len(sequential["online"]),
+        "online_match": online_match(sequential["online"], pool["online"]),
+        "names_match": sequential["names"] == pool["names"],
+        "offsets_match": sequential["offsets"] == pool["offsets"],
+        # IP, превысившие порог только в окне на границе диапазонов, пулом не обнаруживаются
+        "blocked_sequential": len(sequential["blocked"]),
+        "blocked_pool": len(pool["blocked"]),
+        "blocked_missed_by_pool": len(set(sequential["blocked"]) - set(pool["blocked"])),
+    }
+    for name in variants:
+        report[name] = {key: results[name][key] for key in ("seconds", "max_loop_stall_ms")}
+    report["speedup"] = sequential["seconds"] / pool["seconds"]
+    write_results("replay", report)
+    if not (report["online_match"] and report["names_match"] and report["offsets_match"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+A/B-сравнение движков обработки UDP-запросов QueryServer ("protocol" и "dgram").
+Для каждого движка поднимает сервер на локальном порту, нагружает его генератором
+A2S_INFO и сообщает пакеты в секунду и p99 задержки ответа.
+
+    python bench/bench_udp_engines.py [--clients 4] [--duration 5] [--port 27115]
+"""
+import argparse
+import multiprocessing
+import time
+
+from _common import prepare_environment, percentile, write_results
+
+prepare_environment()
+
+from loadgen import run_load, serve_locally  # noqa: E402
+
+
+def bench_engine(engine, port, clients, duration):
+    server = multiprocessing.Process(target=serve_locally, args=(engine, port), daemon=True)
+    server.start()
+    time.sleep(1.0)  # Даем серверу привязать сокет
+    try:
+        stats = run_load(("127.0.0.1", port), clients=clients, duration=duration)
+    finally:
+        server.terminate()
+        server.join()
+
+    latencies = stats.pop("latencies")
+    stats["packets_per_second"] = stats["replies"] / duration
+    stats["p50_latency_us"] = (percentile(latencies, 0.50) or 0) * 1e6
+    stats["p99_latency_us"] = (percentile(latencies, 0.99) or 0) * 1e6
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--port", type=int, default=27115)
+    args = parser.parse_args()
+
+    results = {}
+    for offset, engine in enumerate(("dgram", "protocol")):
+        results[engine] = bench_engine(engine, args.port + offset, args.clients, args.duration)
+    write_results("udp_engines", results)
+
+
+if __name__ == "__main__":
+    main()
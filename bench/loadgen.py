@@ -0,0 +1,184 @@
+"""
+Локальный генератор UDP-нагрузки для QueryServer.
+run_load: клиентские процессы в режиме ping-pong отправляют запрос и ждут ответ,
+измеряя задержку каждого ответа. Если сервер отвечает challenge (S2C_CHALLENGE),
+клиент, как настоящий браузер серверов, повторяет запрос с этим challenge.
+run_rate_load: асинхронный клиент с открытым циклом, отправляющий запросы каждого типа
+с заданной частотой независимо от ответов.
+"""
+import asyncio
+import multiprocessing
+import socket
+import time
+from collections import deque
+
+A2S_INFO_REQUEST = b'\xFF\xFF\xFF\xFFTSource Engine Query\x00'
+CHALLENGE_REQUEST = b'\xFF\xFF\xFF\xFFU\xFF\xFF\xFF\xFF'
+CHALLENGE_RESPONSE_PREFIX = b'\xFF\xFF\xFF\xFFA'
+CHALLENGE_REFRESH_INTERVAL = 5.0  # Интервал обновления challenge клиентом (в секундах)
+SEND_TICK = 0.001  # Шаг планировщика отправки (в секундах)
+
+
+def serve_locally(engine, port):
+    """
+    Запускает QueryServer без парсинга логов (только обслуживание порта) в текущем процессе.
+    Ограничение частоты отключено: все клиенты генератора идут с одного IP.
+    """
+    from _common import quiet_logger
+    quiet_logger()
+    from query_guard import QueryRateLimiter
+    from query_server import QueryServer
+    server = QueryServer("127.0.0.1", port, [], engine=engine)
+    server.rate_limiter = QueryRateLimiter(10 ** 9, 10 ** 9, 2)
+    asyncio.run(server.serve())
+
+
+def with_challenge(payload, challenge):
+    """
+    Подставляет challenge в запрос: для A2S_INFO дописывается в конец, для остальных заменяет последние 4 байта.
+    """
+    if payload.startswith(A2S_INFO_REQUEST):
+        return A2S_INFO_REQUEST + challenge
+    return payload[:5] + challenge
+
+
+def run_client(addr, payload, duration, results):
+    """
+    Отправляет запросы на addr в течение duration секунд и кладет статистику в очередь results.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(1.0)
+    latencies = []
+    timeouts = 0
+    deadline = time.perf_counter() + duration
+    while True:
+        start = time.perf_counter()
+        if start >= deadline:
+            break
+        sock.sendto(payload, addr)
+        try:
+            response, _ = sock.recvfrom(65535)
+            if response.startswith(CHALLENGE_RESPONSE_PREFIX) and not payload.endswith(b'\xFF\xFF\xFF\xFF'):
+                sock.sendto(with_challenge(payload, response[5:9]), addr)
+                sock.recvfrom(65535)
+        except socket.timeout:
+            timeouts += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+    sock.close()
+    results.put({"replies": len(latencies), "timeouts": timeouts, "latencies": latencies})
+
+
+def run_load(addr, payload=A2S_INFO_REQUEST, clients=4, duration=5.0):
+    """
+    Запускает clients клиентских процессов и возвращает сводную статистику.
+    """
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=run_client, args=(addr, payload, duration, results))
+        for _ in range(clients)
+    ]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    latencies = [latency for item in collected for latency in item["latencies"]]
+    return {
+        "clients": clients,
+        "duration": duration,
+        "replies": len(latencies),
+        "timeouts": sum(item["timeouts"] for item in collected),
+        "latencies": latencies,
+    }
+
+
+class RateClient(asyncio.DatagramProtocol):
+    def __init__(self, request_type):
+        """
+        Клиент одного типа запросов ('info', 'challenge' или 'player') со своим сокетом.
+        Ответы сопоставляются с запросами по порядку (FIFO): сервер отвечает в порядке получения.
+        """
+        self.request_type = request_type
+        self.transport = None
+        self.challenge = None
+        self.ready = asyncio.Event()
+        self.pending = deque()  # Время отправки запросов, ожидающих ответа
+        self.sent = 0
+        self.latencies = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if self.request_type != "challenge" and data.startswith(CHALLENGE_RESPONSE_PREFIX):
+            self.challenge = data[5:9]  # Ответ на служебный запрос обновления challenge
+            self.ready.set()
+            return
+        if self.pending:
+            self.latencies.append(time.perf_counter() - self.pending.popleft())
+
+    def payload(self):
+        if self.request_type == "info":
+            return A2S_INFO_REQUEST + self.challenge
+        if self.request_type == "player":
+            return b'\xFF\xFF\xFF\xFFU' + self.challenge
+        return CHALLENGE_REQUEST
+
+    def send(self):
+        self.pending.append(time.perf_counter())
+        self.sent += 1
+        self.transport.sendto(self.payload())
+
+    def refresh_challenge(self):
+        if self.request_type != "challenge":
+            self.transport.sendto(CHALLENGE_REQUEST)
+
+
+async def run_rate_load(addr, rates, duration, drain=0.5):
+    """
+    Отправляет запросы с частотой rates ({тип: запросов в секунду}) в течение duration секунд.
+    :return: {тип: {sent, replies, lost, latencies}}.
+    """
+    loop = asyncio.get_running_loop()
+    clients = {}
+    for request_type, rate in rates.items():
+        if rate <= 0:
+            continue
+        _, client = await loop.create_datagram_endpoint(lambda t=request_type: RateClient(t), remote_addr=addr)
+        clients[request_type] = client
+        if request_type == "challenge":
+            client.ready.set()
+        else:
+            client.refresh_challenge()
+    await asyncio.wait_for(asyncio.gather(*(client.ready.wait() for client in clients.values())), timeout=5)
+
+    start = time.perf_counter()
+    last_refresh = start
+    while True:
+        now = time.perf_counter()
+        elapsed = now - start
+        if elapsed >= duration:
+            break
+        for request_type, client in clients.items():
+            due = int(elapsed * rates[request_type]) - client.sent
+            for _ in range(due):
+                client.send()
+        if now - last_refresh >= CHALLENGE_REFRESH_INTERVAL:
+            for client in clients.values():
+                client.refresh_challenge()
+            last_refresh = now
+        await asyncio.sleep(SEND_TICK)
+    await asyncio.sleep(drain)  # Ждем последние ответы
+
+    results = {}
+    for request_type, client in clients.items():
+        client.transport.close()
+        results[request_type] = {
+            "sent": client.sent,
+            "replies": len(client.latencies),
+            "lost": client.sent - len(client.latencies),
+            "latencies": client.latencies,
+        }
+    return results
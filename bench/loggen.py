@@ -0,0 +1,77 @@
+"""
+Генератор синтетических логов MOE (LobbyServer/SceneServer) для бенчмарков.
+Большая часть строк - "шум" без событий, небольшая доля - подключения, входы и выходы игроков.
+"""
+import random
+from datetime import datetime, timedelta
+
+NOISE_TEMPLATES = (
+    "LogNet: Display: UChannel::ReceivedSequencedBunch: Bunch.bClose == true. ChIndex == {n}",
+    "LogSGGame: Warning: ASGCharacter::TickActor Actor is too far from player {n}",
+    "LogOnline: Verbose: OSS: Session state changed, active players {n}",
+    "LogScript: Warning: Script Msg: Item {n} not found in inventory table",
+    "LogNetTraffic: Error: ReceivedPacket - Packet too small, channel {n}",
+)
+
+
+def format_timestamp(moment):
+    """
+    Форматирует время в виде метки лога MOE: 2024.05.01-12.00.00:123.
+    """
+    return moment.strftime("%Y.%m.%d-%H.%M.%S:") + f"{moment.microsecond // 1000:03d}"
+
+
+def generate_lines(count, seed=1, event_ratio=0.02, ips=10000, players=1000, start=None, nicknames=1):
+    """
+    Генерирует count строк лога (с переводом строки на конце).
+    :param event_ratio: Доля строк с событиями (подключение, вход, выход).
+    :param ips: Количество различных IP-адресов в строках подключения.
+    :param players: Количество различных Steam ID.
+    :param nicknames: Количество различных ников одного Steam ID (больше 1 - игроки меняют ник).
+    """
+    rng = random.Random(seed)
+    moment = start or datetime(2024, 5, 1, 12, 0, 0)
+    step = timedelta(milliseconds=3)
+    for index in range(count):
+        moment += step
+        prefix = f"[{format_timestamp(moment)}][{index % 1000:3d}]"
+        if rng.random() >= event_ratio:
+            yield prefix + rng.choice(NOISE_TEMPLATES).format(n=index) + "\n"
+            continue
+
+        steam_id = 76561198000000000 + rng.randrange(players)
+        kind = rng.randrange(5)
+        if kind == 0:
+            ip = rng.randrange(ips)
+            yield (f"{prefix}LogNet: NotifyAcceptingConnection accepted from: "
+                   f"10.{ip >> 16 & 255}.{ip >> 8 & 255}.{ip & 255}:{rng.randrange(1024, 65535)}\n")
+        elif kind == 1:
+            yield f"{prefix}LogSGGame: PostLogin Account: {steam_id}\n"
+        elif kind == 2:
+            suffix = f"_{rng.randrange(nicknames)}" if nicknames > 1 else ""
+            yield (f"{prefix}LogSGGame: ASGGameModeLobby::LobbyClientLogin "
+                   f"NickName = Player{steam_id % 100000}{suffix}, UniqueId = {steam_id}\n")
+        elif kind == 3:
+            yield f"{prefix}LogSGGame: Logout Account: {steam_id}\n"
+        else:
+            yield f"{prefix}LogSGGame: ASGGameModeLobby::LobbyClientLogOut Account: {steam_id}\n"
+
+
+def write_log(path, count, **kwargs):
+    """
+    Записывает count синтетических строк в файл и возвращает его размер в байтах.
+    """
+    size = 0
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        batch = []
+        for line in generate_lines(count, **kwargs):
+            batch.append(line)
+            if len(batch) >= 10000:
+                chunk = "".join(batch)
+                f.write(chunk)
+                size += len(chunk.encode("utf-8"))
+                batch = []
+        chunk = "".join(batch)
+        f.write(chunk)
+        size += len(chunk.encode("utf-8"))
+    return size
@@ -0,0 +1,59 @@
+"""
+Запускает набор бенчмарков последовательно; каждый пишет свой JSON в bench/results/,
+так что результаты разных запусков можно сравнивать между собой.
+По умолчанию используются короткие параметры (несколько минут), --full - параметры бенчмарков по умолчанию.
+
+    python bench/run_all.py [--full] [--only micro query_load ...]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Имя -> (скрипт, аргументы быстрого прогона)
+SUITE = {
+    "micro": ("bench_micro.py", ["--iterations", "50000"]),
+    "classifier": ("bench_classifier.py", ["--iterations", "200000"]),
+    "line_classifier": ("bench_line_classifier.py", ["--lines", "200000"]),
+    "ddos": ("bench_ddos.py", ["--events", "1000000", "--ips", "100000", "--legacy-events", "100000"]),
+    "player_store": ("bench_player_store.py", ["--sizes", "10000", "100000", "--events", "1000"]),
+    "blocklist": ("bench_blocklist.py", ["--blocks", "20000", "--legacy-blocks", "500"]),
+    "firewall": ("bench_firewall.py", ["--blocks", "200"]),
+    "challenge": ("bench_challenge.py", ["--addresses", "200000"]),
+    "metrics": ("bench_metrics.py", ["--iterations", "100000"]),
+    "logging": ("bench_logging.py", ["--requests", "50000"]),
+    "log_ingest": ("bench_log_ingest.py", ["--lines", "300000", "--tail-duration", "3"]),
+    "mmap_replay": ("bench_mmap_replay.py", ["--size-gb", "0.25"]),
+    "replay": ("bench_replay.py", ["--files", "2", "--lines", "300000", "--range-mb", "4", "--min-mb", "1"]),
+    "udp_engines": ("bench_udp_engines.py", ["--duration", "2"]),
+    "query_load": ("bench_query_load.py", ["--duration", "3"]),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="Параметры бенчмарков по умолчанию (долго)")
+    parser.add_argument("--only", nargs="+", choices=sorted(SUITE), help="Запустить только указанные бенчмарки")
+    args = parser.parse_args()
+
+    failed = []
+    for name in args.only or SUITE:
+        script, quick_args = SUITE[name]
+        command = [sys.executable, os.path.join(BENCH_DIR, script)] + ([] if args.full else quick_args)
+        print(f"=== {name}: {' '.join(command[1:])}", flush=True)
+        start = time.perf_counter()
+        code = subprocess.call(command)
+        print(f"=== {name}: код {code}, {time.perf_counter() - start:.1f} с", flush=True)
+        if code:
+            failed.append(name)
+
+    if failed:
+        print(f"Завершились с ошибкой: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import heapq
+import ipaddress
+import json
+import os
+import socket
+import struct
+import time
+from datetime import datetime
+from logger_config import get_logger
+from write_behind import atomic_write
+
+# Инициализация логгера
+logger = get_logger()
+
+BLOCKLIST_FILE = "blocked_ips.bin"  # Журнал блокировок: записи (IPv4, время окончания блокировки)
+BLOCKED_IPS_FILE = "blocked_ips.json"  # Прежний список {ip: время блокировки ISO} (только для миграции)
+COMPACT_MIN_RECORDS = 10000  # Журнал сворачивается, когда записей больше этого числа и вдвое больше живых блокировок
+
+# Запись журнала: IPv4 в виде целого и время окончания блокировки (Unix time); 0 - снятие блокировки
+RECORD = struct.Struct("<Id")
+IPV4 = struct.Struct("!I")
+
+
+def ip_to_int(ip_address):
+    """
+    Преобразует IPv4-адрес вида 10.0.0.1 в целое число.
+    """
+    return IPV4.unpack(socket.inet_aton(ip_address))[0]
+
+
+def int_to_ip(value):
+    return socket.inet_ntoa(IPV4.pack(value))
+
+
+def aggregate_ranges(addresses):
+    """
+    Объединяет адреса (целые IPv4) в минимальный набор CIDR-диапазонов для массовых правил файрвола.
+    :return: Список строк вида 10.0.0.0/30 (одиночные адреса - без префикса).
+    """
+    ranges = []
+    run_start = run_end = None
+    for value in sorted(addresses):
+        if run_end is not None and value == run_end + 1:
+            run_end = value
+            continue
+        if run_start is not None:
+            ranges.append((run_start, run_end))
+        run_start = run_end = value
+    if run_start is not None:
+        ranges.append((run_start, run_end))
+
+    result = []
+    for first, last in ranges:
+        if first == last:
+            result.append(int_to_ip(first))
+            continue
+        for network in ipaddress.summarize_address_range(ipaddress.IPv4Address(first), ipaddress.IPv4Address(last)):
+            result.append(str(network) if network.prefixlen < 32 else str(network.network_address))
+    return result
+
+
+class Blocklist:
+    def __init__(self, duration, path=BLOCKLIST_FILE, legacy_file=BLOCKED_IPS_FILE):
+        """
+        Список заблокированных IPv4: {целый адрес: время окончания блокировки} и куча
+        (время окончания, адрес) для снятия истекших блокировок за O(log n).
+        Изменения дописываются в двоичный журнал; журнал сворачивается, когда разрастается.
+        :param duration: Длительность блокировки (в секундах).
+        """
+        self.duration = duration
+        self.path = path
+        self.legacy_file = legacy_file
+        self.expires = {}  # {адрес: время окончания блокировки}
+        self.heap = []  # [(время окончания, адрес)]; устаревшие записи отбрасываются при извлечении
+        self.pending = []  # Записи журнала, еще не переданные на запись
+        self.records = 0  # Записей в журнале на диске
+        self.compact = False  # Следующая запись - полный снимок (после неудачной записи)
+        self.version = 0  # Увеличивается при каждом изменении состава блокировок (для публикации в общую память)
+        self.load()
+
+    def __len__(self):
+        return len(self.expires)
+
+    def __contains__(self, ip_address):
+        try:
+            return IPV4.unpack(socket.inet_aton(ip_address))[0] in self.expires
+        except TypeError:  # Адрес уже в виде целого
+            return ip_address in self.expires
+        except OSError:  # Не IPv4
+            return False
+
+    def __iter__(self):
+        return (int_to_ip(value) for value in self.expires)
+
+    def add(self, ip_address, now=None):
+        """
+        Блокирует адрес на duration секунд (повторная блокировка продлевает срок).
+        :return: True, если адрес не был заблокирован.
+        """
+        value = ip_to_int(ip_address) if isinstance(ip_address, str) else ip_address
+        expires_at = (now or time.time()) + self.duration
+        added = value not in self.expires
+        if added:
+            self.version += 1
+        self.expires[value] = expires_at
+        heapq.heappush(self.heap, (expires_at, value))
+        self.pending.append(RECORD.pack(value, expires_at))
+        return added
+
+    def remove(self, ip_address):
+        value = ip_to_int(ip_address) if isinstance(ip_address, str) else ip_address
+        if self.expires.pop(value, None) is None:
+            return False
+        self.version += 1
+        self.pending.append(RECORD.pack(value, 0))  # Запись в куче отбросится при извлечении
+        return True
+
+    def expire(self, now=None):
+        """
+        Снимает блокировки, срок которых истек.
+        :return: Список снятых адресов (целые).
+        """
+        now = now or time.time()
+        heap = self.heap
+        expired = []
+        while heap and heap[0][0] <= now:
+            expires_at, value = heapq.heappop(heap)
+            if self.expires.get(value) == expires_at:
+                del self.expires[value]
+                self.pending.append(RECORD.pack(value, 0))
+                expired.append(value)
+        if expired:
+            self.version += 1
+        return expired
+
+    def cidr_ranges(self):
+        """
+        Возвращает заблокированные адреса, объединенные в CIDR-диапазоны.
+        """
+        return aggregate_ranges(self.expires)
+
+    def collect(self):
+        """
+        Забирает накопленные записи журнала (в потоке цикла событий).
+        Если журнал разросся, вместо них готовит полный снимок живых блокировок.
+        :return: Кортеж (байты для дописывания, байты нового журнала или None).
+        """
+        journal = b"".join(self.pending)
+        self.records += len(journal) // RECORD.size
+        self.pending = []
+        if not self.compact and self.records < max(COMPACT_MIN_RECORDS, 2 * len(self.expires)):
+            return journal, None
+
+        self.compact = False
+        self.records = len(self.expires)
+        return journal, b"".join(RECORD.pack(value, expires_at) for value, expires_at in self.expires.items())
+
+    def restore(self, payload):
+        """
+        Вызывается после неудавшейся записи (в потоке цикла событий): следующая запись будет
+        полным снимком текущих блокировок, поэтому потерянные записи журнала не нужны.
+        Дописывать их повторно нельзя: прерванное дописывание могло оставить в файле неполную запись.
+        """
+        self.compact = True
+
+    def write(self, payload):
+        """
+        Записывает подготовленные данные на диск (в пуле потоков).
+        :return: Количество записанных байт.
+        """
+        journal, snapshot = payload
+        if snapshot is not None:
+            return atomic_write(self.path, snapshot)
+
+        with open(self.path, "ab") as f:
+            f.write(journal)
+            f.flush()
+            os.fsync(f.fileno())
+        return len(journal)
+
+    def load(self):
+        """
+        Восстанавливает блокировки из журнала (или переносит прежний blocked_ips.json).
+        Истекшие блокировки пропускаются.
+        """
+        if not os.path.exists(self.path):
+            self._migrate_legacy()
+        if not os.path.exists(self.path):
+            return
+
+        now = time.time()
+        with open(self.path, "rb") as f:
+            data = f.read()
+        usable = len(data) - len(data) % RECORD.size  # Неполная запись в конце (сбой при дописывании) пропускается
+        for value, expires_at in RECORD.iter_unpack(data[:usable]):
+            if expires_at > now:
+                self.expires[value] = expires_at
+            else:
+                self.expires.pop(value, None)
+        self.records = usable // RECORD.size
+        self.heap = [(expires_at, value) for value, expires_at in self.expires.items()]
+        heapq.heapify(self.heap)
+        logger.info(f"Загружено {len(self.expires)} заблокированных IP из {self.path}.")
+
+    def _migrate_legacy(self):
+        """
+        Переносит прежний blocked_ips.json ({ip: время блокировки ISO}) в журнал.
+        Старый файл переименовывается в blocked_ips.json.migrated.
+        """
+        if not os.path.exists(self.legacy_file):
+            return
+        try:
+            with open(self.legacy_file, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error(f"Ошибка при загрузке заблокированных IP: {e}")
+            return
+
+        records = []
+        for ip_address, blocked_at in legacy.items():
+            try:
+                records.append(RECORD.pack(
+                    ip_to_int(ip_address), datetime.fromisoformat(blocked_at).timestamp() + self.duration
+                ))
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning(f"Пропущена некорректная блокировка {ip_address}: {e}")
+        atomic_write(self.path, b"".join(records))
+        os.replace(self.legacy_file, self.legacy_file + ".migrated")
+        logger.info(f"Перенесено {len(records)} заблокированных IP из {self.legacy_file} в {self.path}.")
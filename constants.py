@@ -20,8 +20,55 @@ IP_PATTERN = re.compile(r'accepted from: (\d+\.\d+\.\d+\.\d+):\d+')
 # Параметры защиты от DDoS
 DDOS_THRESHOLD = 50  # Максимальное количество попыток за интервал
 DDOS_INTERVAL = 5    # Интервал проверки (в секундах)
+DDOS_BUCKETS = 10    # Количество корзин скользящего окна (точность окна - DDOS_INTERVAL / DDOS_BUCKETS)
+DDOS_MAX_TRACKED_IPS = 100000  # Максимальное количество отслеживаемых IP (самые старые вытесняются)
+DDOS_BLOCK_DURATION = 86400  # Длительность блокировки IP (в секундах)
+
+# Применение блокировок в файрволе (пакетами, в пуле потоков)
+FIREWALL_BACKEND = "dry-run"  # dry-run (только журнал), netsh, nftables или ipset
+FIREWALL_BATCH_SIZE = 500  # Максимум адресов в одной команде файрвола
+FIREWALL_BATCH_DELAY = 0.5  # Время накопления пакета после первого запроса (в секундах)
+
+# Параллельный прогон истории логов при запуске (пул процессов)
+REPLAY_PARALLEL_MIN_BYTES = 16 << 20  # Непрочитанные части файлов меньше этого размера читаются в основном процессе
+REPLAY_RANGE_BYTES = 32 << 20  # Примерный размер диапазона файла для одного задания пула
+REPLAY_PROCESSES = None  # Количество процессов пула (None - по числу ядер)
+
+# Метки времени строк лога: UE пишет их в UTC, если сервер не запущен с ключом -LocalLogTimes
+LOG_TIMESTAMPS_UTC = True
+
+# Журналирование сервера
+LOG_LEVEL = "DEBUG"  # Начальный уровень логгера (меняется во время работы через set_log_level)
+LOG_QUEUE_ENABLED = True  # Запись в файл и консоль в фоновом потоке (QueueHandler/QueueListener)
+LOG_QUEUE_SIZE = 10000  # Максимум записей в очереди; при переполнении записи отбрасываются
+LOG_PACKET_SAMPLE_RATE = 100  # Сообщения о каждом UDP-пакете пишутся в лог в одном случае из N
+
+# Эндпоинт метрик в формате Prometheus (только локальный адрес)
+METRICS_ENABLED = True
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+
+# Ограничение частоты запросов к query-порту
+QUERY_RATE_PER_IP = 30  # Максимум пакетов в секунду от одного IP
+QUERY_RATE_GLOBAL = 20000  # Максимум пакетов в секунду суммарно
+QUERY_RATE_TABLE_SIZE = 65536  # Размер таблицы счетчиков по IP (степень двойки, память не растет)
+INFO_CHALLENGE_REQUIRED = True  # Отвечать на A2S_INFO только после подтверждения challenge (защита от усиления)
+CHALLENGE_LIFETIME = 30  # Длина интервала действия challenge number (в секундах)
 
 UNIFIED_LOGIN_PATTERN = re.compile(
     r"(?:PostLogin Account:\s*(\d+))|"
     r"(?:ASGGameModeLobby::LobbyClientLogin NickName = ([^,]+), UniqueId = (\d+))"
-)
\ No newline at end of file
+)
+
+# Единое регулярное выражение для классификации строки лога за один проход.
+# Имя последней совпавшей группы (match.lastgroup) определяет тип события.
+LINE_EVENT_PATTERN = re.compile(
+    r"\[(?P<timestamp>\d{4}\.\d{2}\.\d{2}-\d{2}\.\d{2}\.\d{2}:\d{3})\].*accepted from: (?P<ip>\d+\.\d+\.\d+\.\d+)"
+    r"|PostLogin Account:\s*(?P<login_old>\d+)"
+    r"|ASGGameModeLobby::LobbyClientLogin NickName = (?P<nickname>[^,]+), UniqueId = (?P<login_new>\d+)"
+    r"|Logout Account:\s*(?P<logout_old>\d+)"
+    r"|ASGGameModeLobby::LobbyClientLogOut Account: (?P<logout_new>\d+)"
+)
+
+# Подстроки, без которых строка не может содержать ни одного события (дешевый предфильтр)
+LINE_PREFILTER_TOKENS = ("accepted from", "Login", "Logout", "LogOut")
@@ -1,73 +1,222 @@
-from datetime import datetime, timedelta
-from collections import defaultdict
-import json
-import os
+from datetime import date
+from collections import OrderedDict
+from functools import lru_cache
+import time
 from logger_config import get_logger
-import subprocess
+from constants import (
+    DDOS_BUCKETS, DDOS_MAX_TRACKED_IPS, DDOS_BLOCK_DURATION, FIREWALL_BACKEND, FIREWALL_BATCH_SIZE, FIREWALL_BATCH_DELAY
+)
+from blocklist import Blocklist, int_to_ip
+from firewall import FirewallQueue, create_backend
+from metrics import Metrics
+from write_behind import WriteBehindWriter
 import asyncio
 
 # Инициализация логгера
 logger = get_logger()
 
-BLOCKED_IPS_FILE = "blocked_ips.json"  # Файл для хранения заблокированных IP
+BLOCKLIST_FLUSH_INTERVAL = 5  # Максимальная задержка записи журнала блокировок (в секундах)
+BLOCKLIST_FLUSH_MAX_CHANGES = 1000  # Количество изменений, после которого запись выполняется сразу
 
 
-def load_blocked_ips():
+@lru_cache(maxsize=64)
+def _day_ordinal(date_part):
     """
-    Загружает список заблокированных IP из файла JSON.
+    Возвращает порядковый номер дня для строки вида 2024.05.01 (результат кэшируется).
     """
-    if os.path.exists(BLOCKED_IPS_FILE):
-        try:
-            with open(BLOCKED_IPS_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            logger.error(f"Ошибка при загрузке заблокированных IP: {e}")
-            return {}
-    return {}
+    return date(int(date_part[0:4]), int(date_part[5:7]), int(date_part[8:10])).toordinal()
 
 
-def save_blocked_ips(blocked_ips):
+def parse_log_seconds(timestamp):
     """
-    Сохраняет список заблокированных IP в файл JSON.
+    Преобразует метку времени лога (2024.05.01-12.00.00:123) в целые секунды
+    целочисленной арифметикой, без datetime.strptime. Миллисекунды отбрасываются.
     """
-    try:
-        with open(BLOCKED_IPS_FILE, "w", encoding="utf-8") as f:
-            json.dump(blocked_ips, f, indent=4)
-    except Exception as e:
-        logger.error(f"Ошибка при сохранении заблокированных IP: {e}")
+    return (
+        _day_ordinal(timestamp[0:10]) * 86400
+        + int(timestamp[11:13]) * 3600
+        + int(timestamp[14:16]) * 60
+        + int(timestamp[17:19])
+    )
 
 
-def block_ip(ip_address):
+def parse_log_timestamp_ms(timestamp):
     """
-    Блокирует IP-адрес с помощью команды netsh.
+    Преобразует метку времени лога в миллисекунды.
     """
-    command = f'netsh advfirewall firewall add rule name="Block Specific IP {ip_address}" dir=in action=block remoteip={ip_address}'
-    try:
-        # subprocess.run(command, shell=True, check=True)  # Раскомментируйте, если требуется реальная блокировка
-        logger.info(f"IP-адрес {ip_address} успешно заблокирован.")
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Ошибка при блокировке IP-адреса {ip_address}: {e}")
+    return parse_log_seconds(timestamp) * 1000 + int(timestamp[20:23])
 
 
-class DDOSProtection:
-    def __init__(self, threshold, interval):
+class RateWindow:
+    __slots__ = ("last_bucket", "total", "counts")
+
+    def __init__(self, bucket, buckets):
+        """
+        Скользящее окно подключений одного IP: кольцо счетчиков фиксированного размера.
         """
-        Инициализация защиты от DDoS.
+        self.last_bucket = bucket  # Номер последней заполненной корзины
+        self.total = 0  # Сумма счетчиков в окне
+        self.counts = [0] * buckets
+
+
+class ConnectionRateTracker:
+    def __init__(self, threshold, interval, buckets=DDOS_BUCKETS, max_tracked_ips=DDOS_MAX_TRACKED_IPS):
+        """
+        Скользящие окна частоты подключений по IP без ввода-вывода и побочных эффектов
+        (используется и в процессах пула при прогоне истории логов).
+        IP, превысившие порог, передаются в threshold_exceeded; по умолчанию они только запоминаются.
         :param threshold: Максимальное количество запросов за интервал.
         :param interval: Интервал времени (в секундах).
+        :param buckets: Количество корзин скользящего окна.
+        :param max_tracked_ips: Максимальное количество отслеживаемых IP.
         """
         self.threshold = threshold
         self.interval = interval
-        self.ip_data = defaultdict(list)  # {ip: [timestamp1, timestamp2, ...]}
-        self.blocked_ips = load_blocked_ips()  # Загружаем заблокированные IP
+        self.buckets = buckets
+        self.bucket_ms = max(1, interval * 1000 // buckets)  # Ширина корзины (в миллисекундах)
+        self.max_tracked_ips = max_tracked_ips
+        self.ip_data = OrderedDict()  # {ip: RateWindow}, порядок - от давно не встречавшихся к недавним
+        self.latest_bucket = 0  # Самая поздняя корзина по времени из логов
+        self.evicted_ips = 0  # Количество IP, вытесненных из-за лимита max_tracked_ips
+        self._last_second = (None, 0)  # Последняя разобранная секунда: строки лога идут по времени подряд
+        self.blocked_ips = {}  # IP, превысившие порог: их подключения больше не учитываются
+
+    def process_ip(self, ip_address, timestamp):
+        """
+        Обрабатывает поступивший IP-адрес и временную метку.
+        Стоимость обработки не зависит от количества подключений IP в окне.
+        """
+        if ip_address in self.blocked_ips:
+            return
+
+        # Метки соседних строк обычно совпадают до секунды: разбираем дату и время только при смене секунды
+        second_prefix, seconds = self._last_second
+        if timestamp[:19] != second_prefix:
+            seconds = parse_log_seconds(timestamp)
+            self._last_second = (timestamp[:19], seconds)
+        bucket = (seconds * 1000 + int(timestamp[20:23])) // self.bucket_ms
+        if bucket > self.latest_bucket:
+            self.latest_bucket = bucket
+
+        window = self.ip_data.get(ip_address)
+        if window is None:
+            window = self.ip_data[ip_address] = RateWindow(bucket, self.buckets)
+            if len(self.ip_data) > self.max_tracked_ips:
+                self.ip_data.popitem(last=False)  # Вытесняем IP, который дольше всех не встречался
+                self.evicted_ips += 1
+        else:
+            self.ip_data.move_to_end(ip_address)
+            self._advance(window, bucket)
+
+        window.counts[bucket % self.buckets] += 1
+        window.total += 1
+
+        # Проверяем, превышает ли количество запросов порог
+        if window.total > self.threshold:
+            del self.ip_data[ip_address]
+            self.threshold_exceeded(ip_address, window.total)
+
+    def threshold_exceeded(self, ip_address, attempts):
+        """
+        Вызывается, когда IP превышает порог подключений за интервал.
+        """
+        self.blocked_ips[ip_address] = None
+
+    def _advance(self, window, bucket):
+        """
+        Сдвигает окно до корзины bucket, обнуляя вышедшие из окна корзины (не более buckets шагов).
+        """
+        gap = bucket - window.last_bucket
+        if gap <= 0:
+            return  # Та же корзина или запись из прошлого: учитываем в текущем окне
+        if gap >= self.buckets:
+            window.counts = [0] * self.buckets
+            window.total = 0
+        else:
+            counts = window.counts
+            for b in range(window.last_bucket + 1, bucket + 1):
+                index = b % self.buckets
+                window.total -= counts[index]
+                counts[index] = 0
+        window.last_bucket = bucket
+
+    def cleanup_old_requests(self):
+        """
+        Удаляет IP, у которых не было подключений в пределах окна.
+        Записи упорядочены по последнему обращению, поэтому просматриваются только устаревшие.
+        """
+        oldest_fresh_bucket = self.latest_bucket - self.buckets
+        while self.ip_data:
+            ip_address, window = next(iter(self.ip_data.items()))
+            if window.last_bucket > oldest_fresh_bucket:
+                break
+            del self.ip_data[ip_address]  # Удаляем IP, если нет актуальных записей
+
+    def export_windows(self):
+        """
+        Возвращает окна, еще не вышедшие за интервал: {ip: (последняя корзина, сумма, счетчики)}.
+        """
+        oldest_fresh_bucket = self.latest_bucket - self.buckets
+        return {
+            ip_address: (window.last_bucket, window.total, window.counts)
+            for ip_address, window in self.ip_data.items() if window.last_bucket > oldest_fresh_bucket
+        }
+
+    def merge_windows(self, windows, latest_bucket):
+        """
+        Объединяет окна из export_windows другого трекера с текущими (более новое окно IP сохраняется).
+        """
+        self.latest_bucket = max(self.latest_bucket, latest_bucket)
+        for ip_address, (last_bucket, total, counts) in windows.items():
+            if ip_address in self.blocked_ips:
+                continue
+            window = self.ip_data.get(ip_address)
+            if window is not None and window.last_bucket > last_bucket:
+                continue  # Текущее окно новее окна из прогона
+            window = self.ip_data[ip_address] = RateWindow(last_bucket, self.buckets)
+            window.total = total
+            window.counts = list(counts)
+            self.ip_data.move_to_end(ip_address)
+        while len(self.ip_data) > self.max_tracked_ips:
+            self.ip_data.popitem(last=False)
+            self.evicted_ips += 1
+
+
+class DDOSProtection(ConnectionRateTracker):
+    def __init__(self, threshold, interval, buckets=DDOS_BUCKETS, max_tracked_ips=DDOS_MAX_TRACKED_IPS):
+        """
+        Инициализация защиты от DDoS: окна частоты подключений, список блокировок на диске и файрвол.
+        :param threshold: Максимальное количество запросов за интервал.
+        :param interval: Интервал времени (в секундах).
+        :param buckets: Количество корзин скользящего окна.
+        :param max_tracked_ips: Максимальное количество отслеживаемых IP.
+        """
+        super().__init__(threshold, interval, buckets, max_tracked_ips)
+        self.blocked_ips = Blocklist(DDOS_BLOCK_DURATION)  # Загружаем заблокированные IP
+        self.persistence = WriteBehindWriter(
+            "blocklist", self.blocked_ips.collect, self.blocked_ips.write,
+            BLOCKLIST_FLUSH_INTERVAL, BLOCKLIST_FLUSH_MAX_CHANGES, restore=self.blocked_ips.restore
+        )
+        self.firewall = FirewallQueue(create_backend(FIREWALL_BACKEND), FIREWALL_BATCH_SIZE, FIREWALL_BATCH_DELAY)
         self.cleanup_task = None  # Задача для периодической очистки
 
+        metrics = Metrics()
+        self.blocks = metrics.counter("moe_ddos_blocks_total", "IP, заблокированные защитой от DDoS")
+        metrics.gauge("moe_ddos_tracked_ips", "IP в окне частоты подключений", lambda: len(self.ip_data))
+        metrics.gauge("moe_ddos_blocked_ips", "Заблокированные IP", lambda: len(self.blocked_ips))
+        metrics.gauge(
+            "moe_ddos_evicted_ips_total", "IP, вытесненные из окна по лимиту", lambda: self.evicted_ips, kind="counter"
+        )
+
     def start_cleanup_task(self, loop):
         """
         Запускает фоновую задачу для периодической очистки старых записей и разблокировки IP.
         """
         if self.cleanup_task is None or self.cleanup_task.done():
             self.cleanup_task = loop.create_task(self.periodic_cleanup())
+        self.persistence.start(loop)  # Журнал блокировок пишется только при изменениях
+        self.firewall.sync(self.blocked_ips)  # Правила файрвола приводятся к загруженному списку блокировок
+        self.firewall.start(loop)
 
     async def periodic_cleanup(self):
         """
@@ -76,67 +225,54 @@ class DDOSProtection:
         while True:
             try:
                 await asyncio.sleep(10)  # Очистка каждые 10 секунд
-                current_time = datetime.now()
 
                 # Очистка старых записей
-                for ip in list(self.ip_data.keys()):
-                    self.cleanup_old_requests(ip, current_time)
+                self.cleanup_old_requests()
 
                 # Разблокировка IP по истечении времени
-                self.unblock_old_ips(current_time)
-                save_blocked_ips(self.blocked_ips)  # Сохраняем обновленный список заблокированных IP
+                self.unblock_expired_ips(time.time())
 
             except asyncio.CancelledError:
                 logger.info("Задача периодической очистки остановлена.")
                 break
 
-    def process_ip(self, ip_address, timestamp):
-        """
-        Обрабатывает поступивший IP-адрес и временную метку.
-        """
-        # Преобразуем временную метку в объект datetime
-        timestamp = datetime.strptime(timestamp, "%Y.%m.%d-%H.%M.%S:%f")
-
-        # Добавляем временную метку в список для данного IP
-        self.ip_data[ip_address].append(timestamp)
-
-        # Очищаем старые записи (старше интервала)
-        self.cleanup_old_requests(ip_address, timestamp)
+    def threshold_exceeded(self, ip_address, attempts):
+        logger.warning(f"Обнаружен подозрительный IP: {ip_address} (попыток: {attempts}). Блокировка...")
+        self.block_and_save_ip(ip_address)
 
-        # Проверяем, превышает ли количество запросов порог
-        if len(self.ip_data[ip_address]) > self.threshold:
-            logger.warning(
-                f"Обнаружен подозрительный IP: {ip_address} (попыток: {len(self.ip_data[ip_address])}). Блокировка...")
-            self.block_and_save_ip(ip_address)
-            del self.ip_data[ip_address]
-
-    def cleanup_old_requests(self, ip_address, current_time):
+    def block_and_save_ip(self, ip_address):
         """
-        Удаляет старые временные метки для IP-адреса.
+        Блокирует IP-адрес и добавляет его в список заблокированных
+        (правило файрвола и запись на диск - фоновыми задачами).
         """
-        threshold_time = current_time - timedelta(seconds=self.interval)
-        self.ip_data[ip_address] = [t for t in self.ip_data[ip_address] if t > threshold_time]
-        if not self.ip_data[ip_address]:
-            del self.ip_data[ip_address]  # Удаляем IP, если нет актуальных записей
+        self.firewall.block(ip_address)
+        self.blocks.inc()
+        self.blocked_ips.add(ip_address)
+        self.persistence.mark_dirty()
 
-    def block_and_save_ip(self, ip_address):
+    def merge_replay(self, offenders, windows, latest_bucket):
         """
-        Блокирует IP-адрес и сохраняет его в список заблокированных.
+        Объединяет результат параллельного прогона истории логов с текущим состоянием.
+        :param offenders: IP, превысившие порог в одном из диапазонов файла.
+        :param windows: {ip: (последняя корзина, сумма, счетчики)} - окна частоты в конце файла.
+        :param latest_bucket: Самая поздняя корзина прогона.
         """
-        block_ip(ip_address)
-        self.blocked_ips[ip_address] = datetime.now().isoformat()  # Сохраняем время блокировки
-        save_blocked_ips(self.blocked_ips)  # Сохраняем сразу после блокировки
+        for ip_address in offenders:
+            if ip_address in self.blocked_ips:
+                continue
+            logger.warning(f"Обнаружен подозрительный IP: {ip_address} (в истории логов). Блокировка...")
+            self.block_and_save_ip(ip_address)
+            self.ip_data.pop(ip_address, None)
+        self.merge_windows(windows, latest_bucket)
 
-    def unblock_old_ips(self, current_time):
+    def unblock_expired_ips(self, now):
         """
-        Разблокирует IP-адреса, заблокированные более одного дня назад.
+        Разблокирует IP-адреса, срок блокировки которых (DDOS_BLOCK_DURATION) истек.
         """
-        one_day_ago = current_time - timedelta(days=1)
-        for ip, blocked_time in list(self.blocked_ips.items()):
-            try:
-                blocked_time = datetime.fromisoformat(blocked_time)
-                if blocked_time < one_day_ago:
-                    logger.info(f"Разблокировка IP-адреса {ip} (время блокировки истекло).")
-                    del self.blocked_ips[ip]
-            except ValueError as e:
-                logger.error(f"Ошибка при разблокировке IP {ip}: {e}")
\ No newline at end of file
+        expired = self.blocked_ips.expire(now)
+        for value in expired:
+            ip_address = int_to_ip(value)
+            logger.info(f"Разблокировка IP-адреса {ip_address} (время блокировки истекло).")
+            self.firewall.unblock(ip_address)
+        if expired:
+            self.persistence.mark_dirty()
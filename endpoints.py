@@ -0,0 +1,62 @@
+from handlers import build_info_parts, SERVER_NAME, SERVER_MAP, SERVER_STEAM_ID, KEYWORDS, MAX_PLAYERS, SERVER_RULES
+from player_snapshot import PlayerSnapshot
+
+
+class QueryEndpoint:
+    def __init__(self, query_port, game_port, log_files=None, server_ip="0.0.0.0", server_name=SERVER_NAME,
+                 map_name=SERVER_MAP, steam_id=SERVER_STEAM_ID, keywords=KEYWORDS, max_players=MAX_PLAYERS,
+                 rules=SERVER_RULES):
+        """
+        Описание одного query-порта: адрес, статические поля A2S_INFO/A2S_RULES
+        и файлы логов, по которым определяется состав игроков этого сервера.
+        :param query_port: UDP-порт, на котором отвечает сервер.
+        :param game_port: Игровой порт, сообщаемый в A2S_INFO.
+        :param log_files: Файлы логов сервера (None - игроки всех файлов).
+        """
+        self.server_ip = server_ip
+        self.query_port = query_port
+        self.game_port = game_port
+        self.log_files = list(log_files) if log_files is not None else None
+        self.server_name = server_name
+        self.map_name = map_name
+        self.steam_id = steam_id
+        self.keywords = keywords
+        self.max_players = max_players
+        self.rules = tuple(rules)
+        self.info_parts = build_info_parts(server_name, map_name, game_port, steam_id, keywords, max_players)
+
+    def __repr__(self):
+        return f"QueryEndpoint({self.server_name!r}, {self.server_ip}:{self.query_port})"
+
+
+class EndpointPlayers:
+    def __init__(self, source, log_files):
+        """
+        Представление онлайн-игроков одного сервера: из общего снимка (PlayerHandler
+        или PlayerSnapshotReader) отбираются игроки, онлайн в файлах логов этого сервера.
+        Отфильтрованный снимок пересобирается только при смене общего снимка.
+        :param source: Источник общего снимка (атрибут snapshot).
+        :param log_files: Файлы логов сервера.
+        """
+        self.source = source
+        self.log_files = frozenset(log_files)
+        self._base = None
+        self._snapshot = None
+
+    @property
+    def snapshot(self):
+        base = self.source.snapshot
+        if base is not self._base:
+            log_files = self.log_files
+            self._snapshot = PlayerSnapshot(
+                base.generation, tuple(player for player in base.players if player.log_file in log_files)
+            )
+            self._base = base
+        return self._snapshot
+
+    @property
+    def generation(self):
+        return self.snapshot.generation
+
+    def get_online_players(self):
+        return self.snapshot.as_dicts()
@@ -0,0 +1,334 @@
+import asyncio
+import os
+import subprocess
+import tempfile
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from time import perf_counter
+from blocklist import aggregate_ranges, ip_to_int
+from logger_config import get_logger
+from metrics import Metrics
+
+# Инициализация логгера
+logger = get_logger()
+
+COMMAND_TIMEOUT = 60  # Максимальное время выполнения одной команды файрвола (в секундах)
+NETSH_RULE_NAME = "MOE DDoS block"  # Имя всех правил netsh (удаляются вместе по имени)
+NETSH_RULE_ADDRESSES = 1000  # Максимум адресов/диапазонов в одном правиле netsh
+NFT_TABLE = "inet moe_ddos"  # Таблица nftables с набором заблокированных адресов
+IPSET_NAME = "moe-ddos-blocked"  # Набор ipset, на который ссылается правило iptables
+
+
+def run_command(command, script=None):
+    """
+    Выполняет команду файрвола, передавая script на стандартный ввод.
+    :raises subprocess.CalledProcessError: Команда завершилась с ошибкой.
+    """
+    subprocess.run(command, input=script, check=True, capture_output=True, text=True, timeout=COMMAND_TIMEOUT)
+
+
+class FirewallBackend(ABC):
+    """
+    Интерфейс файрвола. Методы синхронные и вызываются FirewallQueue в пуле потоков,
+    по одному пакету за раз; каждый пакет применяется одним запуском внешней команды.
+    """
+    name = "base"
+
+    @abstractmethod
+    def sync(self, addresses):
+        """
+        Приводит правила файрвола к полному списку заблокированных адресов (при запуске).
+        """
+
+    @abstractmethod
+    def block(self, addresses):
+        pass
+
+    @abstractmethod
+    def unblock(self, addresses):
+        pass
+
+
+class DryRunFirewall(FirewallBackend):
+    name = "dry-run"
+
+    def __init__(self):
+        """
+        Файрвол без внешних команд: только журналирует и запоминает примененные пакеты (для тестов и бенчмарков).
+        """
+        self.blocked = set()
+        self.batches = []  # [(операция, количество адресов)]
+
+    def sync(self, addresses):
+        self.blocked = set(addresses)
+        self.batches.append(("sync", len(self.blocked)))
+
+    def block(self, addresses):
+        self.blocked.update(addresses)
+        self.batches.append(("block", len(addresses)))
+        logger.info(f"[dry-run] Блокировка {len(addresses)} IP: {', '.join(addresses[:10])}")
+
+    def unblock(self, addresses):
+        self.blocked.difference_update(addresses)
+        self.batches.append(("unblock", len(addresses)))
+        logger.info(f"[dry-run] Разблокировка {len(addresses)} IP: {', '.join(addresses[:10])}")
+
+
+class NetshFirewall(FirewallBackend):
+    name = "netsh"
+
+    def __init__(self):
+        """
+        Брандмауэр Windows. Правила создаются сценарием netsh -f (один процесс на пакет),
+        соседние адреса объединяются в CIDR-диапазоны, в одном правиле до NETSH_RULE_ADDRESSES записей.
+        Снять блокировку с части адресов правила нельзя, поэтому при разблокировке правила пересоздаются.
+        """
+        self.blocked = set()
+
+    def sync(self, addresses):
+        self.blocked = set(addresses)
+        try:
+            run_command(["netsh", "advfirewall", "firewall", "delete", "rule", f"name={NETSH_RULE_NAME}"])
+        except subprocess.CalledProcessError:
+            pass  # Правил с таким именем еще нет
+        self._run(self._add_rules(self.blocked))
+
+    def block(self, addresses):
+        self.blocked.update(addresses)
+        self._run(self._add_rules(addresses))
+
+    def unblock(self, addresses):
+        self.blocked.difference_update(addresses)
+        self.sync(list(self.blocked))
+
+    @staticmethod
+    def _add_rules(addresses):
+        ranges = aggregate_ranges(ip_to_int(address) for address in addresses)
+        return [
+            f'add rule name="{NETSH_RULE_NAME}" dir=in action=block '
+            f'remoteip={",".join(ranges[i:i + NETSH_RULE_ADDRESSES])}'
+            for i in range(0, len(ranges), NETSH_RULE_ADDRESSES)
+        ]
+
+    @staticmethod
+    def _run(commands):
+        """
+        Выполняет команды контекста advfirewall firewall одним процессом netsh через файл сценария.
+        """
+        if not commands:
+            return
+        fd, script_path = tempfile.mkstemp(suffix=".netsh", text=True)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write("pushd advfirewall firewall\n" + "\n".join(commands) + "\npopd\n")
+            run_command(["netsh", "-f", script_path])
+        finally:
+            os.remove(script_path)
+
+
+class NftablesFirewall(FirewallBackend):
+    name = "nftables"
+
+    def __init__(self):
+        """
+        nftables: адреса хранятся в наборе ядра (поиск за O(1)), одно правило отбрасывает пакеты из набора.
+        Пакет применяется одной транзакцией nft -f -.
+        """
+        self.blocked = set()
+
+    def sync(self, addresses):
+        self.blocked = set(addresses)
+        script = (
+            f"add table {NFT_TABLE}\n"
+            f"flush table {NFT_TABLE}\n"
+            f"table {NFT_TABLE} {{\n"
+            "  set blocked { type ipv4_addr; }\n"
+            "  chain input { type filter hook input priority filter - 10; policy accept; ip saddr @blocked drop; }\n"
+            "}\n"
+        )
+        run_command(["nft", "-f", "-"], script + self._elements("add", self.blocked))
+
+    def block(self, addresses):
+        self.blocked.update(addresses)
+        run_command(["nft", "-f", "-"], self._elements("add", addresses))
+
+    def unblock(self, addresses):
+        present = [address for address in addresses if address in self.blocked]  # Удаление отсутствующего - ошибка
+        self.blocked.difference_update(present)
+        if present:
+            run_command(["nft", "-f", "-"], self._elements("delete", present))
+
+    @staticmethod
+    def _elements(operation, addresses):
+        if not addresses:
+            return ""
+        return f"{operation} element {NFT_TABLE} blocked {{ {', '.join(addresses)} }}\n"
+
+
+class IpsetFirewall(FirewallBackend):
+    name = "ipset"
+
+    def __init__(self):
+        """
+        ipset + iptables: адреса в наборе hash:ip, пакет применяется одним вызовом ipset restore.
+        """
+
+    def sync(self, addresses):
+        run_command(["ipset", "create", IPSET_NAME, "hash:ip", "maxelem", "1048576", "-exist"])
+        rule = ["INPUT", "-m", "set", "--match-set", IPSET_NAME, "src", "-j", "DROP"]
+        try:
+            run_command(["iptables", "-C"] + rule)
+        except subprocess.CalledProcessError:
+            run_command(["iptables", "-I"] + rule)
+        run_command(["ipset", "flush", IPSET_NAME])
+        self.block(list(addresses))
+
+    def block(self, addresses):
+        if addresses:
+            run_command(["ipset", "restore", "-exist"], "".join(f"add {IPSET_NAME} {address}\n" for address in addresses))
+
+    def unblock(self, addresses):
+        if addresses:
+            run_command(["ipset", "restore", "-exist"], "".join(f"del {IPSET_NAME} {address}\n" for address in addresses))
+
+
+FIREWALL_BACKENDS = {
+    "dry-run": DryRunFirewall,
+    "netsh": NetshFirewall,
+    "nftables": NftablesFirewall,
+    "ipset": IpsetFirewall,
+}
+
+
+def create_backend(name):
+    """
+    Создает файрвол по имени из FIREWALL_BACKENDS; при неизвестном имени - dry-run.
+    """
+    backend = FIREWALL_BACKENDS.get(name)
+    if backend is None:
+        logger.error(f"Неизвестный файрвол {name!r}. Используется dry-run.")
+        backend = DryRunFirewall
+    return backend()
+
+
+class FirewallQueue:
+    def __init__(self, backend, batch_size, batch_delay):
+        """
+        Очередь блокировок для файрвола: запросы копятся и применяются пакетами в пуле потоков,
+        поэтому запуск внешних команд не останавливает цикл событий.
+        Повторный запрос для того же адреса заменяет предыдущий (блокировка и разблокировка взаимно сокращаются).
+        :param backend: Экземпляр FirewallBackend.
+        :param batch_size: Максимум адресов в одном пакете.
+        :param batch_delay: Время накопления пакета после первого запроса (в секундах).
+        """
+        self.backend = backend
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.pending = OrderedDict()  # {адрес: (операция, время постановки в очередь)}
+        self.sync_addresses = None  # Полный список адресов для синхронизации при запуске
+        self.task = None
+        self._wakeup = None
+
+        metrics = Metrics()
+        labels = {"backend": backend.name}
+        metrics.gauge(
+            "moe_firewall_queue_depth", "Запросы, ожидающие применения в файрволе", lambda: len(self.pending), labels
+        )
+        self.apply_latency = {
+            operation: metrics.histogram(
+                "moe_firewall_apply_seconds", "Время применения пакета в файрволе", dict(labels, operation=operation)
+            )
+            for operation in ("sync", "block", "unblock")
+        }
+        self.applied = {
+            operation: metrics.counter(
+                "moe_firewall_addresses_total", "Адреса, примененные в файрволе", dict(labels, operation=operation)
+            )
+            for operation in ("sync", "block", "unblock")
+        }
+        self.queue_delay = metrics.histogram(
+            "moe_firewall_queue_delay_seconds", "Время от запроса блокировки до применения в файрволе", labels
+        )
+        self.errors = metrics.counter("moe_firewall_errors_total", "Ошибки применения пакетов в файрволе", labels)
+
+    def block(self, address):
+        self._enqueue(address, "block")
+
+    def unblock(self, address):
+        self._enqueue(address, "unblock")
+
+    def sync(self, addresses):
+        """
+        Запрашивает полную синхронизацию правил со списком адресов (выполняется раньше очереди).
+        """
+        self.sync_addresses = list(addresses)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _enqueue(self, address, operation):
+        self.pending.pop(address, None)
+        self.pending[address] = (operation, perf_counter())
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self, loop):
+        """
+        Запускает фоновую задачу применения, если она еще не запущена.
+        """
+        if self.task is None or self.task.done():
+            self.task = loop.create_task(self.run())
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        if self.pending or self.sync_addresses is not None:
+            self._wakeup.set()  # Запросы поступили до запуска задачи
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                await asyncio.sleep(self.batch_delay)  # Даем пакету накопиться
+                while self.pending or self.sync_addresses is not None:
+                    await self.apply_next_batch()
+        except asyncio.CancelledError:
+            if self.pending:
+                logger.info(f"Очередь файрвола остановлена, не применено запросов: {len(self.pending)}.")
+            raise
+
+    async def apply_next_batch(self):
+        """
+        Применяет синхронизацию или следующий пакет из не более batch_size запросов.
+        """
+        if self.sync_addresses is not None:
+            addresses, self.sync_addresses = self.sync_addresses, None
+            await self._apply("sync", addresses)
+            return
+
+        batch = {"block": [], "unblock": []}
+        enqueued = []
+        while self.pending and len(enqueued) < self.batch_size:
+            address, (operation, enqueued_at) = self.pending.popitem(last=False)
+            batch[operation].append(address)
+            enqueued.append(enqueued_at)
+        for operation, addresses in batch.items():
+            if addresses:
+                await self._apply(operation, addresses)
+
+        now = perf_counter()
+        for enqueued_at in enqueued:
+            self.queue_delay.observe(now - enqueued_at)
+
+    async def _apply(self, operation, addresses):
+        start = perf_counter()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, getattr(self.backend, operation), addresses)
+        except Exception as e:
+            # Пакет не повторяется: при следующем запуске синхронизация восстановит правила по списку блокировок
+            self.errors.inc()
+            logger.error(f"Ошибка файрвола {self.backend.name} ({operation}, адресов: {len(addresses)}): {e}")
+            return
+        duration = perf_counter() - start
+        self.apply_latency[operation].observe(duration)
+        self.applied[operation].inc(len(addresses))
+        logger.info(
+            f"Файрвол {self.backend.name}: {operation} для {len(addresses)} IP применен за {duration * 1000:.1f} мс."
+        )
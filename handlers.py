@@ -1,106 +1,289 @@
+import os
 import struct
-import random
-from logger_config import get_logger
+import time
+import hashlib
+import logging
+from logger_config import get_logger, log_packet
+from constants import CHALLENGE_LIFETIME
 
 # Инициализация логгера
 logger = get_logger()
 
 
-async def handle_info_query(data, addr, players):
+# Заголовок всех пакетов A2S и полный запрос A2S_INFO
+A2S_HEADER = b'\xFF\xFF\xFF\xFF'
+A2S_INFO_REQUEST = A2S_HEADER + b'TSource Engine Query\x00'
+
+# Значения challenge, с которыми клиент запрашивает новый challenge вместо данных
+CHALLENGE_REQUEST_VALUES = (b'\x00\x00\x00\x00', b'\xFF\xFF\xFF\xFF')
+
+# Таблица классификации запросов: (байт типа, длина пакета) -> тип запроса
+REQUEST_TYPES = {
+    (0x54, 25): "info",  # A2S_INFO
+    (0x54, 29): "info",  # A2S_INFO с challenge в конце (новый формат)
+    (0x55, 9): "player",  # A2S_PLAYER (или запрос challenge при значении 0/-1)
+    (0x56, 9): "rules",  # A2S_RULES (или запрос challenge при значении 0/-1)
+    (0x57, 5): "challenge",  # A2S_SERVERQUERY_GETCHALLENGE (устаревший формат)
+}
+
+
+def classify_request(data):
+    """
+    Определяет тип запроса по заголовку, байту типа и длине пакета.
+    Возвращает 'info', 'challenge', 'player', 'rules' или None для неизвестных пакетов.
+    """
+    if len(data) < 5 or not data.startswith(A2S_HEADER):
+        return None
+
+    request_type = REQUEST_TYPES.get((data[4], len(data)))
+    if request_type == "info":
+        return request_type if data.startswith(A2S_INFO_REQUEST) else None
+    if (request_type == "player" or request_type == "rules") and data[5:9] in CHALLENGE_REQUEST_VALUES:
+        return "challenge"
+    return request_type
+
+
+# Параметры ответа A2S_INFO (значения по умолчанию для единственного порта)
+EXTRA_DATA_FLAGS = 0x80 | 0x10 | 0x20 | 0x01  # Флаги: порт, Steam ID, keywords, Game ID
+SERVER_NAME = "[RU][PVE]Big Siberian MOE"  # Название сервера
+SERVER_MAP = "Map_Lobby"  # Карта
+SERVER_GAME_PORT = 6014  # Порт сервера
+SERVER_STEAM_ID = 90263762545778710  # Steam ID сервера
+GAME_ID = 1794810  # Game ID
+MAX_PLAYERS = 100  # Максимум игроков
+SERVER_RULES = (  # Правила сервера для ответа A2S_RULES (дублируют значения из keywords)
+    ("GameMode_s", "SG"),
+    ("MATCHTIMEOUT_f", "120.000000"),
+    ("SESSIONFLAGS", "552"),
+)
+KEYWORDS = "BUILDID:0,OWNINGID:90263762545778710,OWNINGNAME:[RU]Big Siberian MOE,SESSIONFLAGS:552,MATCHTIMEOUT_f:120.000000,GameMode_s:SG"
+
+
+def build_info_parts(server_name=SERVER_NAME, map_name=SERVER_MAP, game_port=SERVER_GAME_PORT,
+                     steam_id=SERVER_STEAM_ID, keywords=KEYWORDS, max_players=MAX_PLAYERS):
+    """
+    Собирает неизменяемые части ответа A2S_INFO (до и после количества игроков).
+    :return: Пара (начало пакета, конец пакета).
+    """
+    head = b''.join((
+        b'\xFF\xFF\xFF\xFF',  # Префикс ответа
+        b'I',  # Тип ответа (A2S_INFO)
+        b'\x11',  # Версия протокола (17)
+        server_name.encode('utf-8') + b'\x00',  # Название сервера
+        map_name.encode('utf-8') + b'\x00',  # Карта
+        b'MOE\x00',  # Папка игры
+        b'MOE\x00',  # Игра
+        b'\x00\x00',  # ID игры (0)
+    ))
+    tail = b''.join((
+        struct.pack('B', max_players),  # Максимум игроков
+        b'\x00',  # Боты (0)
+        b'd',  # Тип сервера ('d' для dedicated)
+        b'w',  # Платформа ('w' для Windows)
+        b'\x00',  # Пароль (password_protected)
+        b'\x01',  # VAC (1 - включен, 0 - выключен)
+        b'1.99\x00',  # Версия игры
+        struct.pack('B', EXTRA_DATA_FLAGS),  # Extra Data Flags
+        struct.pack('<H', game_port),  # Порт сервера (если установлен флаг 0x80)
+        struct.pack('<Q', steam_id),  # Steam ID (если установлен флаг 0x10)
+        keywords.encode('utf-8') + b'\x00',  # Keywords (если установлен флаг 0x20)
+        struct.pack('<Q', GAME_ID),  # Game ID (если установлен флаг 0x01)
+    ))
+    return head, tail
+
+
+# Неизменяемые части ответа A2S_INFO для значений по умолчанию
+INFO_RESPONSE_PARTS = build_info_parts()
+
+
+def build_info_response(player_count, info_parts=INFO_RESPONSE_PARTS):
+    """
+    Собирает пакет ответа A2S_INFO для заданного количества игроков.
+    :param info_parts: Пара (начало, конец) пакета из build_info_parts.
+    """
+    head, tail = info_parts
+    return head + struct.pack('B', min(player_count, 255)) + tail
+
+
+# Поле времени игры в записи игрока A2S_PLAYER (float32, little-endian)
+PLAYER_DURATION = struct.Struct('<f')
+
+
+def build_player_template(players):
+    """
+    Собирает шаблон пакета A2S_PLAYER из записей снимка онлайн-игроков (OnlinePlayer).
+    Время игры меняется каждую секунду, поэтому в шаблоне запоминаются только смещения
+    полей длительности, а сами значения подставляются в render_player_response.
+    :return: Пара (bytearray пакета, кортеж пар (смещение поля длительности, время входа)).
+    """
+    parts = [b'\xFF\xFF\xFF\xFFD', struct.pack('B', min(len(players), 255))]  # Количество игроков
+    durations = []
+    size = 6
+    for idx, player in enumerate(players[:255]):
+        parts.append(struct.pack('B', idx + 1))  # Идентификатор игрока
+        parts.append(player.encoded_name)  # Имя игрока (уже в UTF-8 с завершающим нулем)
+        parts.append(struct.pack('<if', player.score, 0.0))  # Счет и время игры (заполняется при отправке)
+        size += 1 + len(player.encoded_name) + 8
+        durations.append((size - 4, player.joined_at))
+    return bytearray(b''.join(parts)), tuple(durations)
+
+
+def render_player_response(template, now):
+    """
+    Подставляет в шаблон A2S_PLAYER длительность сессий на момент now (time.monotonic).
+    """
+    buffer, durations = template
+    for offset, joined_at in durations:
+        PLAYER_DURATION.pack_into(buffer, offset, max(0.0, now - joined_at))
+    return bytes(buffer)
+
+
+def build_player_response(players):
+    """
+    Собирает пакет ответа A2S_PLAYER с длительностью сессий на текущий момент.
+    """
+    return render_player_response(build_player_template(players), time.monotonic())
+
+
+def build_rules_response(rules):
+    """
+    Собирает пакет ответа A2S_RULES из пар (имя, значение).
+    """
+    parts = [b'\xFF\xFF\xFF\xFFE', struct.pack('<H', len(rules))]  # Количество правил
+    for name, value in rules:
+        parts.append(name.encode('utf-8') + b'\x00' + value.encode('utf-8') + b'\x00')
+    return b''.join(parts)
+
+
+class ChallengeNumbers:
+    def __init__(self, lifetime=CHALLENGE_LIFETIME, secret=None):
+        """
+        Выдача и проверка challenge number без хранения состояния по адресам.
+        Challenge вычисляется как ключевой хэш (BLAKE2s, аналог HMAC) от адреса клиента и номера
+        временного интервала со случайным секретом процесса, поэтому поток запросов challenge
+        с подменных адресов не расходует память.
+        Challenge действителен в течение текущего и следующего интервала (от lifetime до 2 * lifetime секунд).
+        :param lifetime: Длина временного интервала (в секундах).
+        :param secret: Секретный ключ (по умолчанию случайный при запуске процесса).
+        """
+        self.lifetime = lifetime
+        self.secret = secret if secret is not None else os.urandom(32)
+        self.rejected = 0  # Количество запросов с некорректным challenge number
+
+    def _compute(self, addr, interval):
+        digest = hashlib.blake2s(
+            f"{addr[0]}|{addr[1]}|{interval}".encode(), digest_size=4, key=self.secret
+        ).digest()
+        number = int.from_bytes(digest, 'little')
+        # Значения 0 и -1 означают запрос нового challenge и не могут быть выданы клиенту
+        return number if 0 < number < 0xFFFFFFFF else 1
+
+    def issue(self, addr):
+        """
+        Возвращает challenge number для адреса в текущем временном интервале.
+        """
+        return self._compute(addr, int(time.monotonic() // self.lifetime))
+
+    def verify(self, addr, challenge_number):
+        """
+        Проверяет challenge number адреса для текущего или предыдущего временного интервала.
+        """
+        interval = int(time.monotonic() // self.lifetime)
+        return (challenge_number == self._compute(addr, interval)
+                or challenge_number == self._compute(addr, interval - 1))
+
+
+def handle_info_query(data, addr, player_handler, response_cache, challenge_numbers=None, require_challenge=False,
+                      info_parts=INFO_RESPONSE_PARTS):
     """
     Обрабатывает запрос A2S_INFO.
+    Ответ берется из кэша и пересобирается только при изменении состава игроков.
+    :param info_parts: Неизменяемые части ответа (название, карта, порт и т.д.) из build_info_parts.
+    При require_challenge ответ A2S_INFO (много больше запроса) отправляется только на запрос
+    с подтвержденным challenge, а на запрос без него отправляется короткий challenge,
+    чтобы сервер нельзя было использовать для усиления трафика с подменных адресов.
     """
-    logger.info(f"Получен корректный запрос A2S_INFO от {addr}")
+    log_packet(logging.INFO, "Получен корректный запрос A2S_INFO от %s", addr)
 
-    # Формируем ответ
-    extra_data_flags = 0x80 | 0x10 | 0x20 | 0x01  # Флаги: порт, Steam ID, keywords, Game ID
-    packed_port = struct.pack('<H', 6014)  # Порт сервера (16-битное целое, little-endian)
-    steam_id = 90263762545778710
-    packed_steam_id = struct.pack('<Q', steam_id)  # Steam ID (uint64, little-endian)
-    game_id = 1794810
-    packed_game_id = struct.pack('<Q', game_id)  # Game ID (uint64, little-endian)
-    keywords = b'BUILDID:0,OWNINGID:90263762545778710,OWNINGNAME:[RU]Big Siberian MOE,SESSIONFLAGS:552,MATCHTIMEOUT_f:120.000000,GameMode_s:SG\x00'
-
-    response = (
-            b'\xFF\xFF\xFF\xFF' +  # Префикс ответа
-            b'I' +  # Тип ответа (A2S_INFO)
-            b'\x11' +  # Версия протокола (17)
-            b'[RU][PVE]Big Siberian MOE\x00' +  # Название сервера
-            b'Map_Lobby\x00' +  # Карта
-            b'MOE\x00' +  # Папка игры
-            b'MOE\x00' +  # Игра
-            b'\x00\x00' +  # ID игры (0)
-            struct.pack('B', len(players)) +  # Игроки (текущее количество)
-            b'\x64' +  # Максимум игроков (100)
-            b'\x00' +  # Боты (0)
-            b'd' +  # Тип сервера ('d' для dedicated)
-            b'w' +  # Платформа ('w' для Windows)
-            b'\x00' +  # Пароль (password_protected)
-            b'\x01' +  # VAC (1 - включен, 0 - выключен)
-            b'1.99\x00' +  # Версия игры
-            struct.pack('B', extra_data_flags) +  # Extra Data Flags
-            packed_port +  # Порт сервера (если установлен флаг 0x80)
-            packed_steam_id +  # Steam ID (если установлен флаг 0x10)
-            keywords +  # Keywords (если установлен флаг 0x20)
-            packed_game_id  # Game ID (если установлен флаг 0x01)
-    )
-    logger.debug(f"Отправлен ответ на запрос A2S_INFO: {response}")
+    if require_challenge:
+        if len(data) == len(A2S_INFO_REQUEST) or data[-4:] in CHALLENGE_REQUEST_VALUES:
+            return handle_challenge_query(data, addr, challenge_numbers)
+        if not check_challenge(data, addr, challenge_numbers):
+            return None
+
+    snapshot = player_handler.snapshot
+    response = response_cache.get("info", snapshot.generation, lambda: build_info_response(snapshot.count, info_parts))
+    log_packet(logging.DEBUG, "Отправлен ответ на запрос A2S_INFO: %r", response)
     return response
 
 
-async def handle_challenge_query(data, addr, challenge_numbers):
+def handle_challenge_query(data, addr, challenge_numbers):
     """
     Обрабатывает запрос A2S_SERVERQUERY_GETCHALLENGE.
     """
-    logger.info(f"Получен корректный запрос A2S_SERVERQUERY_GETCHALLENGE от {addr}")
+    log_packet(logging.INFO, "Получен корректный запрос A2S_SERVERQUERY_GETCHALLENGE от %s", addr)
 
-    # Генерируем случайный challenge number
-    challenge_number = random.randint(1, 2 ** 32 - 1)
+    # Вычисляем challenge number для этого адреса (ничего не сохраняется)
+    challenge_number = challenge_numbers.issue(addr)
     packed_challenge_number = struct.pack('<I', challenge_number)  # Little-endian
-
-    # Сохраняем challenge number для этого адреса
-    challenge_numbers[addr] = challenge_number
-    logger.info(f"Сгенерирован challenge number: {challenge_number}")
+    log_packet(logging.INFO, "Сгенерирован challenge number: %d", challenge_number)
 
     # Формируем ответ
     response = b'\xFF\xFF\xFF\xFFA' + packed_challenge_number
-    logger.debug(f"Отправлен ответ на запрос A2S_SERVERQUERY_GETCHALLENGE: {response}")
+    log_packet(logging.DEBUG, "Отправлен ответ на запрос A2S_SERVERQUERY_GETCHALLENGE: %r", response)
     return response
 
 
-async def handle_player_query(data, addr, challenge_numbers, players):
+def check_challenge(data, addr, challenge_numbers):
     """
-    Обрабатывает запрос A2S_PLAYER.
+    Проверяет challenge number из последних 4 байт запроса.
     """
-    logger.info(f"Получен корректный запрос A2S_PLAYER от {addr}")
-
-    # Преобразуем список игроков в словарь, если это необходимо
-    if isinstance(players, list):
-        players = {player["steam_id"]: player for player in players}
-
     # Извлекаем challenge number (последние 4 байта)
     challenge_number = data[-4:]
     received_challenge_number = struct.unpack('<I', challenge_number)[0]
-    logger.debug(f"Challenge number: {received_challenge_number}")
+    log_packet(logging.DEBUG, "Challenge number: %d", received_challenge_number)
 
     # Если challenge number не равен 0, проверяем его
-    if received_challenge_number != 0:
-        expected_challenge_number = challenge_numbers.get(addr)
-        if expected_challenge_number is None or expected_challenge_number != received_challenge_number:
-            logger.error(
-                f"Некорректный challenge number: ожидался {expected_challenge_number}, получен {received_challenge_number}")
-            return None
+    if received_challenge_number != 0 and not challenge_numbers.verify(addr, received_challenge_number):
+        # Уровень ниже WARNING: поток подменных пакетов не должен обходить выборку логов
+        challenge_numbers.rejected += 1
+        log_packet(logging.INFO, "Некорректный challenge number от %s: %d", addr, received_challenge_number)
+        return False
 
-        # Удаляем challenge number из памяти после использования
-        del challenge_numbers[addr]
+    return True
 
-    # Формируем ответ
-    response = b'\xFF\xFF\xFF\xFFD' + struct.pack('B', len(players))  # Количество игроков
-    for idx, (steam_id, player_data) in enumerate(players.items()):
-        response += struct.pack('B', idx + 1)  # Идентификатор игрока
-        response += player_data["name"].encode('utf-8') + b'\x00'  # Имя игрока
-        response += struct.pack('<i', player_data["score"])  # Счет игрока (little-endian)
-        response += struct.pack('<f', player_data["duration"])  # Время игры (little-endian)
-
-    logger.debug(f"Отправлен ответ на запрос A2S_PLAYER: {response}")
+
+def handle_player_query(data, addr, challenge_numbers, player_handler, response_cache):
+    """
+    Обрабатывает запрос A2S_PLAYER.
+    """
+    log_packet(logging.INFO, "Получен корректный запрос A2S_PLAYER от %s", addr)
+
+    if not check_challenge(data, addr, challenge_numbers):
+        return None
+
+    # Шаблон пакета пересобирается только при смене состава игроков,
+    # а длительности сессий обновляются в нем не чаще раза в секунду
+    snapshot = player_handler.snapshot
+    now = time.monotonic()
+    response = response_cache.get("player", (snapshot.generation, int(now)), lambda: render_player_response(
+        response_cache.get("player_template", snapshot.generation, lambda: build_player_template(snapshot.players)),
+        now
+    ))
+    log_packet(logging.DEBUG, "Отправлен ответ на запрос A2S_PLAYER: %r", response)
+    return response
+
+
+def handle_rules_query(data, addr, challenge_numbers, response_cache, rules=SERVER_RULES):
+    """
+    Обрабатывает запрос A2S_RULES.
+    :param rules: Пары (имя, значение) правил сервера.
+    """
+    log_packet(logging.INFO, "Получен корректный запрос A2S_RULES от %s", addr)
+
+    if not check_challenge(data, addr, challenge_numbers):
+        return None
+
+    response = response_cache.get("rules", 0, lambda: build_rules_response(rules))
+    log_packet(logging.DEBUG, "Отправлен ответ на запрос A2S_RULES: %r", response)
     return response
@@ -1,117 +1,366 @@
 import os
 import asyncio
-from collections import defaultdict
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from logger_config import get_logger
-from ddos_protection import DDOSProtection
+from ddos_protection import ConnectionRateTracker, DDOSProtection
 from constants import (
-    UNIFIED_LOGIN_PATTERN, LOGOUT_PATTERN_OLD, LOGOUT_PATTERN_NEW,
-    IP_TIMESTAMP_PATTERN, DDOS_THRESHOLD, DDOS_INTERVAL
+    LINE_EVENT_PATTERN, LINE_PREFILTER_TOKENS, DDOS_THRESHOLD, DDOS_INTERVAL,
+    REPLAY_PARALLEL_MIN_BYTES, REPLAY_RANGE_BYTES, REPLAY_PROCESSES,
 )
 from async_watchdog import watch_directory
+from log_tailer import LogCheckpoints, LogTailer, MappedLogReader
+from metrics import Metrics
 from player_handler import PlayerHandler  # Импортируем новый класс
 
 # Инициализация логгера
 logger = get_logger()
 
+# Событие строки лога: kind - 'connect', 'login' или 'logout'
+LogEvent = namedtuple("LogEvent", "kind steam_id name ip timestamp")
+
+# Байтовый предфильтр для прогона истории через mmap: те же подстроки, что и LINE_PREFILTER_TOKENS
+LINE_PREFILTER_BYTES = tuple(token.encode("ascii") for token in LINE_PREFILTER_TOKENS)
+
+# Итог прогона диапазона (или целого файла) истории логов:
+# players - {steam_id: варианты итога игрока, см. player_variants}; offenders - IP, превысившие порог частоты;
+# windows - {ip: (последняя корзина, сумма, счетчики)} окна частоты в конце диапазона;
+# events - {тип: количество}; end - позиция сразу после последней полной строки.
+ReplaySummary = namedtuple("ReplaySummary", "players offenders windows latest_bucket lines events end")
+
+
+class LogIngestService:
+    def __init__(self, log_files):
+        """
+        Единый сервис разбора логов: один экземпляр DDOSProtection с одной задачей очистки
+        и один наблюдатель watchdog на каждую директорию для всех настроенных файлов.
+        Благодаря общему состоянию окно частоты подключений для IP учитывается по всем серверам сразу.
+        :param log_files: Список файлов логов.
+        """
+        self.log_files = list(log_files)
+        self.player_handler = PlayerHandler()
+        self.ddos_protection = DDOSProtection(DDOS_THRESHOLD, DDOS_INTERVAL)
+        self.checkpoints = LogCheckpoints()
+        self.tailers = {}  # {файл логов: LogTailer}
+        self.metrics = Metrics()
+        self.line_counters = {}  # {файл логов: счетчик прочитанных строк}
+        self.event_counters = {
+            kind: self.metrics.counter("moe_log_events_total", "События, найденные в логах", {"kind": kind})
+            for kind in ("connect", "login", "logout")
+        }
+        self.warming_up = False  # Идет прогон истории логов при запуске
+        self.metrics.gauge(
+            "moe_log_warming_up", "Идет прогон истории логов при запуске (1) или нет (0)", lambda: int(self.warming_up)
+        )
+
+    async def run(self):
+        """
+        Догоняет все файлы логов с сохраненных позиций, затем переходит в режим реального времени.
+        """
+        loop = asyncio.get_running_loop()
+        self.ddos_protection.start_cleanup_task(loop)  # Запускаем задачу очистки
+        self.player_handler.start_persistence_task(loop)  # Запускаем отложенную запись данных игроков
+
+        # Потоковое чтение с контрольными точками. Онлайн-игроки всех файлов восстанавливаются сразу:
+        # пока идет прогон истории, query-порт отвечает составом из контрольной точки
+        tailers = {}
+        for log_file in self.log_files:
+            if not os.path.exists(log_file):  # Используем синхронный метод
+                logger.error(f"Файл логов не найден: {log_file}")
+                continue
+            tailer = tailers[log_file] = LogTailer(log_file, self.checkpoints, self.player_handler.reset_log_file)
+            self.register_file_metrics(log_file, tailer)
+            if tailer.resumed:
+                self.player_handler.restore_online_state(self.checkpoints.online_players, log_file)
+
+        started = time.monotonic()
+        self.warming_up = True
+        try:
+            await self.replay_history(loop, tailers)
+        finally:
+            self.warming_up = False
+        logger.info(f"Прогон истории логов завершен за {time.monotonic() - started:.1f} с.")
+
+        self.checkpoints.save(self.player_handler.export_online_state())
+
+        # Режим реального времени: один наблюдатель на директорию
+        directories = {}
+        for log_file in self.tailers:
+            directories.setdefault(os.path.dirname(log_file), []).append(log_file)
+        for directory, log_files in directories.items():
+            logger.info(f"Перехожу в режим реального времени для файлов: {log_files}")
+
+        try:
+            await asyncio.gather(*(
+                watch_directory(directory, self.handle_file_change, loop, target_paths=log_files)
+                for directory, log_files in directories.items()
+            ))
+        finally:
+            for tailer in self.tailers.values():
+                tailer.close()
+            # Позиции и онлайн-игроки с последнего сохранения иначе теряются при остановке
+            self.checkpoints.save(self.player_handler.export_online_state())
+
+    async def replay_history(self, loop, tailers):
+        """
+        Полный парсинг (или догоняющее чтение с контрольной точки) всех файлов.
+        Большие непрочитанные части файлов делятся на диапазоны по границам строк и разбираются
+        в пуле процессов; итоги применяются в порядке файлов, и цикл событий все это время свободен.
+        Маленькие части и хвост, дописанный во время прогона, читаются в основном процессе.
+        """
+        pool = None
+        jobs = {}  # {файл логов: [future итога диапазона]}
+        for log_file, tailer in tailers.items():
+            size = os.path.getsize(log_file)
+            if size - tailer.offset < REPLAY_PARALLEL_MIN_BYTES:
+                continue
+            if pool is None:
+                pool = ProcessPoolExecutor(REPLAY_PROCESSES)
+            ranges = split_ranges(log_file, tailer.offset, size)
+            logger.info(f"Параллельный прогон {log_file}: {size - tailer.offset} байт, диапазонов: {len(ranges)}.")
+            jobs[log_file] = [
+                loop.run_in_executor(
+                    pool, summarize_range, log_file, start, end, self.ddos_protection.threshold,
+                    self.ddos_protection.interval, index == len(ranges) - 1
+                )
+                for index, (start, end) in enumerate(ranges)
+            ]
+
+        try:
+            for log_file, tailer in tailers.items():
+                logger.info(f"Полный парсинг {log_file} с позиции {tailer.offset}")
+                try:
+                    if log_file in jobs:
+                        self.merge_replay(log_file, tailer, merge_summaries(await asyncio.gather(*jobs[log_file])))
+                    self.process_new_lines(log_file, tailer)
+                except Exception as e:
+                    logger.error(f"Ошибка при полном парсинге файла {log_file}: {e}")
+                    tailer.close()
+                    continue
+                self.tailers[log_file] = tailer
+                logger.info(f"Полный парсинг {log_file} завершен.")
+                await asyncio.sleep(0)  # Даем циклу событий обработать накопившиеся запросы
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    def merge_replay(self, log_file, tailer, summary):
+        """
+        Применяет итог параллельного прогона файла к общему состоянию и переносит позицию чтения.
+        """
+        self.player_handler.merge_replay(summary.players, log_file)
+        self.ddos_protection.merge_replay(summary.offenders, summary.windows, summary.latest_bucket)
+        for kind, count in summary.events.items():
+            self.event_counters[kind].inc(count)
+        self.line_counters[log_file].inc(summary.lines)
+        tailer.skip_to(summary.end)
+
+    def register_file_metrics(self, log_file, tailer):
+        """
+        Регистрирует счетчик прочитанных строк и отставание чтения (байт до конца файла).
+        """
+        labels = {"file": os.path.basename(log_file)}
+        self.line_counters[log_file] = self.metrics.counter("moe_log_lines_total", "Прочитанные строки логов", labels)
+        self.metrics.gauge(
+            "moe_log_backlog_bytes", "Непрочитанные байты файла логов", lambda: self.backlog(log_file, tailer), labels
+        )
+
+    @staticmethod
+    def backlog(log_file, tailer):
+        try:
+            return max(0, os.path.getsize(log_file) - tailer.offset)
+        except OSError:
+            return 0
+
+    def process_new_lines(self, log_file, tailer):
+        """
+        Читает новые строки файла и передает события общему состоянию.
+        """
+        lines = 0
+        event_counters = self.event_counters
+        for line in tailer.read_lines():
+            lines += 1
+            event = classify_line(line)
+            if event is not None:
+                event_counters[event.kind].inc()
+                handle_log_event(event, self.ddos_protection, self.player_handler, log_file)
+        tailer.commit()
+        self.line_counters[log_file].inc(lines)
+
+    async def handle_file_change(self, file_path):
+        tailer = self.tailers.get(file_path)
+        if tailer is None:
+            return
+
+        try:
+            self.process_new_lines(file_path, tailer)
+            self.checkpoints.save_if_due(self.player_handler.export_online_state)
+        except Exception as e:
+            logger.error(f"Ошибка при обработке изменений в файле {file_path}: {e}")
+
+
 async def parse_log(log_file):
     """
-    Парсит файл логов: сначала полный парсинг, затем реальное время.
-    Также добавлена защита от DDoS-атак.
+    Парсит один файл логов: сначала догоняет файл с сохраненной позиции (или с начала), затем реальное время.
+    Для нескольких файлов используйте один LogIngestService.
     """
-    if not os.path.exists(log_file):  # Используем синхронный метод
-        logger.error(f"Файл логов не найден: {log_file}")
-        return
+    await LogIngestService([log_file]).run()
 
-    # Создаем экземпляр PlayerHandler
-    player_handler = PlayerHandler()
 
-    # Для защиты от DDoS
-    ddos_protection = DDOSProtection(DDOS_THRESHOLD, DDOS_INTERVAL)
-    loop = asyncio.get_event_loop()
-    ddos_protection.start_cleanup_task(loop)  # Запускаем задачу очистки
+def line_timestamp(line):
+    """
+    Возвращает метку времени из начала строки лога ([2024.05.01-12.00.00:123]...) или None.
+    """
+    if line[:1] == "[" and line[24:25] == "]":
+        return line[1:24]
+    return None
 
-    # Полный парсинг
-    logger.info(f"Полный парсинг {log_file}")
-    try:
-        with open(log_file, "r", encoding="utf-8", errors="replace") as f:
-            lines = f.readlines()
 
-        for line in lines:
-            # Защита от DDoS: анализируем IP-адреса и временные метки
-            ip_timestamp_match = IP_TIMESTAMP_PATTERN.search(line)
-            if ip_timestamp_match:
-                timestamp = ip_timestamp_match.group(1)
-                ip_address = ip_timestamp_match.group(2)
-                ddos_protection.process_ip(ip_address, timestamp)
+def classify_line(line):
+    """
+    Классифицирует строку лога за один проход.
+    Сначала выполняется дешевая проверка подстрок, затем одно объединенное регулярное выражение.
+    :return: LogEvent или None, если строка не содержит событий.
+    """
+    for token in LINE_PREFILTER_TOKENS:
+        if token in line:
+            break
+    else:
+        return None
 
-            # Обработка входа/выхода игроков
-            handle_player_events(line, player_handler, log_file)
+    match = LINE_EVENT_PATTERN.search(line)
+    if match is None:
+        return None
 
-    except Exception as e:
-        logger.error(f"Ошибка при полном парсинге файла {log_file}: {e}")
-        return
+    kind = match.lastgroup
+    if kind == "ip":
+        return LogEvent("connect", None, None, match.group("ip"), match.group("timestamp"))
+    if kind == "login_old":
+        return LogEvent("login", match.group("login_old"), None, None, line_timestamp(line))
+    if kind == "login_new":
+        return LogEvent("login", match.group("login_new"), match.group("nickname"), None, line_timestamp(line))
+    return LogEvent("logout", match.group(kind).strip(), None, None, None)
 
-    logger.info(f"Полный парсинг {log_file} завершен.")
 
-    # Режим реального времени с использованием watchdog
-    logger.info(f"Перехожу в режим реального времени для файла: {log_file}")
-    last_position = os.path.getsize(log_file)  # Последняя позиция чтения
+def split_ranges(log_file, start, end, range_bytes=REPLAY_RANGE_BYTES):
+    """
+    Делит часть файла [start, end) на диапазоны, границы которых совпадают с началом строк.
+    :return: Список пар (начало, конец).
+    """
+    bounds = [start]
+    with open(log_file, "rb") as f:
+        position = start + range_bytes
+        while position < end:
+            f.seek(position - 1)
+            f.readline()  # Дочитываем строку, на которую пришлась граница
+            aligned = f.tell()
+            if aligned >= end:
+                break
+            bounds.append(aligned)
+            position = aligned + range_bytes
+    bounds.append(end)
+    return list(zip(bounds, bounds[1:]))
 
-    async def handle_file_change(file_path):
-        nonlocal last_position
-        if file_path != log_file:
-            return
 
-        try:
-            with open(log_file, "r", encoding="utf-8", errors="replace") as f:
-                f.seek(last_position)
-                new_lines = f.readlines()
-                last_position = f.tell()
-
-            for line in new_lines:
-                # Защита от DDoS: анализируем IP-адреса и временные метки
-                ip_timestamp_match = IP_TIMESTAMP_PATTERN.search(line)
-                if ip_timestamp_match:
-                    timestamp = ip_timestamp_match.group(1)
-                    ip_address = ip_timestamp_match.group(2)
-                    ddos_protection.process_ip(ip_address, timestamp)
-
-                # Обработка входа/выхода игроков
-                handle_player_events(line, player_handler, log_file)
+def summarize_range(log_file, start, end, threshold, interval, keep_windows):
+    """
+    Задание пула процессов: разбирает строки диапазона [start, end) и сводит их к ReplaySummary.
+    Файл читается через mmap, в str декодируются только строки с маркерами событий.
+    Неполная последняя строка не учитывается и будет прочитана основным процессом.
+    :param keep_windows: Вернуть окна частоты подключений (нужны только для последнего диапазона файла).
+    """
+    players = {}
+    events = {"connect": 0, "login": 0, "logout": 0}
+    tracker = ConnectionRateTracker(threshold, interval)
+    reader = MappedLogReader(log_file)
 
-        except Exception as e:
-            logger.error(f"Ошибка при обработке изменений в файле {log_file}: {e}")
-
-    # Начинаем отслеживать директорию файла
-    directory = os.path.dirname(log_file)
-    await watch_directory(directory, handle_file_change, loop)
-
-
-def handle_player_events(line, player_handler, log_file):
-    """
-    Обрабатывает события входа/выхода игроков.
-    :param line: Строка лога для анализа.
-    :param player_handler: Экземпляр класса PlayerHandler для обработки событий.
-    :param log_file: Файл логов, связанный с событием.
-    """
-    # Проверяем, является ли строка событием входа игрока
-    login_match = UNIFIED_LOGIN_PATTERN.search(line)
-    if login_match:
-        steam_id = login_match.group(1) or login_match.group(3)  # Steam ID из старого или нового формата
-        player_name =  login_match.group(2)  # Имя игрока из старого или нового формата
-        player_handler.handle_event(steam_id, player_name, "login", log_file)
-        return
-
-    # Проверяем, является ли строка событием выхода игрока (старый формат)
-    logout_match_old = LOGOUT_PATTERN_OLD.search(line)
-    if logout_match_old:
-        steam_id = logout_match_old.group(1).strip()
-        player_handler.handle_event(steam_id, None, "logout", log_file)
-        return
-
-    # Проверяем, является ли строка событием выхода игрока (новый формат)
-    logout_match_new = LOGOUT_PATTERN_NEW.search(line)
-    if logout_match_new:
-        steam_id = logout_match_new.group(1).strip()
-        player_handler.handle_event(steam_id, None, "logout", log_file)
-        return
\ No newline at end of file
+    for line in reader.matching_lines(start, end, LINE_PREFILTER_BYTES):
+        event = classify_line(line)
+        if event is None:
+            continue
+        events[event.kind] += 1
+        if event.kind == "connect":
+            tracker.process_ip(event.ip, event.timestamp)
+            continue
+
+        variants = players.get(event.steam_id)
+        if variants is None:
+            variants = players[event.steam_id] = player_variants()
+        if event.kind == "logout":
+            for state in variants:
+                state[0], state[1] = False, None
+            continue
+        for index, state in enumerate(variants):
+            if state[0]:
+                continue  # Повторный вход онлайн-игрока пропускается, как в PlayerHandler
+            if event.name:
+                state[2] = event.name
+            elif state[2] is None and not index & 1:
+                continue  # Ник неизвестен: вход отклоняется, как в PlayerHandler
+            state[0], state[1] = True, (event.timestamp, state[2])
+
+    windows = tracker.export_windows() if keep_windows else {}
+    return ReplaySummary(
+        players, list(tracker.blocked_ips), windows, tracker.latest_bucket, reader.lines, events, reader.offset
+    )
+
+
+def player_variants():
+    """
+    Итог игрока в диапазоне зависит от состояния на начало диапазона, которое задание пула не знает,
+    поэтому события применяются сразу к четырем вариантам начального состояния.
+    Индекс варианта: 2 * (онлайн в этом файле) + (ник уже известен).
+    Состояние варианта: [онлайн в конце, сессия, последний принятый ник], где сессия - None
+    (сессия с начала диапазона продолжается или игрок не в сети) или (метка времени входа, ник);
+    ник None означает ник, известный на начало диапазона.
+    """
+    return [[False, None, None], [False, None, None], [True, None, None], [True, None, None]]
+
+
+def merge_player_variants(first, second):
+    """
+    Объединяет варианты игрока двух последовательных диапазонов: конец first выбирает вариант second.
+    """
+    merged = []
+    for index, (online, session, known_name) in enumerate(first):
+        next_online, next_session, next_name = second[2 * online + (known_name is not None or index & 1)]
+        if next_session is None:
+            next_session = session if next_online else None
+        elif next_session[1] is None:
+            next_session = (next_session[0], known_name)
+        merged.append([next_online, next_session, next_name if next_name is not None else known_name])
+    return merged
+
+
+def merge_summaries(summaries):
+    """
+    Объединяет итоги последовательных диапазонов одного файла (в порядке следования) в итог файла.
+    """
+    players = {}
+    offenders = []
+    events = {"connect": 0, "login": 0, "logout": 0}
+    lines = 0
+    for summary in summaries:
+        for steam_id, variants in summary.players.items():
+            previous = players.get(steam_id)
+            players[steam_id] = variants if previous is None else merge_player_variants(previous, variants)
+        offenders.extend(summary.offenders)
+        for kind, count in summary.events.items():
+            events[kind] += count
+        lines += summary.lines
+
+    last = summaries[-1]
+    return ReplaySummary(players, offenders, last.windows, last.latest_bucket, lines, events, last.end)
+
+
+def handle_log_event(event, ddos_protection, player_handler, log_file):
+    """
+    Передает событие строки лога защите от DDoS или обработчику игроков.
+    """
+    if event.kind == "connect":
+        # Защита от DDoS: анализируем IP-адреса и временные метки
+        ddos_protection.process_ip(event.ip, event.timestamp)
+    else:
+        # Обработка входа/выхода игроков
+        player_handler.handle_event(event.steam_id, event.name, event.kind, log_file, event.timestamp)
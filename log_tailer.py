@@ -0,0 +1,276 @@
+import hashlib
+import json
+import mmap
+import os
+import time
+from logger_config import get_logger
+
+# Инициализация логгера
+logger = get_logger()
+
+CHECKPOINT_FILE = "log_offsets.json"  # Файл с сохраненными позициями чтения логов
+CHECKPOINT_INTERVAL = 5  # Минимальный интервал между записями контрольных точек (в секундах)
+CHUNK_SIZE = 1 << 20  # Размер блока чтения (1 МБ)
+FINGERPRINT_SIZE = 1024  # Количество байт начала файла для отпечатка
+MAP_WINDOW_SIZE = 64 << 20  # Размер окна отображения файла в память при прогоне истории (64 МБ)
+
+# Держать файл открытым между чтениями. На Windows открытый дескриптор не дает
+# игровому серверу переименовать лог при ротации, поэтому там файл открывается на каждое чтение.
+KEEP_FILE_OPEN = os.name != "nt"
+
+
+def file_fingerprint(f, length):
+    """
+    Возвращает SHA-1 первых length байт открытого в двоичном режиме файла.
+    """
+    f.seek(0)
+    return hashlib.sha1(f.read(length)).hexdigest()
+
+
+class LogCheckpoints:
+    _instance = None  # Хранит единственный экземпляр класса
+
+    def __new__(cls):
+        """
+        Создает единственный экземпляр класса (синглтон): все логи пишут контрольные точки в один файл.
+        """
+        if cls._instance is None:
+            cls._instance = super(LogCheckpoints, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        """
+        Загружает контрольные точки из файла.
+        Формат: {"files": {путь: {offset, inode, fingerprint, fingerprint_size}}, "online_players": {...}}
+        """
+        self.files = {}
+        self.online_players = {}
+        self.last_save = 0.0
+        if os.path.exists(CHECKPOINT_FILE):
+            try:
+                with open(CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self.files = data.get("files", {})
+                self.online_players = data.get("online_players", {})
+                logger.info(f"Загружены контрольные точки для {len(self.files)} файлов логов.")
+            except (json.JSONDecodeError, OSError, AttributeError) as e:
+                logger.error(f"Ошибка при загрузке контрольных точек логов: {e}")
+
+    def get(self, log_file):
+        return self.files.get(log_file)
+
+    def update(self, log_file, checkpoint):
+        """
+        Обновляет контрольную точку файла в памяти (без записи на диск).
+        """
+        self.files[log_file] = checkpoint
+
+    def save(self, online_players):
+        """
+        Атомарно записывает контрольные точки вместе с состоянием онлайн-игроков на эту позицию.
+        :param online_players: Словарь {steam_id: [имя, файл логов]}.
+        """
+        self.online_players = online_players
+        temp_file = CHECKPOINT_FILE + ".tmp"
+        try:
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump({"files": self.files, "online_players": online_players}, f, ensure_ascii=False)
+            os.replace(temp_file, CHECKPOINT_FILE)
+            self.last_save = time.monotonic()
+        except OSError as e:
+            logger.error(f"Ошибка при сохранении контрольных точек логов: {e}")
+
+    def save_if_due(self, online_players_getter):
+        """
+        Записывает контрольные точки, если с прошлой записи прошло не меньше CHECKPOINT_INTERVAL.
+        """
+        if time.monotonic() - self.last_save >= CHECKPOINT_INTERVAL:
+            self.save(online_players_getter())
+
+
+class LogTailer:
+    def __init__(self, log_file, checkpoints, on_reset=None):
+        """
+        Потоковое чтение файла логов блоками фиксированного размера с сохранением позиции.
+        :param log_file: Путь к файлу логов.
+        :param checkpoints: Хранилище контрольных точек LogCheckpoints.
+        :param on_reset: Функция (файл логов), вызываемая при ротации или усечении файла до чтения новых строк.
+        """
+        self.log_file = log_file
+        self.checkpoints = checkpoints
+        self.on_reset = on_reset
+        self.offset = 0  # Позиция сразу после последней полностью прочитанной строки
+        self.inode = None
+        self.fingerprint = None
+        self.fingerprint_size = 0
+        self._file = None  # Открытый дескриптор, переиспользуемый между чтениями
+        self.resumed = self._resume()
+
+    def _resume(self):
+        """
+        Восстанавливает позицию из контрольной точки, если файл не был заменен или усечен.
+        """
+        checkpoint = self.checkpoints.get(self.log_file)
+        stat = os.stat(self.log_file)
+        self.inode = stat.st_ino
+        if not checkpoint:
+            return False
+
+        with open(self.log_file, "rb") as f:
+            fingerprint = file_fingerprint(f, checkpoint["fingerprint_size"])
+        if (checkpoint["inode"] != stat.st_ino or checkpoint["offset"] > stat.st_size
+                or checkpoint["fingerprint"] != fingerprint):
+            logger.info(f"Файл {self.log_file} был заменен или усечен. Чтение с начала.")
+            return False
+
+        self.offset = checkpoint["offset"]
+        self.fingerprint = checkpoint["fingerprint"]
+        self.fingerprint_size = checkpoint["fingerprint_size"]
+        logger.info(f"Продолжение чтения {self.log_file} с позиции {self.offset}.")
+        return True
+
+    def _check_rotation(self, stat):
+        """
+        Сбрасывает позицию на 0, если файл был ротирован (новый inode) или усечен.
+        """
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            logger.info(f"Обнаружена ротация или усечение файла {self.log_file}. Чтение с начала.")
+            self.inode = stat.st_ino
+            self.offset = 0
+            self.fingerprint = None
+            self.fingerprint_size = 0
+            if self.on_reset is not None:
+                self.on_reset(self.log_file)
+
+    def read_lines(self):
+        """
+        Генератор новых полных строк начиная с текущей позиции.
+        Неполная последняя строка не возвращается и будет прочитана при следующем вызове.
+        """
+        f = self._file
+        if f is None:
+            f = open(self.log_file, "rb")
+        try:
+            if self._file is not None and os.fstat(f.fileno()).st_ino != os.stat(self.log_file).st_ino:
+                # Файл заменен новым: дочитываем старый дескриптор и переходим к новому файлу
+                yield from self._read_from(f)
+                f.close()
+                f = open(self.log_file, "rb")
+            self._check_rotation(os.fstat(f.fileno()))
+            yield from self._read_from(f)
+        finally:
+            if KEEP_FILE_OPEN:
+                self._file = f
+            else:
+                f.close()
+
+    def _read_from(self, f):
+        """
+        Читает блоки начиная с текущей позиции и возвращает полные строки.
+        """
+        f.seek(self.offset)
+        pending = b""
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                self.offset += len(line) + 1
+                yield line.decode("utf-8", errors="replace")
+
+        if self.fingerprint_size < FINGERPRINT_SIZE and self.offset > self.fingerprint_size:
+            self.fingerprint_size = min(self.offset, FINGERPRINT_SIZE)
+            self.fingerprint = file_fingerprint(f, self.fingerprint_size)
+
+    def skip_to(self, offset):
+        """
+        Переносит позицию на offset: строки до нее уже разобраны вне LogTailer (параллельный прогон истории).
+        """
+        self.offset = offset
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def commit(self):
+        """
+        Фиксирует текущую позицию в хранилище контрольных точек (в памяти).
+        """
+        self.checkpoints.update(self.log_file, {
+            "offset": self.offset,
+            "inode": self.inode,
+            "fingerprint": self.fingerprint,
+            "fingerprint_size": self.fingerprint_size,
+        })
+
+
+class MappedLogReader:
+    def __init__(self, log_file, window_size=MAP_WINDOW_SIZE):
+        """
+        Чтение истории файла логов через mmap: поиск маркеров событий выполняется
+        по байтам отображенного окна, в str декодируются только найденные строки.
+        Файл отображается окнами по window_size байт, поэтому резидентная память не растет с размером файла.
+        :param log_file: Путь к файлу логов.
+        """
+        self.log_file = log_file
+        self.window_size = window_size
+        self.offset = 0  # Позиция сразу после последней полной строки
+        self.lines = 0  # Количество просмотренных полных строк
+
+    def matching_lines(self, start, end, tokens):
+        """
+        Генератор строк из части файла [start, end), содержащих хотя бы одну из подстрок tokens (bytes).
+        Неполная последняя строка не просматривается: offset останавливается перед ней.
+        """
+        self.offset = start
+        if end <= start:
+            return
+        with open(self.log_file, "rb") as f:
+            while self.offset < end:
+                base = self.offset - self.offset % mmap.ALLOCATIONGRANULARITY
+                length = min(end, base + self.window_size) - base
+                with mmap.mmap(f.fileno(), length, access=mmap.ACCESS_READ, offset=base) as buffer:
+                    position = self.offset - base
+                    window_end = buffer.rfind(b"\n", position, length) + 1
+                    if window_end == 0:
+                        if base + length == end:
+                            return  # Остался только неполный хвост
+                        window_end = length  # Строка длиннее окна: просматривается по частям
+                    yield from self._scan(buffer, position, window_end, tokens)
+                    self.lines += self._count_lines(buffer, position, window_end)
+                self.offset = base + window_end
+
+    @staticmethod
+    def _scan(buffer, start, end, tokens):
+        """
+        Ищет каждый маркер отдельно (bytes.find работает со скоростью памяти, в отличие от
+        регулярного выражения с альтернативами) и возвращает строки в порядке следования.
+        """
+        find = buffer.find
+        hits = [find(token, start, end) for token in tokens]
+        while True:
+            found = [hit for hit in hits if hit >= 0]
+            if not found:
+                return
+            hit = min(found)
+            line_start = buffer.rfind(b"\n", start, hit) + 1 or start
+            line_end = find(b"\n", hit, end)
+            if line_end < 0:
+                line_end = end
+            yield buffer[line_start:line_end].decode("utf-8", errors="replace")
+            # Маркеры, найденные в этой же строке, ищутся заново после нее
+            hits = [
+                find(token, line_end + 1, end) if 0 <= position <= line_end else position
+                for token, position in zip(tokens, hits)
+            ]
+
+    @staticmethod
+    def _count_lines(buffer, start, end):
+        lines = 0
+        for position in range(start, end, CHUNK_SIZE):
+            lines += buffer[position:min(end, position + CHUNK_SIZE)].count(b"\n")
+        return lines
@@ -1,43 +1,154 @@
+import atexit
 import logging
-from logging.handlers import TimedRotatingFileHandler
+import os
+import queue
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
+from constants import LOG_LEVEL, LOG_QUEUE_ENABLED, LOG_QUEUE_SIZE, LOG_PACKET_SAMPLE_RATE
 
 # Глобальная переменная для хранения основного логгера
 _main_logger = None
 _error_logger = None
+_queue_handler = None  # Обработчик-очередь основного логгера (в режиме LOG_QUEUE_ENABLED)
+_queue_listener = None  # Фоновый поток, выполняющий запись в файл и консоль
+_packet_counter = 0  # Счетчик принятых пакетов для выборочной записи
+_packet_sampled = False  # Записываются ли сообщения о текущем пакете
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler с ограниченной очередью: при переполнении запись отбрасывается и подсчитывается,
+    а цикл событий не блокируется.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _build_handlers():
+    """
+    Создает обработчики записи в файл с ротацией и в консоль.
+    """
+    # Обработчик для записи в файл с ротацией (основной лог)
+    file_handler = TimedRotatingFileHandler(
+        "logs/server.log", when="midnight", interval=1, backupCount=7, encoding="utf-8"
+    )
+    # Уровень сообщений лога
+    file_handler.setLevel(logging.DEBUG)
+    file_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    file_handler.setFormatter(file_formatter)
+
+    # Обработчик для вывода в консоль
+    console_handler = logging.StreamHandler()
+    # Уровень сообщений консоли
+    console_handler.setLevel(logging.INFO)
+    console_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    console_handler.setFormatter(console_formatter)
+
+    return file_handler, console_handler
+
+
+def _start_queue_listener(handlers):
+    """
+    Создает очередь и запускает фоновый поток, передающий записи из нее обработчикам.
+    """
+    global _queue_listener
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    _queue_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _queue_listener.start()
+    return log_queue
+
+
+def _restart_listener_in_child():
+    """
+    После fork поток записи родителя в дочернем процессе не существует: запускаем свой.
+    """
+    if _queue_handler is not None and _queue_listener is not None:
+        _queue_handler.queue = _start_queue_listener(_queue_listener.handlers)
+
+
+def _stop_queue_listener():
+    """
+    Дописывает оставшиеся в очереди записи при завершении процесса.
+    """
+    if _queue_listener is not None:
+        _queue_listener.stop()
 
 
 def get_logger():
     """
     Возвращает основной логгер для записи всех событий.
+    В режиме LOG_QUEUE_ENABLED логгер только кладет записи в очередь, а запись в файл
+    (включая ротацию) и вывод в консоль выполняет фоновый поток.
     """
-    global _main_logger
+    global _main_logger, _queue_handler
     if _main_logger is None:
         _main_logger = logging.getLogger("CustomQueryPortAnswer")
-        _main_logger.setLevel(logging.DEBUG)
-
-        # Обработчик для записи в файл с ротацией (основной лог)
-        file_handler = TimedRotatingFileHandler(
-            "logs/server.log", when="midnight", interval=1, backupCount=7, encoding="utf-8"
-        )
-        # Уровень сообщений лога
-        file_handler.setLevel(logging.DEBUG)
-        file_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-        file_handler.setFormatter(file_formatter)
-
-        # Обработчик для вывода в консоль
-        console_handler = logging.StreamHandler()
-        # Уровень сообщений консоли
-        console_handler.setLevel(logging.INFO)
-        console_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-        console_handler.setFormatter(console_formatter)
-
-        # Добавляем обработчики к логгеру
-        _main_logger.addHandler(file_handler)
-        _main_logger.addHandler(console_handler)
+        _main_logger.setLevel(LOG_LEVEL)
+
+        handlers = _build_handlers()
+        if LOG_QUEUE_ENABLED:
+            _queue_handler = DroppingQueueHandler(_start_queue_listener(handlers))
+            _main_logger.addHandler(_queue_handler)
+            atexit.register(_stop_queue_listener)
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=_restart_listener_in_child)
+        else:
+            # Добавляем обработчики к логгеру
+            for handler in handlers:
+                _main_logger.addHandler(handler)
 
     return _main_logger
 
 
+def set_log_level(level):
+    """
+    Меняет уровень основного логгера во время работы.
+    :param level: Уровень ('DEBUG', 'INFO', ... или число из logging).
+    """
+    logger = get_logger()
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    logger.warning(f"Уровень логирования изменен на {logging.getLevelName(logger.level)}.")
+
+
+def sample_packet():
+    """
+    Решает, записываются ли сообщения о новом UDP-пакете (вызывается один раз на пакет).
+    В выборку попадает каждый LOG_PACKET_SAMPLE_RATE-й пакет со всеми его сообщениями.
+    """
+    global _packet_counter, _packet_sampled
+    _packet_counter += 1
+    _packet_sampled = _packet_counter % LOG_PACKET_SAMPLE_RATE == 0
+    return _packet_sampled
+
+
+def log_packet(level, msg, *args):
+    """
+    Записывает сообщение об отдельном UDP-пакете.
+    Сообщение форматируется (msg % args) только если уровень включен. Сообщения ниже WARNING
+    записываются только для пакетов, попавших в выборку sample_packet, чтобы поток пакетов
+    не перегружал лог; предупреждения и ошибки записываются всегда.
+    """
+    if level < logging.WARNING and not _packet_sampled:
+        return
+    logger = _main_logger or get_logger()
+    if logger.isEnabledFor(level):
+        logger.log(level, msg, *args)
+
+
+def get_logging_stats():
+    """
+    Возвращает количество записей, отброшенных из-за переполнения очереди.
+    """
+    return {"dropped": _queue_handler.dropped if _queue_handler is not None else 0}
+
+
 def get_error_logger():
     """
     Возвращает логгер для записи ошибок.
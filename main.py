@@ -1,6 +1,15 @@
 import asyncio
-from query_server import QueryServer
-from logger_config import get_logger
+import logging
+import multiprocessing
+import signal
+import socket
+from query_server import QueryServer, run_query_worker, serve_endpoints
+from log_parser import LogIngestService
+from player_handler import PlayerHandler
+from shared_snapshot import BlocklistPublisher, PlayerSnapshotPublisher
+from metrics import start_metrics_task
+from constants import METRICS_ENABLED, METRICS_HOST, METRICS_PORT
+from logger_config import get_logger, set_log_level
 
 # Инициализация логгера
 logger = get_logger()
@@ -8,6 +17,8 @@ logger = get_logger()
 # Конфигурация сервера
 SERVER_IP = "192.168.1.3"
 QUERY_PORT = 6014
+QUERY_ENGINE = "protocol"  # Движок UDP: "protocol" (asyncio.DatagramProtocol) или "dgram" (asyncio_dgram)
+QUERY_WORKERS = 1  # Количество процессов, обслуживающих порт (больше 1 - только при поддержке SO_REUSEPORT)
 LOG_FILES = [
     "C:\\moe\\serv1\\Myth of Empires Dedicated Server\\MOE\\Saved\\Logs\\LobbyServer_70000.log",
     "C:\\moe\\serv3\\Myth of Empires Dedicated Server\\MOE\\Saved\\Logs\\SceneServer_1007.log",
@@ -16,11 +27,84 @@ LOG_FILES = [
 
 ]
 
+# Несколько query-портов в одном процессе (по одному на сервер MOE), каждый со своими
+# полями A2S_INFO и игроками своих файлов логов. None - один порт QUERY_PORT для всех LOG_FILES.
+# Пример (from endpoints import QueryEndpoint):
+# QUERY_ENDPOINTS = [
+#     QueryEndpoint(6014, 6014, LOG_FILES[:1], SERVER_IP, map_name="Map_Lobby"),
+#     QueryEndpoint(6015, 6015, LOG_FILES[1:2], SERVER_IP, server_name="[RU][PVE]Big Siberian MOE #1007",
+#                   map_name="Map_Scene", steam_id=...),
+# ]
+QUERY_ENDPOINTS = None
+
+
+async def run_workers():
+    """
+    Многопроцессный режим: текущий процесс парсит логи и публикует снимок игроков
+    и заблокированные IP в общую память, а QUERY_WORKERS рабочих процессов обслуживают порт с SO_REUSEPORT.
+    """
+    publisher = PlayerSnapshotPublisher()
+    publisher.attach(PlayerHandler())
+    log_ingest = LogIngestService(LOG_FILES)
+    blocklist_publisher = BlocklistPublisher(log_ingest.ddos_protection.blocked_ips)
+    blocklist_publisher.start(asyncio.get_running_loop())
+
+    workers = [
+        multiprocessing.Process(
+            target=run_query_worker,
+            args=(SERVER_IP, QUERY_PORT, QUERY_ENGINE, publisher.name, QUERY_ENDPOINTS, blocklist_publisher.name),
+            daemon=True
+        )
+        for _ in range(QUERY_WORKERS)
+    ]
+    for worker in workers:
+        worker.start()
+    ports = [endpoint.query_port for endpoint in QUERY_ENDPOINTS] if QUERY_ENDPOINTS else [QUERY_PORT]
+    logger.info(f"Запущено {len(workers)} рабочих процессов на портах {ports}.")
+
+    logger.info("Запуск задач для парсинга логов...")
+    ingest_task = asyncio.create_task(log_ingest.run())
+    # Метрики разбора логов; задержки запросов рабочих процессов здесь не видны
+    metrics_task = start_metrics_task(asyncio.get_running_loop(), METRICS_HOST, METRICS_PORT) if METRICS_ENABLED else None
+    try:
+        await asyncio.get_running_loop().create_future()  # Работаем до отмены
+    finally:
+        ingest_task.cancel()
+        if metrics_task is not None:
+            metrics_task.cancel()
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+        publisher.close()
+        blocklist_publisher.close()
+
+
+def toggle_debug_logging():
+    """
+    Переключает уровень логирования между DEBUG и INFO (по сигналу SIGUSR1).
+    """
+    set_log_level(logging.INFO if logger.isEnabledFor(logging.DEBUG) else logging.DEBUG)
+
 
 async def main():
     logger.info("Запуск сервера...")
-    server = QueryServer(SERVER_IP, QUERY_PORT, LOG_FILES)
-    await server.main()
+    if hasattr(signal, "SIGUSR1"):  # Нет на Windows
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, toggle_debug_logging)
+    try:
+        if QUERY_WORKERS > 1:
+            if hasattr(socket, "SO_REUSEPORT"):
+                await run_workers()
+                return
+            logger.error("SO_REUSEPORT не поддерживается на этой платформе. Запуск в одном процессе.")
+
+        if QUERY_ENDPOINTS:
+            await serve_endpoints(QUERY_ENDPOINTS, LOG_FILES, engine=QUERY_ENGINE)
+            return
+
+        server = QueryServer(SERVER_IP, QUERY_PORT, LOG_FILES, engine=QUERY_ENGINE)
+        await server.main()
+    finally:
+        PlayerHandler().flush()  # Сохраняем несохраненные данные игроков
 
 
 if __name__ == "__main__":
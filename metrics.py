@@ -0,0 +1,183 @@
+import asyncio
+from bisect import bisect_left
+from logger_config import get_logger
+
+# Инициализация логгера
+logger = get_logger()
+
+# Границы корзин гистограмм задержек (в секундах): от 10 мкс до 10 с
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def format_labels(labels):
+    """
+    Форматирует метки в виде {name="value",...} для текстового формата Prometheus.
+    """
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        """
+        Монотонно растущий счетчик.
+        """
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Gauge:
+    __slots__ = ("getter",)
+
+    def __init__(self, getter):
+        """
+        Текущее значение, вычисляемое функцией getter только в момент сбора метрик.
+        """
+        self.getter = getter
+
+    def samples(self, name, labels):
+        yield name, labels, self.getter()
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        """
+        Гистограмма с фиксированными корзинами. Наблюдение стоит одного bisect и двух сложений,
+        накопленные (cumulative) значения считаются только при сборе метрик.
+        """
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Последняя корзина - значения больше всех границ (+Inf)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield f"{name}_bucket", labels + (("le", repr(bound)),), cumulative
+        cumulative += self.counts[-1]
+        yield f"{name}_bucket", labels + (("le", "+Inf"),), cumulative
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, cumulative
+
+
+class Metrics:
+    _instance = None  # Хранит единственный экземпляр класса
+
+    def __new__(cls):
+        """
+        Создает единственный экземпляр класса (синглтон): все модули регистрируют метрики в одном реестре.
+        """
+        if cls._instance is None:
+            cls._instance = super(Metrics, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self.families = {}  # {имя: [тип, описание, {метки: метрика}]}
+
+    def _register(self, kind, name, description, labels, factory):
+        family = self.families.setdefault(name, [kind, description, {}])
+        key = tuple(sorted((labels or {}).items()))
+        metric = family[2].get(key)
+        if metric is None:
+            metric = family[2][key] = factory()
+        return metric
+
+    def counter(self, name, description, labels=None):
+        """
+        Возвращает (создавая при необходимости) счетчик с заданными метками.
+        """
+        return self._register("counter", name, description, labels, Counter)
+
+    def histogram(self, name, description, labels=None, bounds=LATENCY_BUCKETS):
+        """
+        Возвращает (создавая при необходимости) гистограмму с заданными метками.
+        """
+        return self._register("histogram", name, description, labels, lambda: Histogram(bounds))
+
+    def gauge(self, name, description, getter, labels=None, kind="gauge"):
+        """
+        Регистрирует значение, вычисляемое при сборе метрик (повторная регистрация заменяет getter).
+        :param kind: Тип для Prometheus: 'gauge' или 'counter' (для счетчиков, которые ведет сам объект).
+        """
+        gauge = self._register(kind, name, description, labels, lambda: Gauge(getter))
+        gauge.getter = getter
+        return gauge
+
+    def render(self):
+        """
+        Возвращает все метрики в текстовом формате Prometheus.
+        """
+        lines = []
+        for name, (kind, description, metrics) in sorted(self.families.items()):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in metrics.items():
+                try:
+                    for sample_name, sample_labels, value in metric.samples(name, labels):
+                        lines.append(f"{sample_name}{format_labels(sample_labels)} {value}")
+                except Exception as e:
+                    logger.error(f"Ошибка при сборе метрики {name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+async def handle_scrape(reader, writer):
+    """
+    Минимальный HTTP-обработчик: на любой GET отдает метрики в текстовом формате Prometheus.
+    """
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass  # Заголовки запроса не нужны
+
+        if request_line.startswith(b"GET "):
+            status, body = "200 OK", Metrics().render().encode("utf-8")
+        else:
+            status, body = "405 Method Not Allowed", b""
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii") + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_metrics(host, port):
+    """
+    Обслуживает HTTP-эндпоинт метрик до отмены задачи.
+    """
+    server = await asyncio.start_server(handle_scrape, host, port)
+    logger.info(f"Метрики доступны по адресу http://{host}:{port}/metrics")
+    async with server:
+        await server.serve_forever()
+
+
+def start_metrics_task(loop, host, port):
+    """
+    Запускает фоновую задачу HTTP-эндпоинта метрик.
+    """
+    return loop.create_task(serve_metrics(host, port))
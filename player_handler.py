@@ -1,12 +1,40 @@
-import json
-import os
+import time
+from datetime import datetime, timezone
 from logger_config import get_logger
+from constants import LOG_TIMESTAMPS_UTC
+from ddos_protection import parse_log_timestamp_ms
+from player_store import PlayerStore
+from player_snapshot import OnlinePlayer, PlayerSnapshot, EMPTY_SNAPSHOT
+from write_behind import WriteBehindWriter
 
 # Инициализация логгера
 logger = get_logger()
 
-# Файл для хранения данных о игроках
-PLAYERS_DATA_FILE = "players_data.json"
+PLAYERS_FLUSH_INTERVAL = 5  # Максимальная задержка записи данных игроков (в секундах)
+PLAYERS_FLUSH_MAX_CHANGES = 100  # Количество изменений, после которого запись выполняется сразу
+
+
+def session_start(timestamp):
+    """
+    Переводит метку времени строки лога входа в момент по часам time.monotonic.
+    Если метки нет, она некорректна или находится в будущем, сессия начинается сейчас.
+    :param timestamp: Метка времени строки лога (2024.05.01-12.00.00:123) или None.
+    """
+    now = time.monotonic()
+    if not timestamp:
+        return now
+    try:
+        log_seconds = parse_log_timestamp_ms(timestamp) / 1000
+    except ValueError:
+        return now
+
+    current = datetime.now(timezone.utc) if LOG_TIMESTAMPS_UTC else datetime.now()
+    current_seconds = (
+        current.toordinal() * 86400 + current.hour * 3600 + current.minute * 60 + current.second
+        + current.microsecond / 1e6
+    )
+    age = current_seconds - log_seconds
+    return now - age if age > 0 else now
 
 
 class PlayerHandler:
@@ -25,54 +53,66 @@ class PlayerHandler:
     def _initialize(self):
         """
         Инициализация атрибутов экземпляра.
-        Загружает данные о игроках из файла при запуске.
+        Открывает индекс известных игроков при запуске.
         """
-        self.players_in_file = self._load_players_data()  # Словарь игроков в файле
+        self.store = PlayerStore()  # Индекс известных игроков {steam_id: имя} с LRU-кэшем
+        self.store.load()
         self.players = {}  # Словарь текущих игроков
         self.player_log_files = {}  # Словарь для отслеживания файлов, где игроки онлайн
-        logger.debug(f"Инициализировано {len(self.players_in_file)} игроков из файла.")
+        self.snapshot = EMPTY_SNAPSHOT  # Неизменяемый снимок онлайн-игроков для обработчиков запросов
+        self.listeners = []  # Функции, вызываемые при изменении состава онлайн-игроков
+        self.persistence = WriteBehindWriter(
+            "players", self.store.collect, self.store.write,
+            PLAYERS_FLUSH_INTERVAL, PLAYERS_FLUSH_MAX_CHANGES, restore=self.store.restore
+        )
+
+    @property
+    def generation(self):
+        """
+        Поколение состояния онлайн-игроков (растет при каждом входе/выходе).
+        """
+        return self.snapshot.generation
+
+    def start_persistence_task(self, loop):
+        """
+        Запускает фоновую задачу отложенной записи данных игроков.
+        """
+        self.persistence.start(loop)
 
-    def _load_players_data(self):
+    def flush(self):
         """
-        Загружает данные о игроках из JSON-файла.
-        Если файл не существует, создает пустой словарь.
+        Принудительно записывает несохраненные данные игроков (при завершении работы).
         """
-        if os.path.exists(PLAYERS_DATA_FILE):
+        self.persistence.flush()
+
+    def add_listener(self, callback):
+        """
+        Регистрирует функцию без аргументов, вызываемую при каждом изменении состава онлайн-игроков.
+        """
+        self.listeners.append(callback)
+
+    def _bump_generation(self):
+        """
+        Увеличивает поколение состояния, пересобирает снимок онлайн-игроков и уведомляет подписчиков.
+        """
+        self.snapshot = PlayerSnapshot(self.snapshot.generation + 1, tuple(
+            OnlinePlayer(steam_id, data["name"], data["score"], data["joined_at"], self.player_log_files.get(steam_id))
+            for steam_id, data in self.players.items()
+        ))
+        for callback in self.listeners:
             try:
-                with open(PLAYERS_DATA_FILE, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    # Проверяем, что данные содержат корректные ключи
-                    for steam_id, player_data in list(data.items()):
-                        if not isinstance(player_data, dict) or "name" not in player_data:
-                            logger.warning(f"Некорректные данные для игрока {steam_id}. Пропускаем.")
-                            del data[steam_id]
-                    logger.info(f"Загружено {len(data)} записей из файла players_data.json.")
-                    return data
-            except (json.JSONDecodeError, FileNotFoundError) as e:
-                logger.error(f"Ошибка при загрузке данных игроков: {e}")
-                return {}
-        else:
-            logger.info("Файл players_data.json не найден. Создается новый файл.")
-            return {}
-
-    def _save_players_data(self):
-        """
-        Сохраняет данные о игроках в JSON-файл.
-        """
-        try:
-            with open(PLAYERS_DATA_FILE, "w", encoding="utf-8") as f:
-                json.dump(self.players_in_file, f, indent=4, ensure_ascii=False)
-            logger.debug("Данные игроков успешно сохранены в файл.")
-        except Exception as e:
-            logger.error(f"Ошибка при сохранении данных игроков: {e}")
-
-    def handle_event(self, steam_id, player_name, operation_type, log_file):
+                callback()
+            except Exception as e:
+                logger.error(f"Ошибка в обработчике изменения состава игроков: {e}")
+
+    def handle_event(self, steam_id, player_name, operation_type, log_file, timestamp=None):
         """
         Обрабатывает события входа/выхода игроков.
         :param steam_id: Steam ID игрока.
         :param player_name: Никнейм игрока.
         :param operation_type: Тип операции ('login' или 'logout').
         :param log_file: Файл логов, связанный с событием.
+        :param timestamp: Метка времени строки лога (для отсчета длительности сессии).
         """
         # Валидация входных данных
         if not steam_id or not isinstance(steam_id, str):
@@ -85,11 +125,11 @@ class PlayerHandler:
 
         # Обработка события
         if operation_type == "login":
-            return self._handle_login(steam_id, player_name, log_file)
+            return self._handle_login(steam_id, player_name, log_file, timestamp)
         elif operation_type == "logout":
             return self._handle_logout(steam_id, log_file)
 
-    def _handle_login(self, steam_id, player_name, log_file):
+    def _handle_login(self, steam_id, player_name, log_file, timestamp=None):
         """
         Обрабатывает событие входа игрока.
         """
@@ -98,10 +138,11 @@ class PlayerHandler:
             logger.debug(f"[{log_file}] Игрок с ID {steam_id} уже онлайн. Пропускаем.")
             return False
 
-        # Если ник не передан, проверяем, есть ли он в файле
+        # Если ник не передан, проверяем, есть ли он в хранилище
+        known_name = self.store.get_name(steam_id)
         if not player_name:
-            if steam_id in self.players_in_file and self.players_in_file[steam_id]["name"]:
-                player_name = self.players_in_file[steam_id]["name"]
+            if known_name:
+                player_name = known_name
                 logger.debug(f"[{log_file}] Ник для игрока {steam_id} взят из файла: {player_name}.")
             else:
                 logger.warning(f"[{log_file}] Ошибка: Не найдено имя игрока для аккаунта {steam_id}.")
@@ -109,19 +150,21 @@ class PlayerHandler:
 
         # Добавляем или обновляем игрока в словарях
         if steam_id not in self.players:
-            self.players[steam_id] = {"name": player_name, "score": 0, "duration": 0.0}
+            self.players[steam_id] = {"name": player_name, "score": 0, "joined_at": session_start(timestamp)}
             logger.debug(f"[{log_file}] Игрок {player_name} ({steam_id}) добавлен в память.")
 
-        if steam_id not in self.players_in_file:
-            self.players_in_file[steam_id] = {"name": player_name, "score": 0, "duration": 0.0}
+        if known_name is None:
+            self.store.record(steam_id, player_name)
+            self.persistence.mark_dirty()
             logger.debug(f"[{log_file}] Игрок {player_name} ({steam_id}) добавлен в файл.")
-        elif self.players_in_file[steam_id]["name"] != player_name:
-            self.players_in_file[steam_id]["name"] = player_name
+        elif known_name != player_name:
+            self.store.record(steam_id, player_name)
+            self.persistence.mark_dirty()
             logger.debug(f"[{log_file}] Ник игрока {steam_id} обновлен на {player_name}.")
 
-        # Обновляем файлы и сохраняем данные
+        # Обновляем файлы; данные будут сохранены фоновой задачей записи
         self.player_log_files[steam_id] = log_file
-        self._save_players_data()
+        self._bump_generation()
         return True
 
     def _handle_logout(self, steam_id, log_file):
@@ -140,16 +183,99 @@ class PlayerHandler:
         player_name = self.players[steam_id]["name"]
         del self.players[steam_id]
         del self.player_log_files[steam_id]
+        self._bump_generation()
         logger.debug(f"[{log_file}] Игрок {player_name} ({steam_id}) отключился.")
 
         # Данные остаются в файле, так как файл выступает постоянным хранилищем
         return True
 
+    def reset_log_file(self, log_file):
+        """
+        Убирает из онлайна игроков файла логов, который был ротирован или усечен:
+        их выходы остались в прежнем файле, а новый файл читается с начала.
+        :param log_file: Файл логов.
+        """
+        removed = [steam_id for steam_id, player_log_file in self.player_log_files.items() if player_log_file == log_file]
+        for steam_id in removed:
+            del self.players[steam_id]
+            del self.player_log_files[steam_id]
+        if removed:
+            logger.info(f"[{log_file}] Файл логов начат заново: из онлайна убрано {len(removed)} игроков.")
+            self._bump_generation()
+
+    def merge_replay(self, players, log_file):
+        """
+        Применяет итог параллельного прогона истории файла логов так же, как последовательная
+        обработка его событий: игроки, онлайн в другом файле, не затрагиваются.
+        :param players: {steam_id: варианты итога игрока (log_parser.player_variants)}.
+        :param log_file: Файл логов, история которого прогнана.
+        """
+        changed = 0
+        for steam_id, variants in players.items():
+            online_here = steam_id in self.players
+            if online_here and self.player_log_files.get(steam_id) != log_file:
+                continue  # Онлайн в другом файле: входы и выходы в этом файле пропускаются
+
+            known_name = self.store.get_name(steam_id)
+            online, session, player_name = variants[2 * online_here + (known_name is not None)]
+            if player_name is not None and player_name != known_name:
+                self.store.record(steam_id, player_name)  # Новый игрок или смена ника
+                self.persistence.mark_dirty()
+
+            if not online:
+                if online_here:
+                    del self.players[steam_id]
+                    del self.player_log_files[steam_id]
+                    changed += 1
+            elif session is not None:
+                timestamp, session_name = session
+                self.players[steam_id] = {
+                    "name": session_name or known_name, "score": 0, "joined_at": session_start(timestamp)
+                }
+                self.player_log_files[steam_id] = log_file
+                changed += 1
+            # Иначе сессия из контрольной точки продолжается
+
+        if changed:
+            self._bump_generation()
+        logger.info(f"[{log_file}] История применена: онлайн {len(self.players)} игроков.")
+
+    def export_online_state(self):
+        """
+        Возвращает состояние онлайн-игроков для сохранения вместе с позициями чтения логов.
+        Время входа сохраняется по системным часам, так как time.monotonic не переживает перезапуск.
+        :return: Словарь {steam_id: [имя, файл логов, время входа (Unix time)]}.
+        """
+        offset = time.time() - time.monotonic()
+        return {
+            steam_id: [data["name"], self.player_log_files.get(steam_id), data["joined_at"] + offset]
+            for steam_id, data in self.players.items()
+        }
+
+    def restore_online_state(self, state, log_file):
+        """
+        Восстанавливает онлайн-игроков указанного файла логов из сохраненного состояния.
+        :param state: Словарь {steam_id: [имя, файл логов, время входа]}, полученный из export_online_state.
+        :param log_file: Файл логов, чтение которого продолжается с контрольной точки.
+        """
+        offset = time.time() - time.monotonic()
+        restored = 0
+        for steam_id, (player_name, player_log_file, *joined) in state.items():
+            if player_log_file != log_file or steam_id in self.players:
+                continue
+            # Контрольные точки прежнего формата не содержат времени входа
+            joined_at = min(joined[0] - offset, time.monotonic()) if joined else time.monotonic()
+            self.players[steam_id] = {"name": player_name, "score": 0, "joined_at": joined_at}
+            self.player_log_files[steam_id] = log_file
+            restored += 1
+
+        if restored:
+            logger.info(f"[{log_file}] Восстановлено {restored} онлайн-игроков из контрольной точки.")
+            self._bump_generation()
+
     def get_online_players(self):
         """
         Возвращает список текущих онлайн-игроков.
+        Обработчики запросов используют снимок (атрибут snapshot) и этот метод не вызывают.
         """
-        return [
-            {"steam_id": steam_id, "name": data["name"], "score": data["score"], "duration": data["duration"]}
-            for steam_id, data in self.players.items()
-        ]
\ No newline at end of file
+        return self.snapshot.as_dicts()
\ No newline at end of file
@@ -0,0 +1,53 @@
+import time
+
+
+class OnlinePlayer:
+    __slots__ = ("steam_id", "name", "encoded_name", "score", "joined_at", "log_file")
+
+    def __init__(self, steam_id, name, score=0, joined_at=None, log_file=None):
+        """
+        Неизменяемая запись об онлайн-игроке в снимке.
+        Имя хранится сразу в виде байтов для пакета A2S_PLAYER (UTF-8 с завершающим нулем).
+        :param joined_at: Время входа по часам time.monotonic (общим для всех процессов машины).
+        :param log_file: Файл логов сервера, на котором игрок онлайн.
+        """
+        self.steam_id = steam_id
+        self.name = name
+        self.encoded_name = name.encode('utf-8') + b'\x00'
+        self.score = score
+        self.joined_at = time.monotonic() if joined_at is None else joined_at
+        self.log_file = log_file
+
+    @property
+    def duration(self):
+        """
+        Длительность текущей сессии в секундах.
+        """
+        return max(0.0, time.monotonic() - self.joined_at)
+
+
+class PlayerSnapshot:
+    __slots__ = ("generation", "players", "count")
+
+    def __init__(self, generation, players):
+        """
+        Снимок состава онлайн-игроков: пересобирается только при входе/выходе игрока,
+        а обработчики запросов читают его без создания промежуточных списков и словарей.
+        :param generation: Поколение состояния, для которого построен снимок.
+        :param players: Кортеж записей OnlinePlayer.
+        """
+        self.generation = generation
+        self.players = players
+        self.count = len(players)
+
+    def as_dicts(self):
+        """
+        Возвращает снимок в прежнем формате списка словарей.
+        """
+        return [
+            {"steam_id": p.steam_id, "name": p.name, "score": p.score, "duration": p.duration}
+            for p in self.players
+        ]
+
+
+EMPTY_SNAPSHOT = PlayerSnapshot(0, ())
@@ -0,0 +1,203 @@
+import json
+import os
+import sqlite3
+from collections import OrderedDict
+from logger_config import get_logger
+from metrics import Metrics
+
+# Инициализация логгера
+logger = get_logger()
+
+PLAYERS_INDEX_FILE = "players.sqlite3"  # Индекс известных игроков {steam_id: имя} на диске
+PLAYERS_CACHE_SIZE = 10000  # Количество недавно встречавшихся игроков, чьи ники держатся в памяти
+PLAYERS_DATA_FILE = "players_data.json"  # Прежний монолитный файл (только для миграции)
+PLAYERS_SNAPSHOT_FILE = "players_snapshot.json"  # Прежний снимок {steam_id: имя} (только для миграции)
+PLAYERS_JOURNAL_FILE = "players_journal.jsonl"  # Прежний журнал событий после снимка (только для миграции)
+
+
+class PlayerStore:
+    def __init__(self, index_file=PLAYERS_INDEX_FILE, cache_size=PLAYERS_CACHE_SIZE,
+                 snapshot_file=PLAYERS_SNAPSHOT_FILE, journal_file=PLAYERS_JOURNAL_FILE,
+                 legacy_file=PLAYERS_DATA_FILE):
+        """
+        Хранилище известных игроков: таблица SQLite {steam_id: имя} с поиском по первичному ключу
+        и ограниченный LRU-кэш недавно встречавшихся игроков перед ней.
+        Память не растет с количеством игроков за всю историю; новые ники копятся в pending
+        и записываются одной транзакцией фоновой задачей (WriteBehindWriter).
+        """
+        self.index_file = index_file
+        self.cache_size = cache_size
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_file
+        self.legacy_file = legacy_file
+        self.cache = OrderedDict()  # {steam_id: имя}, порядок - от давно не встречавшихся к недавним
+        self.pending = {}  # Ники, еще не переданные на запись
+        self.writing = {}  # Ники, записываемые в пуле потоков (до фиксации транзакции)
+        self.hits = 0
+        self.misses = 0
+        self._reader = None  # Соединение для поиска (поток цикла событий)
+        self._writer = None  # Соединение для записи (пул потоков)
+
+        metrics = Metrics()
+        metrics.gauge("moe_player_names_cached", "Ники игроков в LRU-кэше", lambda: len(self.cache))
+        for result, getter in (("hit", lambda: self.hits), ("miss", lambda: self.misses)):
+            metrics.gauge(
+                "moe_player_name_lookups_total", "Поиск ника игрока по Steam ID (попадания в кэш и промахи)",
+                getter, {"result": result}, kind="counter"
+            )
+
+    def _connect(self):
+        connection = sqlite3.connect(self.index_file, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")  # Поиск не блокируется записью
+        return connection
+
+    def load(self):
+        """
+        Открывает индекс игроков. Если индекса еще нет, переносит в него данные
+        из прежних снимка и журнала или из players_data.json.
+        """
+        created = not os.path.exists(self.index_file)
+        self._reader = self._connect()
+        self._reader.execute(
+            "CREATE TABLE IF NOT EXISTS players (steam_id TEXT PRIMARY KEY, name TEXT NOT NULL) WITHOUT ROWID"
+        )
+        self._reader.commit()
+        if created:
+            self._migrate()
+        logger.info(f"Открыт индекс игроков {self.index_file}.")
+
+    def get_name(self, steam_id):
+        """
+        Возвращает ник игрока: из кэша, из еще не записанных изменений или из индекса на диске.
+        """
+        name = self.cache.get(steam_id)
+        if name is not None:
+            self.cache.move_to_end(steam_id)
+            self.hits += 1
+            return name
+
+        self.misses += 1
+        name = self.pending.get(steam_id) or self.writing.get(steam_id)
+        if name is None and self._reader is not None:
+            row = self._reader.execute("SELECT name FROM players WHERE steam_id = ?", (steam_id,)).fetchone()
+            name = row[0] if row else None
+        if name is not None:
+            self._remember(steam_id, name)
+        return name
+
+    def _remember(self, steam_id, name):
+        self.cache[steam_id] = name
+        self.cache.move_to_end(steam_id)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)  # Вытесняем игрока, который дольше всех не встречался
+
+    def record(self, steam_id, player_name):
+        """
+        Запоминает ник нового игрока или новый ник известного игрока для записи на диск.
+        """
+        self.pending[steam_id] = player_name
+        self._remember(steam_id, player_name)
+
+    def collect(self):
+        """
+        Забирает накопленные ники (в потоке цикла событий).
+        :return: Словарь {steam_id: имя} для записи.
+        """
+        payload, self.pending = self.pending, {}
+        self.writing = payload
+        return payload
+
+    def restore(self, payload):
+        """
+        Возвращает ники неудавшейся записи в pending (в потоке цикла событий).
+        Ники, записанные в pending после collect, новее и сохраняются.
+        """
+        payload.update(self.pending)
+        self.pending = payload
+        if self.writing is payload:
+            self.writing = {}
+
+    def write(self, payload):
+        """
+        Записывает ники одной транзакцией (в пуле потоков).
+        :return: Приблизительное количество записанных байт.
+        """
+        if self._writer is None:
+            self._writer = self._connect()
+        with self._writer:
+            self._writer.executemany("INSERT OR REPLACE INTO players (steam_id, name) VALUES (?, ?)", payload.items())
+        if self.writing is payload:
+            self.writing = {}
+        return sum(len(steam_id) + len(name.encode("utf-8")) for steam_id, name in payload.items())
+
+    def close(self):
+        for connection in (self._reader, self._writer):
+            if connection is not None:
+                connection.close()
+        self._reader = self._writer = None
+
+    def _migrate(self):
+        """
+        Переносит данные прежних хранилищ в индекс. Перенесенные файлы получают суффикс .migrated.
+        """
+        names = self._read_snapshot_journal()
+        if names is None:
+            names = self._read_legacy()
+        if not names:
+            logger.info("Данные игроков не найдены. Создается новое хранилище.")
+            return
+        self.write(names)
+        for path in (self.snapshot_file, self.journal_file, self.legacy_file):
+            if os.path.exists(path):
+                os.replace(path, path + ".migrated")
+        logger.info(f"Перенесено {len(names)} игроков в {self.index_file}.")
+
+    def _read_snapshot_journal(self):
+        """
+        Читает прежние снимок и журнал. :return: {steam_id: имя} или None, если их нет.
+        """
+        if not os.path.exists(self.snapshot_file) and not os.path.exists(self.journal_file):
+            return None
+
+        names = {}
+        if os.path.exists(self.snapshot_file):
+            try:
+                with open(self.snapshot_file, "r", encoding="utf-8") as f:
+                    names = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                logger.error(f"Ошибка при загрузке снимка игроков: {e}")
+
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event, steam_id, player_name = json.loads(line)
+                    except (json.JSONDecodeError, ValueError):
+                        logger.warning(f"Пропущена поврежденная запись журнала игроков: {line.strip()}")
+                        continue
+                    if player_name:
+                        names[steam_id] = player_name
+        return names
+
+    def _read_legacy(self):
+        """
+        Читает прежний players_data.json. :return: {steam_id: имя}.
+        """
+        if not os.path.exists(self.legacy_file):
+            return {}
+
+        try:
+            with open(self.legacy_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error(f"Ошибка при миграции данных игроков из {self.legacy_file}: {e}")
+            return {}
+
+        names = {}
+        for steam_id, player_data in data.items():
+            # Проверяем, что данные содержат корректные ключи
+            if not isinstance(player_data, dict) or "name" not in player_data:
+                logger.warning(f"Некорректные данные для игрока {steam_id}. Пропускаем.")
+                continue
+            names[steam_id] = player_data["name"]
+        return names
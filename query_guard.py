@@ -0,0 +1,64 @@
+import time
+from array import array
+from logger_config import get_logger
+
+# Инициализация логгера
+logger = get_logger()
+
+
+class QueryRateLimiter:
+    def __init__(self, per_ip_limit, global_limit, table_size):
+        """
+        Ограничитель частоты пакетов для query-порта: счетчики за текущую секунду
+        по IP-адресу источника и суммарно.
+        Счетчики по IP хранятся в таблице фиксированного размера (слот выбирается по хэшу адреса),
+        поэтому память не растет при флуде с подменных адресов; IP, попавшие в один слот,
+        делят общий лимит.
+        :param per_ip_limit: Максимум пакетов в секунду от одного IP.
+        :param global_limit: Максимум пакетов в секунду суммарно.
+        :param table_size: Размер таблицы счетчиков (степень двойки).
+        """
+        if table_size & (table_size - 1):
+            raise ValueError(f"Размер таблицы должен быть степенью двойки: {table_size}")
+
+        self.per_ip_limit = per_ip_limit
+        self.global_limit = global_limit
+        self.mask = table_size - 1
+        self.slot_seconds = array('I', [0]) * table_size  # Секунда последнего пакета в слоте
+        self.slot_counts = array('I', [0]) * table_size  # Пакетов в слоте за эту секунду
+        self.global_second = 0
+        self.global_count = 0
+
+        # Счетчики отброшенных пакетов
+        self.dropped_per_ip = 0
+        self.dropped_global = 0
+
+    def allow(self, ip_address):
+        """
+        Возвращает True, если пакет от ip_address можно обработать.
+        Сначала проверяется лимит по IP, затем общий.
+        """
+        second = int(time.monotonic())
+        slot = hash(ip_address) & self.mask
+        if self.slot_seconds[slot] != second:
+            self.slot_seconds[slot] = second
+            self.slot_counts[slot] = 1
+        else:
+            count = self.slot_counts[slot] + 1
+            self.slot_counts[slot] = count
+            if count > self.per_ip_limit:
+                self.dropped_per_ip += 1
+                return False
+
+        # Общий лимит учитывает только пакеты, прошедшие лимит по IP: один флудер не расходует его за всех
+        if second != self.global_second:
+            self.global_second = second
+            self.global_count = 0
+        self.global_count += 1
+        if self.global_count > self.global_limit:
+            self.dropped_global += 1
+            return False
+        return True
+
+    def stats(self):
+        return {"dropped_per_ip": self.dropped_per_ip, "dropped_global": self.dropped_global}
@@ -1,72 +1,321 @@
 import asyncio
-import re
+import logging
+from time import perf_counter
 import asyncio_dgram
-from handlers import handle_info_query, handle_challenge_query, handle_player_query
-from log_parser import parse_log
-from logger_config import get_logger
-from player_handler import  PlayerHandler
+from handlers import (
+    ChallengeNumbers, classify_request, handle_info_query, handle_challenge_query, handle_player_query, handle_rules_query,
+    INFO_RESPONSE_PARTS, SERVER_RULES
+)
+from log_parser import LogIngestService
+from logger_config import get_logger, get_logging_stats, log_packet, sample_packet
+from constants import (
+    INFO_CHALLENGE_REQUIRED, QUERY_RATE_PER_IP, QUERY_RATE_GLOBAL, QUERY_RATE_TABLE_SIZE,
+    METRICS_ENABLED, METRICS_HOST, METRICS_PORT
+)
+from metrics import Metrics, start_metrics_task
+from endpoints import EndpointPlayers
+from player_handler import PlayerHandler
+from query_guard import QueryRateLimiter
+from response_cache import ResponseCache
+from shared_snapshot import BlocklistReader, PlayerSnapshotReader
 
 # Инициализация логгера
 logger = get_logger()
 
-ph = PlayerHandler()
+CACHE_STATS_INTERVAL = 60  # Интервал вывода статистики кэша ответов (в секундах)
+
+# Движки обработки UDP-запросов:
+# "protocol" - asyncio.DatagramProtocol, запрос обрабатывается синхронно прямо в datagram_received;
+# "dgram" - прежний цикл recv/send через asyncio_dgram.
+QUERY_ENGINES = ("protocol", "dgram")
+
+
+class QueryProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        """
+        UDP-протокол, передающий каждый датаграм в QueryServer.route_request.
+        :param server: Экземпляр QueryServer.
+        """
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            # Заблокированные IP и превышение лимитов отбрасываются до любой другой работы, включая журнал
+            if not self.server.admit(addr[0]):
+                return
+            sample_packet()
+            log_packet(logging.DEBUG, "Получен запрос от %s: %r", addr, data)
+
+            # Определяем тип запроса и вызываем соответствующий обработчик
+            response = self.server.route_request(data, addr)
+
+            if response:
+                self.transport.sendto(response, addr)
+                log_packet(logging.DEBUG, "Отправлен ответ клиенту %s", addr)
+
+        except Exception as e:
+            logger.error(f"Произошла ошибка: {e}")
+
+    def error_received(self, exc):
+        logger.error(f"Ошибка UDP-сокета: {exc}")
+
 
 class QueryServer:
-    def __init__(self, server_ip, query_port, log_files):
+    def __init__(self, server_ip, query_port, log_files, engine="protocol", player_source=None, reuse_port=False,
+                 endpoint=None, blocked_ips=None):
+        """
+        :param player_source: Источник онлайн-игроков (PlayerHandler или PlayerSnapshotReader).
+        :param reuse_port: Привязывать сокет с SO_REUSEPORT (для нескольких рабочих процессов).
+        :param endpoint: Описание порта (QueryEndpoint) со своими полями A2S_INFO и файлами логов;
+            None - значения по умолчанию из handlers и игроки всех файлов.
+        :param blocked_ips: Заблокированные защитой от DDoS IP (Blocklist или BlocklistReader);
+            None - пока не подключены (в main подключается список LogIngestService).
+        """
+        if engine not in QUERY_ENGINES:
+            raise ValueError(f"Неизвестный движок обработки запросов: {engine}")
+
         self.server_ip = server_ip
         self.query_port = query_port
         self.log_files = log_files
-        self.challenge_numbers = {}
+        self.engine = engine
+        self.reuse_port = reuse_port
+        self.challenge_numbers = ChallengeNumbers()  # Challenge без хранения состояния по адресам
         self.players = {}  # Словарь для хранения данных о текущих игроках
         self.player_log_files = {}  # Словарь для отслеживания файлов, где игроки онлайн
-        logger.info(f"Сервер инициализирован. IP: {server_ip}, Порт: {query_port}")
+        self.endpoint = endpoint
+        self.player_handler = player_source if player_source is not None else PlayerHandler()
+        if endpoint is not None and endpoint.log_files is not None:
+            # Каждый порт видит только игроков своих файлов логов
+            self.player_handler = EndpointPlayers(self.player_handler, endpoint.log_files)
+        info_parts = endpoint.info_parts if endpoint is not None else INFO_RESPONSE_PARTS
+        rules = endpoint.rules if endpoint is not None else SERVER_RULES
+        self.response_cache = ResponseCache()  # Кэш готовых ответов A2S_INFO/A2S_PLAYER
+        self.log_ingest = None  # Сервис разбора логов (создается в main)
+        self.background_tasks = []  # Ссылки на фоновые задачи, чтобы их не собрал сборщик мусора
+        self.dropped_requests = 0  # Количество отброшенных нераспознанных пакетов
+        self.blocked_ips = blocked_ips if blocked_ips is not None else frozenset()
+        self.dropped_blocked = 0  # Количество отброшенных пакетов от заблокированных IP
+        self.rate_limiter = QueryRateLimiter(QUERY_RATE_PER_IP, QUERY_RATE_GLOBAL, QUERY_RATE_TABLE_SIZE)
+        self.routes = {  # Таблица диспетчеризации: тип запроса -> обработчик
+            "info": lambda data, addr: handle_info_query(
+                data, addr, self.player_handler, self.response_cache, self.challenge_numbers, INFO_CHALLENGE_REQUIRED,
+                info_parts
+            ),
+            "challenge": lambda data, addr: handle_challenge_query(data, addr, self.challenge_numbers),
+            "player": lambda data, addr: handle_player_query(
+                data, addr, self.challenge_numbers, self.player_handler, self.response_cache
+            ),
+            "rules": lambda data, addr: handle_rules_query(
+                data, addr, self.challenge_numbers, self.response_cache, rules
+            ),
+        }
+        self.register_metrics()
+        logger.info(f"Сервер инициализирован. IP: {server_ip}, Порт: {query_port}, движок: {engine}")
+
+    def register_metrics(self):
+        """
+        Регистрирует гистограммы задержки обработки по типам запросов и счетчики отброшенных пакетов.
+        """
+        metrics = Metrics()
+        port = str(self.query_port)
+        # Связанные методы observe: на горячем пути без лишних поисков атрибутов
+        self.observe_latency = {
+            request_type: metrics.histogram(
+                "moe_query_request_seconds", "Время обработки запроса A2S", {"type": request_type, "port": port}
+            ).observe
+            for request_type in self.routes
+        }
+        dropped = {
+            "unknown": lambda: self.dropped_requests,
+            "blocked": lambda: self.dropped_blocked,
+            "rate_per_ip": lambda: self.rate_limiter.dropped_per_ip,
+            "rate_global": lambda: self.rate_limiter.dropped_global,
+            "bad_challenge": lambda: self.challenge_numbers.rejected,
+        }
+        for reason, getter in dropped.items():
+            metrics.gauge(
+                "moe_query_dropped_total", "Отброшенные пакеты query-порта", getter,
+                {"reason": reason, "port": port}, kind="counter"
+            )
 
     async def main(self):
         # Запуск задач для парсинга логов
         logger.info("Запуск задач для парсинга логов...")
-        for log_file in self.log_files:
-            asyncio.create_task(parse_log(log_file))
+        self.log_ingest = LogIngestService(self.log_files)
+        self.blocked_ips = self.log_ingest.ddos_protection.blocked_ips
+        self.background_tasks = [
+            asyncio.create_task(self.log_ingest.run()),
+            asyncio.create_task(self.report_cache_stats()),
+        ]
+        if METRICS_ENABLED:
+            self.background_tasks.append(start_metrics_task(asyncio.get_running_loop(), METRICS_HOST, METRICS_PORT))
 
-        # Ожидание входящих UDP-запросов
+        await self.serve()
+
+    async def serve(self):
+        """
+        Обслуживает UDP-порт выбранным движком.
+        """
         logger.info(f"Ожидание запросов на порту {self.query_port}...")
-        stream = await asyncio_dgram.bind((self.server_ip, self.query_port))
+        if self.engine == "protocol":
+            await self.serve_protocol()
+        else:
+            await self.serve_dgram()
+
+    async def serve_protocol(self):
+        """
+        Обслуживает запросы через asyncio.DatagramProtocol.
+        """
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: QueryProtocol(self), local_addr=(self.server_ip, self.query_port),
+            reuse_port=self.reuse_port or None
+        )
+        try:
+            await loop.create_future()  # Работаем до отмены задачи
+        finally:
+            transport.close()
+
+    async def serve_dgram(self):
+        """
+        Обслуживает запросы циклом recv/send через asyncio_dgram.
+        """
+        stream = await asyncio_dgram.bind((self.server_ip, self.query_port), reuse_port=self.reuse_port or None)
 
         while True:
             try:
                 data, addr = await stream.recv()
-                logger.debug(f"Получен запрос от {addr}: {data}")
+                # Заблокированные IP и превышение лимитов отбрасываются до любой другой работы, включая журнал
+                if not self.admit(addr[0]):
+                    continue
+                sample_packet()
+                log_packet(logging.DEBUG, "Получен запрос от %s: %r", addr, data)
 
                 # Определяем тип запроса и вызываем соответствующий обработчик
-                response = await self.route_request(data, addr)
+                response = self.route_request(data, addr)
 
                 if response:
+                    # Запись до await: за время отправки выборку может сменить пакет другого порта
+                    log_packet(logging.DEBUG, "Отправка ответа клиенту %s", addr)
                     await stream.send(response, addr)
-                    logger.debug(f"Отправлен ответ клиенту {addr}")
-                else:
-                    logger.warning("Некорректный запрос.")
 
+            except asyncio.CancelledError:
+                stream.close()
+                raise
             except Exception as e:
                 logger.error(f"Произошла ошибка: {e}")
 
-    async def route_request(self, data, addr):
+    async def report_cache_stats(self):
+        """
+        Периодически выводит статистику попаданий в кэш ответов.
+        """
+        while True:
+            await asyncio.sleep(CACHE_STATS_INTERVAL)
+            logger.info(
+                f"Статистика кэша ответов порта {self.query_port}: {self.response_cache.stats()}, "
+                f"отброшено нераспознанных пакетов: {self.dropped_requests}, "
+                f"отброшено от заблокированных IP: {self.dropped_blocked}, "
+                f"отброшено по лимиту частоты: {self.rate_limiter.stats()}, "
+                f"отброшено с некорректным challenge: {self.challenge_numbers.rejected}, "
+                f"отброшено записей лога: {get_logging_stats()['dropped']}"
+            )
+
+    def admit(self, ip_address):
+        """
+        Отбрасывает пакеты заблокированных IP (до того, как файрвол применит блокировку)
+        и применяет ограничение частоты по IP источника и суммарное.
+        Отброшенные пакеты только подсчитываются, без записи в лог.
+        :return: True, если пакет нужно обработать.
+        """
+        if ip_address in self.blocked_ips:
+            self.dropped_blocked += 1
+            return False
+        return self.rate_limiter.allow(ip_address)
+
+    def process_datagram(self, data, addr):
+        """
+        Проверяет источник (admit) и маршрутизирует запрос.
+        """
+        if not self.admit(addr[0]):
+            return None
+        return self.route_request(data, addr)
+
+    def route_request(self, data, addr):
         """
         Определяет тип запроса и передает его соответствующему обработчику.
+        Неизвестные пакеты отбрасываются без записи в лог, учитывается только их количество.
         """
-        # Проверяем, является ли запрос A2S_INFO
-        info_query_pattern = re.compile(rb'^\xFF\xFF\xFF\xFFTSource Engine Query\x00$')
-        if info_query_pattern.match(data):
-            return await handle_info_query(data, addr, ph.get_online_players())
+        request_type = classify_request(data)
+        route = self.routes.get(request_type)
+        if route is None:
+            self.dropped_requests += 1
+            return None
+        start = perf_counter()
+        response = route(data, addr)
+        self.observe_latency[request_type](perf_counter() - start)
+        return response
+
+
+async def serve_endpoints(endpoints, log_files, engine="protocol"):
+    """
+    Обслуживает несколько query-портов (по одному на сервер MOE) в одном цикле событий.
+    Логи всех серверов разбираются одним LogIngestService, а каждый порт отвечает
+    своими полями A2S_INFO и своим составом игроков.
+    :param endpoints: Список QueryEndpoint.
+    :param log_files: Все файлы логов для разбора.
+    """
+    servers = [
+        QueryServer(endpoint.server_ip, endpoint.query_port, endpoint.log_files or [], engine=engine, endpoint=endpoint)
+        for endpoint in endpoints
+    ]
+    logger.info("Запуск задач для парсинга логов...")
+    log_ingest = LogIngestService(log_files)
+    for server in servers:
+        server.blocked_ips = log_ingest.ddos_protection.blocked_ips
+    background_tasks = [asyncio.create_task(log_ingest.run())]
+    background_tasks.extend(asyncio.create_task(server.report_cache_stats()) for server in servers)
+    if METRICS_ENABLED:
+        background_tasks.append(start_metrics_task(asyncio.get_running_loop(), METRICS_HOST, METRICS_PORT))
+    try:
+        await asyncio.gather(*(server.serve() for server in servers))
+    finally:
+        for task in background_tasks:
+            task.cancel()
+
 
-        # Проверяем, является ли запрос A2S_SERVERQUERY_GETCHALLENGE
-        challenge_query_pattern = re.compile(rb'^\xFF\xFF\xFF\xFFU\x00\x00\x00\x00$')
-        if challenge_query_pattern.match(data):
-            return await handle_challenge_query(data, addr, self.challenge_numbers)
+def run_query_worker(server_ip, query_port, engine, snapshot_name, endpoints=None, blocklist_name=None):
+    """
+    Точка входа рабочего процесса: обслуживает порт с SO_REUSEPORT,
+    беря состав игроков и заблокированные IP из общей памяти.
+    :param endpoints: Список QueryEndpoint; если задан, процесс обслуживает все эти порты вместо query_port.
+    :param blocklist_name: Имя сегмента BlocklistPublisher; None - заблокированные IP не проверяются.
+    """
+    reader = PlayerSnapshotReader(snapshot_name)
+    blocked_ips = BlocklistReader(blocklist_name) if blocklist_name else None
+    if endpoints:
+        servers = [
+            QueryServer(endpoint.server_ip, endpoint.query_port, [], engine=engine, player_source=reader,
+                        reuse_port=True, endpoint=endpoint, blocked_ips=blocked_ips)
+            for endpoint in endpoints
+        ]
+    else:
+        servers = [QueryServer(server_ip, query_port, [], engine=engine, player_source=reader, reuse_port=True,
+                               blocked_ips=blocked_ips)]
 
-        # Проверяем, является ли запрос A2S_PLAYER
-        player_query_pattern = re.compile(rb'^\xFF\xFF\xFF\xFF[UV](.{4})$')
-        if player_query_pattern.match(data):
-            return await handle_player_query(data, addr, self.challenge_numbers, ph.get_online_players())
+    async def serve_all():
+        if blocked_ips is not None:
+            blocked_ips.start(asyncio.get_running_loop())
+        await asyncio.gather(*(server.serve() for server in servers))
 
-        # Если запрос не соответствует ни одному из шаблонов
-        logger.warning(f"Некорректный запрос от {addr}: {data}")
-        return None
\ No newline at end of file
+    try:
+        asyncio.run(serve_all())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+        if blocked_ips is not None:
+            blocked_ips.close()
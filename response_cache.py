@@ -0,0 +1,48 @@
+from collections import defaultdict
+
+
+class ResponseCache:
+    def __init__(self):
+        """
+        Кэш заранее собранных ответов на запросы A2S.
+        Для каждого типа запроса хранится пара (поколение, байты ответа):
+        ответ пересобирается только когда меняется поколение состояния игроков.
+        """
+        self._entries = {}  # {тип запроса: (поколение, ответ)}
+        self.hits = defaultdict(int)  # {тип запроса: количество попаданий}
+        self.misses = defaultdict(int)  # {тип запроса: количество промахов}
+
+    def get(self, query_type, generation, builder):
+        """
+        Возвращает ответ из кэша или собирает его заново.
+        :param query_type: Тип запроса ('info', 'player', ...).
+        :param generation: Текущее поколение состояния, от которого зависит ответ.
+        :param builder: Функция без аргументов, собирающая ответ при промахе.
+        """
+        entry = self._entries.get(query_type)
+        if entry is not None and entry[0] == generation:
+            self.hits[query_type] += 1
+            return entry[1]
+
+        self.misses[query_type] += 1
+        response = builder()
+        self._entries[query_type] = (generation, response)
+        return response
+
+    def invalidate(self, query_type=None):
+        """
+        Сбрасывает закэшированный ответ для типа запроса (или все ответы).
+        """
+        if query_type is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(query_type, None)
+
+    def stats(self):
+        """
+        Возвращает счетчики попаданий/промахов по типам запросов.
+        """
+        return {
+            query_type: {"hits": self.hits[query_type], "misses": self.misses[query_type]}
+            for query_type in sorted(set(self.hits) | set(self.misses))
+        }
@@ -0,0 +1,254 @@
+import asyncio
+import json
+import socket
+import struct
+import time
+from array import array
+from multiprocessing import shared_memory
+from blocklist import IPV4
+from logger_config import get_logger
+from player_snapshot import OnlinePlayer, PlayerSnapshot, EMPTY_SNAPSHOT
+
+# Инициализация логгера
+logger = get_logger()
+
+SNAPSHOT_SIZE = 1 << 20  # Размер сегмента общей памяти (1 МБ хватает на тысячи игроков)
+BLOCKLIST_SNAPSHOT_SIZE = 4 << 20  # Сегмент заблокированных IP (4 байта на адрес, около миллиона адресов)
+BLOCKLIST_SYNC_INTERVAL = 1  # Период публикации и чтения заблокированных IP (в секундах)
+
+# Заголовок сегмента: счетчик версий (seqlock) и длина полезных данных.
+# Нечетный счетчик означает, что запись еще идет и читать данные нельзя.
+HEADER = struct.Struct('<QI')
+
+
+def _seqlock_write(buf, sequence, payload):
+    """
+    Записывает payload в сегмент под seqlock.
+    :param sequence: Текущий (четный) счетчик версий сегмента.
+    :return: Новый счетчик версий.
+    """
+    sequence += 1  # Нечетное значение: идет запись
+    HEADER.pack_into(buf, 0, sequence, 0)
+    buf[HEADER.size:HEADER.size + len(payload)] = payload
+    sequence += 1  # Четное значение: данные согласованы
+    HEADER.pack_into(buf, 0, sequence, len(payload))
+    return sequence
+
+
+def _seqlock_read(buf, known_sequence):
+    """
+    Копирует согласованные данные сегмента, повторяя чтение, пока издатель пишет.
+    :param known_sequence: Счетчик версий уже прочитанных данных (None - данных еще нет).
+    :return: (счетчик версий, данные) или None, если версия не изменилась.
+    """
+    while True:
+        sequence, length = HEADER.unpack_from(buf, 0)
+        if sequence == known_sequence:
+            return None
+        if sequence % 2:
+            time.sleep(0)  # Издатель пишет данные, пробуем снова
+            continue
+
+        payload = bytes(buf[HEADER.size:HEADER.size + length])
+        if HEADER.unpack_from(buf, 0)[0] == sequence:
+            return sequence, payload
+        # Данные изменились во время копирования
+
+
+class PlayerSnapshotPublisher:
+    def __init__(self, size=SNAPSHOT_SIZE):
+        """
+        Публикует снимок онлайн-игроков в сегмент общей памяти.
+        Используется процессом, который парсит логи и владеет PlayerHandler.
+        :param size: Размер сегмента общей памяти в байтах.
+        """
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.name = self.shm.name
+        self.sequence = 0
+        HEADER.pack_into(self.shm.buf, 0, 0, 0)
+        logger.info(f"Создан сегмент общей памяти {self.name} для снимка игроков ({size} байт).")
+
+    def attach(self, player_handler):
+        """
+        Подписывается на изменения состава игроков и сразу публикует текущий снимок.
+        """
+        player_handler.add_listener(lambda: self.publish(player_handler.snapshot))
+        self.publish(player_handler.snapshot)
+
+    def publish(self, snapshot):
+        """
+        Записывает снимок онлайн-игроков в общую память.
+        """
+        players = snapshot.players
+        payload = json.dumps(
+            [[p.steam_id, p.name, p.score, p.joined_at, p.log_file] for p in players],
+            ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+        if HEADER.size + len(payload) > self.shm.size:
+            logger.error(f"Снимок игроков ({len(payload)} байт) не помещается в общую память.")
+            return
+
+        self.sequence = _seqlock_write(self.shm.buf, self.sequence, payload)
+        logger.debug(f"Опубликован снимок игроков: {len(players)} игроков, версия {self.sequence // 2}.")
+
+    def close(self):
+        """
+        Закрывает и удаляет сегмент общей памяти.
+        """
+        self.shm.close()
+        self.shm.unlink()
+
+
+class PlayerSnapshotReader:
+    def __init__(self, name):
+        """
+        Читает снимок онлайн-игроков из общей памяти в рабочем процессе.
+        Предоставляет тот же интерфейс, что и PlayerHandler для QueryServer:
+        атрибуты snapshot и generation и метод get_online_players().
+        :param name: Имя сегмента общей памяти, созданного PlayerSnapshotPublisher.
+        Рабочие процессы - дочерние для издателя и делят с ним resource_tracker,
+        поэтому подключение к сегменту не приводит к его удалению при выходе рабочего.
+        """
+        self.shm = shared_memory.SharedMemory(name=name)
+        self._snapshot = None
+
+    @property
+    def generation(self):
+        """
+        Возвращает текущее поколение опубликованного снимка.
+        """
+        return HEADER.unpack_from(self.shm.buf, 0)[0] // 2
+
+    @property
+    def snapshot(self):
+        """
+        Возвращает снимок онлайн-игроков. Данные декодируются только при смене поколения.
+        """
+        known_sequence = self._snapshot.generation * 2 if self._snapshot is not None else None
+        update = _seqlock_read(self.shm.buf, known_sequence)
+        if update is None:
+            return self._snapshot
+
+        sequence, payload = update
+        if not payload and sequence == 0:
+            self._snapshot = EMPTY_SNAPSHOT  # Издатель еще ничего не опубликовал
+        else:
+            self._snapshot = PlayerSnapshot(sequence // 2, tuple(
+                OnlinePlayer(steam_id, name, score, joined_at, log_file)
+                for steam_id, name, score, joined_at, log_file in json.loads(payload)
+            ))
+        return self._snapshot
+
+    def get_online_players(self):
+        """
+        Возвращает список онлайн-игроков.
+        """
+        return self.snapshot.as_dicts()
+
+    def close(self):
+        self.shm.close()
+
+
+class BlocklistPublisher:
+    def __init__(self, blocklist, size=BLOCKLIST_SNAPSHOT_SIZE):
+        """
+        Публикует заблокированные IP (массив целых IPv4) в сегмент общей памяти
+        для рабочих процессов query-порта. Изменения накапливаются и публикуются
+        не чаще раза в BLOCKLIST_SYNC_INTERVAL секунд.
+        :param blocklist: Blocklist процесса, который парсит логи.
+        """
+        self.blocklist = blocklist
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.name = self.shm.name
+        self.sequence = 0
+        self.version = None  # Версия Blocklist, опубликованная последней
+        self.task = None
+        HEADER.pack_into(self.shm.buf, 0, 0, 0)
+        logger.info(f"Создан сегмент общей памяти {self.name} для заблокированных IP ({size} байт).")
+
+    def publish(self):
+        """
+        Записывает заблокированные IP в общую память, если их состав изменился.
+        """
+        if self.blocklist.version == self.version:
+            return
+        payload = array("I", self.blocklist.expires).tobytes()
+        if HEADER.size + len(payload) > self.shm.size:
+            logger.error(f"Список заблокированных IP ({len(payload)} байт) не помещается в общую память.")
+            return
+
+        self.sequence = _seqlock_write(self.shm.buf, self.sequence, payload)
+        self.version = self.blocklist.version
+        logger.debug(f"Опубликованы заблокированные IP: {len(payload) // 4}, версия {self.sequence // 2}.")
+
+    def start(self, loop):
+        """
+        Публикует текущий список и запускает фоновую задачу публикации изменений.
+        """
+        self.publish()
+        if self.task is None or self.task.done():
+            self.task = loop.create_task(self.run())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(BLOCKLIST_SYNC_INTERVAL)
+            self.publish()
+
+    def close(self):
+        """
+        Останавливает публикацию, закрывает и удаляет сегмент общей памяти.
+        """
+        if self.task is not None:
+            self.task.cancel()
+        self.shm.close()
+        self.shm.unlink()
+
+
+class BlocklistReader:
+    def __init__(self, name):
+        """
+        Заблокированные IP в рабочем процессе: множество целых IPv4, которое обновляется
+        из общей памяти фоновой задачей (проверка адреса не читает общую память).
+        Поддерживает ту же проверку ip in blocked_ips, что и Blocklist.
+        :param name: Имя сегмента общей памяти, созданного BlocklistPublisher.
+        """
+        self.shm = shared_memory.SharedMemory(name=name)
+        self.sequence = 0
+        self.addresses = frozenset()
+        self.task = None
+        self.refresh()
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def __contains__(self, ip_address):
+        try:
+            return IPV4.unpack(socket.inet_aton(ip_address))[0] in self.addresses
+        except OSError:  # Не IPv4
+            return False
+
+    def refresh(self):
+        """
+        Перечитывает список из общей памяти, если издатель опубликовал новую версию.
+        """
+        update = _seqlock_read(self.shm.buf, self.sequence)
+        if update is not None:
+            self.sequence, payload = update
+            self.addresses = frozenset(array("I", payload))
+
+    def start(self, loop):
+        """
+        Запускает фоновую задачу чтения изменений.
+        """
+        if self.task is None or self.task.done():
+            self.task = loop.create_task(self.run())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(BLOCKLIST_SYNC_INTERVAL)
+            self.refresh()
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+        self.shm.close()
@@ -0,0 +1,147 @@
+import asyncio
+import os
+import time
+from logger_config import get_logger
+from metrics import Metrics
+
+# Инициализация логгера
+logger = get_logger()
+
+
+def atomic_write(path, payload):
+    """
+    Атомарно записывает байты в файл: сначала во временный файл, затем переименование.
+    :return: Количество записанных байт.
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return len(payload)
+
+
+class WriteBehindWriter:
+    def __init__(self, name, collect, write, flush_interval, max_changes, restore=None):
+        """
+        Отложенная (write-behind) запись: изменения помечают хранилище "грязным",
+        а фоновая задача сбрасывает его на диск не чаще раза в flush_interval секунд
+        или сразу после накопления max_changes изменений.
+        :param name: Имя хранилища для логов и метрик.
+        :param collect: Функция без аргументов, вызываемая в потоке цикла событий; возвращает данные для записи.
+        :param write: Функция записи данных на диск, выполняется в пуле потоков; возвращает число записанных байт.
+        :param flush_interval: Максимальная задержка записи (в секундах).
+        :param max_changes: Количество изменений, после которого запись выполняется без ожидания.
+        :param restore: Функция, возвращающая данные неудавшейся записи в хранилище (в потоке цикла событий),
+            чтобы следующая запись повторила их; None - данные неудавшейся записи теряются.
+        """
+        self.name = name
+        self.collect = collect
+        self.write = write
+        self.restore = restore
+        self.flush_interval = flush_interval
+        self.max_changes = max_changes
+        self.pending_changes = 0  # Изменения, еще не записанные на диск
+        self.task = None  # Фоновая задача записи
+        self._wakeup = None  # Событие для досрочной записи
+
+        # Метрики
+        self.flush_count = 0
+        self.bytes_written = 0
+        metrics = Metrics()
+        labels = {"store": name}
+        self.flush_latency = metrics.histogram("moe_persistence_flush_seconds", "Время записи хранилища на диск", labels)
+        metrics.gauge(
+            "moe_persistence_flushes_total", "Записи хранилища на диск", lambda: self.flush_count, labels, kind="counter"
+        )
+        metrics.gauge(
+            "moe_persistence_written_bytes_total", "Байты, записанные хранилищем на диск", lambda: self.bytes_written,
+            labels, kind="counter"
+        )
+        metrics.gauge(
+            "moe_persistence_pending_changes", "Изменения, еще не записанные на диск", lambda: self.pending_changes,
+            labels
+        )
+
+    def mark_dirty(self):
+        """
+        Отмечает изменение данных. Запись выполнит фоновая задача.
+        """
+        self.pending_changes += 1
+        if self.pending_changes >= self.max_changes and self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self, loop):
+        """
+        Запускает фоновую задачу записи, если она еще не запущена.
+        """
+        if self.task is None or self.task.done():
+            self.task = loop.create_task(self.run())
+
+    async def run(self):
+        """
+        Фоновая задача: ждет интервал или сигнал о накоплении изменений и записывает данные.
+        При отмене задачи выполняет принудительную запись.
+        """
+        self._wakeup = asyncio.Event()
+        if self.pending_changes >= self.max_changes:
+            self._wakeup.set()  # Изменения накопились до запуска задачи
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                if self.pending_changes:
+                    await self.flush_async()
+        except asyncio.CancelledError:
+            logger.info(f"Задача записи {self.name} остановлена. Принудительная запись.")
+            self.flush()
+            raise
+
+    async def flush_async(self):
+        """
+        Собирает данные в потоке цикла событий и записывает их в пуле потоков.
+        """
+        payload = self.collect()
+        self.pending_changes = 0
+        start = time.perf_counter()
+        try:
+            written = await asyncio.get_running_loop().run_in_executor(None, self.write, payload)
+        except Exception as e:
+            self._write_failed(payload, e)
+            return
+        self._record_flush(written, time.perf_counter() - start)
+
+    def flush(self):
+        """
+        Синхронная принудительная запись (например, при завершении работы).
+        """
+        if not self.pending_changes:
+            return
+        payload = self.collect()
+        self.pending_changes = 0
+        start = time.perf_counter()
+        try:
+            written = self.write(payload)
+        except Exception as e:
+            self._write_failed(payload, e)
+            return
+        self._record_flush(written, time.perf_counter() - start)
+
+    def _write_failed(self, payload, error):
+        """
+        Возвращает данные неудавшейся записи в хранилище; запись повторится при следующей итерации.
+        """
+        logger.error(f"Ошибка при записи {self.name}: {error}")
+        if self.restore is not None:
+            self.restore(payload)
+        self.pending_changes += 1
+
+    def _record_flush(self, written, duration):
+        self.flush_count += 1
+        self.flush_latency.observe(duration)
+        self.bytes_written += written
+        logger.debug(f"{self.name}: записано {written} байт за {duration * 1000:.1f} мс.")